@@ -0,0 +1,486 @@
+"""
+提取与聚类各阶段的可复现基准测试。
+
+所有输入都由带固定随机种子的合成数据生成器产生，编码器由确定性的
+`FakeEncoder` 代替 SBERT，因此可以离线运行，并且同一参数下每次的输入完全相同。
+
+- 提取基准: 生成形如 `content -> final_structured_response -> materials[name / physical_form]`
+  的嵌套 JSON 语料，分别计时 parse (json.load)、walk (extract_values)、
+  count (频次汇总) 和 save (save_results)，以及 process_directory 端到端。
+- 聚类基准: 生成 Zipf 分布的属性列表，分别计时 load、encode、primary、
+  secondary 和 CSV 写出。
+
+每个阶段报告耗时、吞吐量和阶段内的峰值内存 (RSS)。传入多个规模时，每个规模在
+独立的子进程中运行（峰值内存互不影响），并按相邻规模的耗时比估计各阶段的
+伸缩指数 (耗时 ∝ n^k)。
+
+用法示例:
+    python benchmark.py extract --sizes 100 400 1600
+    python benchmark.py cluster --sizes 1000 4000 16000 --config '{"cluster_backend": "blocked"}'
+    python benchmark.py all --output benchmark_results.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from metrics import RssWindow
+
+# 合成属性名的词表
+_PREFIXES = ['nano', 'meso', 'micro', 'poly', 'amorphous', 'crystalline', 'porous', 'doped', 'annealed',
+             'hollow', 'layered', 'ultrathin', 'colloidal', 'mesoporous', 'single-crystal', 'hydrated']
+_CORES = ['TiO2', 'ZnO', 'graphene', 'MoS2', 'CdSe', 'perovskite', 'SnO2', 'Fe3O4', 'CuO', 'Ag', 'Au',
+          'silica', 'alumina', 'carbon', 'PbS', 'WO3', 'NiO', 'Co3O4', 'BiVO4', 'g-C3N4', 'MXene', 'CeO2']
+_SUFFIXES = ['nanoparticles', 'film', 'powder', 'nanowires', 'quantum dots', 'nanosheets', 'thin film',
+             'composite', 'crystals', 'nanorods', 'coating', 'suspension', 'aerogel', 'nanotubes']
+_FORMS = ['powder', 'thin film', 'solution', 'single crystal', 'pellet', 'nanoparticles', 'gel', 'bulk']
+_SYLLABLES = ['ka', 'lo', 'mi', 'ra', 'te', 'zu', 'no', 'shi', 'ba', 've', 'do', 'xi', 'pe', 'gu', 'an', 'or']
+
+EXTRACT_KEYS = ['name', 'physical_form']
+EXTRACT_STAGES = ['parse', 'walk', 'count', 'save', 'process_directory']
+CLUSTER_STAGES = ['load', 'encode', 'primary', 'secondary', 'csv_write']
+SECONDARY_STAGES = ['per_cluster', 'batched']
+
+
+# ==============================================================================
+# 合成数据生成器
+# ==============================================================================
+
+def _synthetic_term(rng: random.Random) -> str:
+    """生成一个形如 "porous TiO2 nanoparticles" 的属性名，偶尔带大小写变体或编号。"""
+    parts = []
+    if rng.random() < 0.6:
+        parts.append(rng.choice(_PREFIXES))
+    parts.append(rng.choice(_CORES))
+    if rng.random() < 0.8:
+        parts.append(rng.choice(_SUFFIXES))
+    term = ' '.join(parts)
+    roll = rng.random()
+    if roll < 0.1:
+        term = term.title()
+    elif roll < 0.3:
+        term = f"{term} ({''.join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4)))})"
+    elif roll < 0.5:
+        term = f"{term}-{rng.randint(1, 999)}"
+    return term
+
+
+def generate_zipf_terms(n: int, seed: int = 0, exponent: float = 1.1, max_count: int = 100_000) -> List[Tuple[str, int]]:
+    """
+    生成 n 个唯一属性及其 Zipf 分布的频次，按频次降序排列。
+
+    Args:
+        n: 唯一属性数量（1k 到 1M 均可）。
+        seed: 随机种子。
+        exponent: Zipf 指数，第 r 名的频次约为 max_count / r^exponent。
+        max_count: 最高频属性的频次。
+    """
+    rng = random.Random(seed)
+    terms = []
+    seen = set()
+    while len(terms) < n:
+        term = _synthetic_term(rng)
+        if term in seen:
+            # 组合空间耗尽后追加随机音节，保证唯一
+            term = f"{term} {''.join(rng.choice(_SYLLABLES) for _ in range(3))}"
+            if term in seen:
+                continue
+        seen.add(term)
+        terms.append(term)
+    return [(term, max(1, int(max_count / (rank ** exponent)))) for rank, term in enumerate(terms, start=1)]
+
+
+def _zipf_sampler(values: Sequence[str], rng: random.Random, exponent: float = 1.1) -> Callable[[], str]:
+    weights = [1.0 / (rank ** exponent) for rank in range(1, len(values) + 1)]
+    cumulative = np.cumsum(weights)
+    total = cumulative[-1]
+
+    def sample() -> str:
+        return values[int(np.searchsorted(cumulative, rng.random() * total, side='right'))]
+    return sample
+
+
+def generate_corpus(directory: str, n_files: int, items_per_file: int = 20, vocabulary: int = 5000,
+                    seed: int = 0) -> int:
+    """
+    在 directory 中生成 n_files 个嵌套 JSON 文件，属性名按 Zipf 分布抽取。
+
+    Returns:
+        所有文件中 name / physical_form 值的总数。
+    """
+    rng = random.Random(seed)
+    names = [term for term, _ in generate_zipf_terms(vocabulary, seed=seed)]
+    sample_name = _zipf_sampler(names, rng)
+    sample_form = _zipf_sampler(_FORMS, rng)
+    os.makedirs(directory, exist_ok=True)
+    total_values = 0
+    for i in range(n_files):
+        materials = []
+        for _ in range(items_per_file):
+            material = {
+                "name": sample_name(),
+                "physical_form": sample_form(),
+                "properties": [{"property": "band gap", "value": round(rng.uniform(0.5, 5.0), 3), "unit": "eV"}],
+            }
+            total_values += 2
+            if rng.random() < 0.2:
+                # 深一层的嵌套组分
+                material["components"] = [{"name": sample_name(), "role": "dopant"}]
+                total_values += 1
+            materials.append(material)
+        document = {
+            "id": f"item-{i:06d}",
+            "content": {"final_structured_response": {"title": f"Synthetic item {i}", "materials": materials}},
+        }
+        with open(os.path.join(directory, f"item_{i:06d}.json"), 'w', encoding='utf-8') as f:
+            json.dump(document, f, ensure_ascii=False)
+    return total_values
+
+
+def write_analyzer_input(path: str, terms: List[Tuple[str, int]], field: str = 'names_frequency'):
+    """把 (属性, 频次) 列表写成 main.py 可读取的汇总 JSON 文件。"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({field: {"sorted_by_frequency": terms}}, f, ensure_ascii=False)
+
+
+# ==============================================================================
+# 确定性编码器
+# ==============================================================================
+
+class FakeEncoder:
+    """
+    代替 SentenceTransformer 的确定性编码器，可离线使用。
+
+    每个属性被编码为其小写字符三元组和单词的哈希特征向量（L2 归一化），
+    因此拼写相近的属性余弦相似度高，聚类阶段的工作量与真实数据相近。
+
+    Args:
+        dimension: 向量维度，默认与 all-MiniLM-L6-v2 相同。
+    """
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def _encode_one(self, text: str, out: np.ndarray):
+        lowered = text.lower()
+        padded = f"  {lowered} "
+        for j in range(len(padded) - 2):
+            out[zlib.crc32(padded[j:j + 3].encode('utf-8')) % self.dimension] += 1.0
+        for word in lowered.split():
+            out[zlib.crc32(word.encode('utf-8')) % self.dimension] += 2.0
+
+    def encode(self, sentences, batch_size: int = 32, show_progress_bar: bool = None,
+               convert_to_numpy: bool = True, convert_to_tensor: bool = False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        embeddings = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for i, text in enumerate(texts):
+            self._encode_one(text, embeddings[i])
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings /= np.maximum(norms, 1e-12)
+        if single:
+            embeddings = embeddings[0]
+        if convert_to_tensor:
+            import torch
+            return torch.from_numpy(embeddings)
+        return embeddings
+
+
+# ==============================================================================
+# 计时
+# ==============================================================================
+
+class StageTimer:
+    """按阶段记录耗时、处理条目数、吞吐量和阶段内的峰值内存。"""
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, float]] = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str, items: int, quiet: bool = True):
+        sink = io.StringIO()
+        start = time.perf_counter()
+        with RssWindow() as rss, contextlib.redirect_stdout(sink) if quiet else contextlib.nullcontext():
+            yield
+        elapsed = time.perf_counter() - start
+        self.stages[name] = {
+            "seconds": elapsed,
+            "items": items,
+            "items_per_second": items / elapsed if elapsed > 0 else float('inf'),
+            "peak_rss_mb": rss.peak_mb,
+        }
+
+
+# ==============================================================================
+# 基准
+# ==============================================================================
+
+def bench_extract(n_files: int, workers: int = 1, seed: int = 0, items_per_file: int = 20) -> Dict[str, Dict[str, float]]:
+    """对 n_files 个合成文件运行提取各阶段的基准。"""
+    import simple
+
+    timer = StageTimer()
+    with tempfile.TemporaryDirectory(prefix="bench_extract_") as tmp:
+        corpus_dir = os.path.join(tmp, "corpus")
+        output_dir = os.path.join(tmp, "output")
+        os.makedirs(output_dir)
+        total_values = generate_corpus(corpus_dir, n_files, items_per_file=items_per_file, seed=seed)
+        file_paths = simple.list_json_files(corpus_dir)
+
+        with timer.stage('parse', len(file_paths)):
+            documents = []
+            for path in file_paths:
+                with open(path, 'r', encoding='utf-8') as f:
+                    documents.append(simple._unwrap_record(json.load(f)))
+
+        with timer.stage('walk', total_values):
+            per_file = []
+            for document in documents:
+                results = {key: {"unique_values": set(), "all_values": []} for key in EXTRACT_KEYS}
+                simple.extract_values(document, EXTRACT_KEYS, results)
+                per_file.append(results)
+        del documents
+
+        with timer.stage('count', total_values):
+            aggregated = {key: {"unique_values": set(), "counter": Counter()} for key in EXTRACT_KEYS}
+            for results in per_file:
+                for key in EXTRACT_KEYS:
+                    aggregated[key]["unique_values"].update(results[key]["unique_values"])
+                    aggregated[key]["counter"].update(results[key]["all_values"])
+        del per_file
+
+        with timer.stage('save', sum(len(aggregated[key]["counter"]) for key in EXTRACT_KEYS)):
+            simple.save_results(aggregated, EXTRACT_KEYS, output_dir)
+
+        with timer.stage('process_directory', len(file_paths)):
+            simple.process_directory(corpus_dir, EXTRACT_KEYS, workers=workers)
+    return timer.stages
+
+
+def bench_cluster(n_terms: int, seed: int = 0, config_overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Dict[str, float]]:
+    """对 n_terms 个 Zipf 分布的合成属性运行聚类各阶段的基准。"""
+    from embedding_store import EmbeddingStore
+    from main import PropertyClusterAnalyzer
+
+    timer = StageTimer()
+    with tempfile.TemporaryDirectory(prefix="bench_cluster_") as tmp:
+        input_path = os.path.join(tmp, "terms.json")
+        write_analyzer_input(input_path, generate_zipf_terms(n_terms, seed=seed))
+        config = {
+            "input_json_path": input_path,
+            "output_csv_path": os.path.join(tmp, "clusters.csv"),
+            "field_to_analyze": 'names_frequency',
+            "sbert_model": 'fake-encoder',
+            "primary_cluster_threshold": 0.85,
+            "secondary_cluster_threshold": 0.95,
+            "min_community_size": 2,
+            "cluster_backend": 'dense',
+            "embedding_cache_dir": None,
+            "file_count_for_threshold": 1000,
+            "frequency_threshold_percent": 0.01,
+        }
+        config.update(config_overrides or {})
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            analyzer = PropertyClusterAnalyzer(config, model=FakeEncoder())
+
+        with timer.stage('load', n_terms):
+            analyzer._load_data()
+            analyzer._canonicalize()
+            analyzer._split_frequency_tiers()
+        n_clustered = len(analyzer.terms_to_cluster)
+
+        with timer.stage('encode', n_clustered):
+            with analyzer._encoder() as encoder:
+                analyzer.store = EmbeddingStore.build(encoder, analyzer.terms_to_cluster,
+                                                      device=analyzer._device, show_progress_bar=False)
+
+        _warm_up_backend(analyzer)
+        with timer.stage('primary', n_clustered):
+            primary_clusters = analyzer._perform_primary_clustering()
+
+        with timer.stage('secondary', sum(len(c['members']) for c in primary_clusters)):
+            final_clusters = analyzer._perform_secondary_clustering(primary_clusters)
+            if analyzer.tail_terms:
+                analyzer._assign_tail(final_clusters)
+
+        with timer.stage('csv_write', n_terms):
+            analyzer._save_results_to_csv(final_clusters)
+    return timer.stages
+
+
+def _warm_up_backend(analyzer, n_rows: int = 64):
+    """
+    在前 n_rows 个属性上调用一次聚类后端。后端在首次调用时才导入 torch/sentence_transformers
+    等重型模块，这部分一次性开销与规模无关，不应计入 primary 阶段（否则缩放指数失真）。
+    """
+    from cluster_backends import DEFAULT_MEMORY_BUDGET_MB, get_backend
+
+    n_rows = min(n_rows, len(analyzer.terms_to_cluster))
+    if n_rows == 0:
+        return
+    config = analyzer.config
+    get_backend(config.get('cluster_backend', 'dense'))(
+        analyzer.store.matrix()[:n_rows],
+        min_community_size=config['min_community_size'],
+        threshold=config['primary_cluster_threshold'],
+        device=analyzer._device,
+        memory_budget_mb=config.get('cluster_memory_budget_mb', DEFAULT_MEMORY_BUDGET_MB),
+        terms=analyzer.terms_to_cluster[:n_rows],
+        **analyzer._minhash_options()
+    )
+
+
+def synthetic_primary_clusters(n_clusters: int, seed: int = 0, min_size: int = 2, max_size: int = 6,
+                               dimension: int = 384) -> Tuple[np.ndarray, List[int]]:
+    """
+    合成第二轮聚类的输入: n_clusters 个首尾相接的小主簇，每个簇的成员围绕一个随机中心，
+    部分成员之间的相似度高于第二轮阈值。
+
+    Returns:
+        (拼接的嵌入矩阵, 每个簇的大小)。
+    """
+    rng = np.random.default_rng(seed)
+    sizes = rng.integers(min_size, max_size + 1, size=n_clusters)
+    centers = rng.standard_normal((n_clusters, dimension)).astype(np.float32)
+    embeddings = np.repeat(centers, sizes, axis=0)
+    embeddings += rng.standard_normal(embeddings.shape).astype(np.float32) * rng.uniform(0.1, 0.4, size=(len(embeddings), 1)).astype(np.float32)
+    return embeddings, sizes.tolist()
+
+
+def bench_secondary(n_clusters: int, seed: int = 0, batch_rows: int = 512) -> Dict[str, Dict[str, float]]:
+    """
+    第二轮聚类: 逐簇调用 `util.community_detection`（原实现）与块对角批处理
+    (`block_diagonal_communities`，按 batch_rows 打包) 的对比，并检查两者的子簇一致。
+    """
+    import torch
+    from sentence_transformers import util
+
+    from cluster_backends import block_diagonal_communities
+
+    threshold = 0.95
+    embeddings, sizes = synthetic_primary_clusters(n_clusters, seed=seed)
+    offsets = np.concatenate([[0], np.cumsum(sizes)]).tolist()
+    timer = StageTimer()
+    # 预热 torch，避免把首次调用的开销计入逐簇循环
+    util.community_detection(torch.from_numpy(embeddings[:sizes[0]]), min_community_size=1, threshold=threshold)
+
+    with timer.stage('per_cluster', n_clusters):
+        tensor = torch.from_numpy(embeddings)
+        per_cluster = [util.community_detection(tensor[offsets[i]:offsets[i + 1]], min_community_size=1, threshold=threshold)
+                       for i in range(n_clusters)]
+
+    with timer.stage('batched', n_clusters):
+        batched: List[List[List[int]]] = []
+        start = 0
+        while start < n_clusters:
+            stop = start + 1
+            while stop < n_clusters and offsets[stop + 1] - offsets[start] <= batch_rows:
+                stop += 1
+            batched.extend(block_diagonal_communities(embeddings[offsets[start]:offsets[stop]], sizes[start:stop], threshold))
+            start = stop
+
+    normalize = lambda communities: sorted(sorted(community) for community in communities)
+    mismatches = sum(normalize(a) != normalize(b) for a, b in zip(per_cluster, batched))
+    timer.stages['batched']['mismatched_clusters'] = mismatches
+    return timer.stages
+
+
+def _run_isolated(function: Callable, *args) -> Dict[str, Dict[str, float]]:
+    """在独立的子进程中运行一次基准，使每个规模的峰值内存互不影响。"""
+    # ProcessPoolExecutor 的工作进程不是守护进程，基准内部还可以再启动进程池（如多进程编码）
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return executor.submit(function, *args).result()
+
+
+def scaling_exponents(sizes: Sequence[int], runs: Sequence[Dict[str, Dict[str, float]]], stages: Sequence[str]) -> Dict[str, float]:
+    """对每个阶段在对数坐标下拟合 耗时 ∝ n^k，返回各阶段的 k。"""
+    exponents = {}
+    log_sizes = np.log(np.asarray(sizes, dtype=np.float64))
+    for stage in stages:
+        seconds = [run[stage]["seconds"] for run in runs if stage in run]
+        if len(seconds) != len(sizes) or min(seconds) <= 0:
+            continue
+        slope, _ = np.polyfit(log_sizes, np.log(seconds), 1)
+        exponents[stage] = float(slope)
+    return exponents
+
+
+def print_report(title: str, sizes: Sequence[int], runs: Sequence[Dict[str, Dict[str, float]]],
+                 stages: Sequence[str], unit: str):
+    print(f"\n=== {title} ===")
+    print(f"{'规模(' + unit + ')':>12} {'阶段':<18} {'耗时(s)':>10} {'条目':>10} {'吞吐(条/s)':>14} {'峰值RSS(MB)':>12}")
+    for size, run in zip(sizes, runs):
+        for stage in stages:
+            if stage not in run:
+                continue
+            s = run[stage]
+            print(f"{size:>12} {stage:<18} {s['seconds']:>10.3f} {s['items']:>10} {s['items_per_second']:>14.1f} {s['peak_rss_mb']:>12.1f}")
+    if len(sizes) > 1:
+        print("伸缩指数 (耗时 ∝ n^k):")
+        for stage, k in scaling_exponents(sizes, runs, stages).items():
+            print(f"  - {stage:<18} k = {k:.2f}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="提取与聚类各阶段的可复现基准测试（使用合成数据和确定性编码器，可离线运行）。")
+    parser.add_argument("suite", choices=["extract", "cluster", "secondary", "all"], help="要运行的基准")
+    parser.add_argument("--sizes", type=int, nargs="+", help="规模列表: extract 为文件数，cluster 为属性数，secondary 为主簇数")
+    parser.add_argument("--extract-sizes", type=int, nargs="+", default=[100, 400, 1600], help="suite=all 时的提取规模")
+    parser.add_argument("--cluster-sizes", type=int, nargs="+", default=[1000, 4000, 16000], help="suite=all 时的聚类规模")
+    parser.add_argument("--items-per-file", type=int, default=20, help="每个合成文件中的材料条目数")
+    parser.add_argument("--workers", type=int, default=1, help="process_directory 阶段使用的进程数")
+    parser.add_argument("--config", default="{}", help="覆盖聚类配置的 JSON 字符串，例如 '{\"cluster_backend\": \"blocked\"}'")
+    parser.add_argument("--batch-rows", type=int, default=512, help="secondary 基准中每个块对角批次的最大行数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--in-process", action="store_true", help="不为每个规模启动子进程（前一规模未归还给系统的内存会计入后续规模的峰值）")
+    parser.add_argument("--output", help="把结果写入该 JSON 文件")
+    args = parser.parse_args(argv)
+
+    run = (lambda function, *a: function(*a)) if args.in_process else _run_isolated
+    config_overrides = json.loads(args.config)
+    report: Dict[str, Any] = {"seed": args.seed}
+
+    if args.suite in ("extract", "all"):
+        sizes = args.sizes if args.suite == "extract" and args.sizes else args.extract_sizes
+        runs = [run(bench_extract, n, args.workers, args.seed, args.items_per_file) for n in sizes]
+        print_report("提取基准", sizes, runs, EXTRACT_STAGES, "文件")
+        report["extract"] = {"sizes": sizes, "runs": runs, "scaling": scaling_exponents(sizes, runs, EXTRACT_STAGES)}
+
+    if args.suite in ("cluster", "all"):
+        sizes = args.sizes if args.suite == "cluster" and args.sizes else args.cluster_sizes
+        runs = [run(bench_cluster, n, args.seed, config_overrides) for n in sizes]
+        print_report("聚类基准", sizes, runs, CLUSTER_STAGES, "属性")
+        report["cluster"] = {"sizes": sizes, "runs": runs, "config": config_overrides,
+                             "scaling": scaling_exponents(sizes, runs, CLUSTER_STAGES)}
+
+    if args.suite == "secondary":
+        sizes = args.sizes or [5000, 20000]
+        runs = [run(bench_secondary, n, args.seed, args.batch_rows) for n in sizes]
+        print_report(f"第二轮聚类基准 (batch_rows={args.batch_rows})", sizes, runs, SECONDARY_STAGES, "主簇")
+        for size, result in zip(sizes, runs):
+            print(f"  - {size} 个主簇: 与逐簇计算结果不一致的簇 {result['batched']['mismatched_clusters']} 个")
+        report["secondary"] = {"sizes": sizes, "runs": runs, "batch_rows": args.batch_rows}
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+嵌入前的词法规范化与精确去重。
+
+很多属性只在大小写、空白、引号或括号后缀上有差异，例如
+"Carrier Concentration" 与 "Carrier concentration"，或材料名称中带引号的写法。
+本模块按可配置的规则计算每个属性的规范化键，把键相同的属性合并为一个代表项
+（频次最高的写法），频次求和；聚类完成后再展开回所有原始写法。
+这样可以同时缩小编码器和 O(n²) 聚类阶段的输入规模。
+
+可用规则:
+- `unicode`: Unicode NFKC 规范化（全角/半角、兼容字符等）。
+- `whitespace`: 去除首尾空白并把连续空白折叠为一个空格。
+- `quotes`: 去除各种引号字符。
+- `case`: 忽略大小写 (casefold)。
+- `parenthetical`: 去除末尾的括号说明，如 "QDs (sensitizer)" -> "QDs"。氧化态、电荷和物相
+  标注（如 "Iron (III)"、"Fe (2+)"、"NaCl (aq)"）区分的是不同的物质，保持不变。
+"""
+import re
+import unicodedata
+from typing import Callable, Dict, List, Sequence, Tuple
+
+_WHITESPACE = re.compile(r'\s+')
+_QUOTES = re.compile(r'["\'`‘’“”«»]')
+_TRAILING_PARENTHETICAL = re.compile(r'\s*[\(\[（【]([^\(\)\[\]（）【】]*)[\)\]）】]\s*$')
+# 罗马数字氧化态 (III)、(+II)，电荷 (2+)、(+3)、(-)，以及它们的组合 (II/III)；物相 (s)、(aq) 等。
+# 单独的 (V) 通常是电压单位而不是 +5 价，仍按普通括号说明去除
+_OXIDATION_STATE = r'[+-]?(?:I{1,3}|IV|VI{1,3}|IX|X)|\d*[+-]|[+-]\d+'
+_CHEMICAL_PARENTHETICAL = re.compile(rf'(?:{_OXIDATION_STATE})(?:\s*[,/]\s*(?:{_OXIDATION_STATE}))*|s|l|g|aq|cr|am')
+
+
+def _strip_parenthetical(s: str) -> str:
+    """去除末尾的括号说明；氧化态、电荷和物相标注除外。"""
+    match = _TRAILING_PARENTHETICAL.search(s)
+    if match is None or _CHEMICAL_PARENTHETICAL.fullmatch(match.group(1).strip()):
+        return s
+    return s[:match.start()] or s
+
+
+RULES: Dict[str, Callable[[str], str]] = {
+    'unicode': lambda s: unicodedata.normalize('NFKC', s),
+    'quotes': lambda s: _QUOTES.sub('', s),
+    'parenthetical': _strip_parenthetical,
+    'whitespace': lambda s: _WHITESPACE.sub(' ', s).strip(),
+    'case': lambda s: s.casefold(),
+}
+# 规则的固定执行顺序（与配置中的书写顺序无关）
+RULE_ORDER = ['unicode', 'quotes', 'parenthetical', 'whitespace', 'case']
+
+
+def canonical_key(term: str, rules: Sequence[str]) -> str:
+    """按规则计算属性的规范化键。"""
+    unknown = set(rules) - set(RULES)
+    if unknown:
+        raise ValueError(f"未知的规范化规则: {', '.join(sorted(unknown))}，可选: {', '.join(RULE_ORDER)}")
+    key = term
+    for name in RULE_ORDER:
+        if name in rules:
+            key = RULES[name](key)
+    return key
+
+
+def collapse_terms(terms: Sequence[str], counts: Dict[str, int],
+                   rules: Sequence[str]) -> Tuple[List[str], Dict[str, int], Dict[str, List[str]]]:
+    """
+    把规范化键相同的属性合并为一个代表项。
+
+    Args:
+        terms: 原始属性列表。
+        counts: 原始属性的频次。
+        rules: 规范化规则列表。
+
+    Returns:
+        (代表项列表, 代表项的合并频次, 代表项 -> 其所有原始写法)。代表项为组内频次
+        最高的写法（频次相同时取先出现者），代表项列表保持各组首次出现的顺序；
+        只有包含多个写法的组才会出现在第三个返回值中。
+    """
+    groups: Dict[str, List[str]] = {}
+    for term in terms:
+        groups.setdefault(canonical_key(term, rules), []).append(term)
+
+    representatives = []
+    merged_counts = {}
+    variants = {}
+    for members in groups.values():
+        representative = max(members, key=lambda t: counts.get(t, 0))
+        representatives.append(representative)
+        merged_counts[representative] = sum(counts.get(t, 0) for t in members)
+        if len(members) > 1:
+            variants[representative] = members
+    return representatives, merged_counts, variants
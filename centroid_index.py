@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+簇质心索引。
+
+每个簇保存其成员归一化嵌入之和以及成员数量，质心即两者之商再归一化。
+这样在新成员加入时可以直接累加更新，无需重新读取全部成员的嵌入。
+用于把新属性分配到已有簇中（增量分配、长尾分配等）。
+"""
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from cluster_backends import DEFAULT_MEMORY_BUDGET_MB, _rows_per_block, normalize_embeddings
+
+
+class CentroidIndex:
+    """
+    一个“簇 ID -> 质心”的索引，支持批量最近质心查询与增量更新。
+
+    Args:
+        cluster_ids: 簇 ID 列表。
+        sums: 形状为 (k, d) 的矩阵，每行是该簇成员归一化嵌入之和。
+        sizes: 每个簇的成员数量。
+    """
+
+    def __init__(self, cluster_ids: Sequence[str], sums: np.ndarray, sizes: Sequence[int]):
+        self.cluster_ids: List[str] = [str(cid) for cid in cluster_ids]
+        self.positions: Dict[str, int] = {cid: i for i, cid in enumerate(self.cluster_ids)}
+        self.sums = np.asarray(sums, dtype=np.float32)
+        self.sizes = np.asarray(sizes, dtype=np.int64)
+        self._centroids: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_members(cls, cluster_ids: Sequence[str], member_rows: Sequence[Sequence[int]],
+                     embeddings: np.ndarray) -> "CentroidIndex":
+        """根据每个簇成员在嵌入矩阵中的行号构建索引。"""
+        embeddings = normalize_embeddings(embeddings)
+        dim = embeddings.shape[1] if embeddings.ndim == 2 else 0
+        sums = np.zeros((len(cluster_ids), dim), dtype=np.float32)
+        for i, rows in enumerate(member_rows):
+            if len(rows):
+                sums[i] = embeddings[np.asarray(rows, dtype=np.int64)].sum(axis=0)
+        return cls(cluster_ids, sums, [len(rows) for rows in member_rows])
+
+    def __len__(self) -> int:
+        return len(self.cluster_ids)
+
+    @property
+    def centroids(self) -> np.ndarray:
+        """归一化后的质心矩阵（惰性计算并缓存）。"""
+        if self._centroids is None:
+            self._centroids = normalize_embeddings(self.sums)
+        return self._centroids
+
+    def add(self, cluster_id: str, vectors: np.ndarray):
+        """把若干新成员的嵌入累加到已有簇，或创建一个新簇。"""
+        vectors = normalize_embeddings(np.atleast_2d(vectors))
+        if cluster_id in self.positions:
+            pos = self.positions[cluster_id]
+            self.sums[pos] += vectors.sum(axis=0)
+            self.sizes[pos] += len(vectors)
+        else:
+            self.positions[cluster_id] = len(self.cluster_ids)
+            self.cluster_ids.append(cluster_id)
+            self.sums = np.vstack([self.sums, vectors.sum(axis=0, keepdims=True)]) if len(self.sums) else vectors.sum(axis=0, keepdims=True)
+            self.sizes = np.append(self.sizes, len(vectors))
+        self._centroids = None
+
+    def nearest(self, vectors: np.ndarray,
+                memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        分块查询每个向量最近的质心。
+
+        Returns:
+            (质心位置数组, 余弦相似度数组)；索引为空时位置为 -1、相似度为 -inf。
+        """
+        vectors = normalize_embeddings(vectors)
+        positions = np.full(len(vectors), -1, dtype=np.int64)
+        scores = np.full(len(vectors), -np.inf, dtype=np.float32)
+        if len(self) == 0 or len(vectors) == 0:
+            return positions, scores
+        centroids = self.centroids
+        block = _rows_per_block(len(centroids), memory_budget_mb)
+        for start in range(0, len(vectors), block):
+            sims = vectors[start:start + block] @ centroids.T
+            best = np.argmax(sims, axis=1)
+            positions[start:start + block] = best
+            scores[start:start + block] = sims[np.arange(len(best)), best]
+        return positions, scores
+
+    def save(self, path: str, fingerprint: str = ""):
+        """保存到 .npz 文件，`fingerprint` 用于校验与之对应的簇输出文件。"""
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, cluster_ids=np.asarray(self.cluster_ids, dtype=str), sums=self.sums,
+                 sizes=self.sizes, fingerprint=np.asarray(fingerprint))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Tuple["CentroidIndex", str]:
+        """
+        从 .npz 文件加载，返回 (索引, 指纹)。簇 ID 以定长字符串数组保存，读取时不启用 pickle；
+        无法读取的文件（例如旧版本以 object 数组保存的簇 ID）抛出 ValueError。
+        """
+        with np.load(path, allow_pickle=False) as data:
+            index = cls(data["cluster_ids"].tolist(), data["sums"], data["sizes"])
+            return index, str(data["fingerprint"])
@@ -0,0 +1,88 @@
+"""
+分析流程各阶段的检查点。
+
+每个阶段的输出连同一个输入指纹保存到检查点目录中。指纹由上一阶段的指纹和
+本阶段用到的配置项计算得到，形成一条链: 任何一项输入或配置变化都会使该阶段
+及其后的所有阶段失效，而之前的阶段可以直接从磁盘恢复。因此只调整后面阶段的
+参数（例如第二轮阈值或频率筛选阈值）时，不需要重新编码和重新执行第一轮聚类。
+
+目录结构:
+- `index.json`: 阶段名 -> 指纹；
+- `<阶段名>.pkl`: 该阶段的输出（pickle，numpy 数组以原生格式序列化）。
+"""
+import hashlib
+import json
+import os
+import pickle
+from typing import Any, Dict, Optional
+
+INDEX_FILE = "index.json"
+
+
+def path_fingerprint(path: str) -> str:
+    """返回文件或目录的指纹（大小与修改时间）；目录会包含其中所有文件。路径不存在时返回空字符串。"""
+    if not os.path.exists(path):
+        return ""
+    if not os.path.isdir(path):
+        stat = os.stat(path)
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+    parts = []
+    for root, _, files in sorted(os.walk(path)):
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            stat = os.stat(file_path)
+            parts.append(f"{os.path.relpath(file_path, path)}={stat.st_size}:{stat.st_mtime_ns}")
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def stage_fingerprint(*parts: Any) -> str:
+    """把任意可 JSON 序列化的输入组合成一个指纹。"""
+    encoded = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+class CheckpointStore:
+    """
+    一个按阶段名保存输出的检查点目录。
+
+    Args:
+        directory: 检查点目录，不存在时自动创建。
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.index: Dict[str, str] = {}
+        index_path = os.path.join(directory, INDEX_FILE)
+        if os.path.exists(index_path):
+            try:
+                with open(index_path, 'r', encoding='utf-8') as f:
+                    self.index = json.load(f)
+            except (json.JSONDecodeError, OSError) as e:
+                print(f"警告: 检查点索引无法读取，将重新计算所有阶段: {e}")
+
+    def _stage_path(self, stage: str) -> str:
+        return os.path.join(self.directory, f"{stage}.pkl")
+
+    def load(self, stage: str, fingerprint: str) -> Optional[Any]:
+        """指纹匹配时返回该阶段保存的输出，否则返回 None。"""
+        if self.index.get(stage) != fingerprint or not os.path.exists(self._stage_path(stage)):
+            return None
+        try:
+            with open(self._stage_path(stage), 'rb') as f:
+                return pickle.load(f)
+        except (pickle.UnpicklingError, EOFError, OSError) as e:
+            print(f"警告: 检查点 '{stage}' 无法读取，将重新计算: {e}")
+            return None
+
+    def save(self, stage: str, fingerprint: str, payload: Any):
+        """原子地保存一个阶段的输出并更新索引。"""
+        tmp_path = self._stage_path(stage) + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._stage_path(stage))
+        self.index[stage] = fingerprint
+        index_tmp = os.path.join(self.directory, INDEX_FILE + ".tmp")
+        with open(index_tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, ensure_ascii=False, indent=2)
+        os.replace(index_tmp, os.path.join(self.directory, INDEX_FILE))
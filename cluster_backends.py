@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""
+可插拔的社区发现聚类后端。
+
+`sentence_transformers.util.community_detection` 会构建一个稠密的 n×n 余弦
+相似度矩阵，这对几千个属性没有问题，但对十几万个材料名称就会耗尽内存。
+本模块提供与之语义一致（相同的 threshold / min_community_size 含义）的几个
+后端，分析器可以通过配置项 `cluster_backend` 选择:
+
+- `dense`: 直接调用 `util.community_detection`（默认，适合小规模数据）。
+- `blocked`: 分块精确近邻搜索，在固定内存预算内逐块计算相似度。
+- `ivf`: 基于倒排文件 (IVF) 的近似近邻搜索，纯 CPU 实现，只在相邻的
+  粗聚类单元内计算相似度，适合数十万到上百万个属性。
+- `minhash`: 先按字符 n-gram MinHash/LSH 分桶，只对字面相近的候选对计算相似度，
+  适合化学式一类的材料名称（见 minhash_lsh.py）。
+
+所有后端都接收 numpy 嵌入矩阵，返回按簇大小降序排列的行号列表。`blocked` 后端
+还可以直接接收低精度的 `QuantizedEmbeddings`（见 quantization.py），其余后端直接
+使用它在磁盘上的完整精度参考副本。
+"""
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from quantization import DEFAULT_RESCORE_MARGIN, QuantizedEmbeddings
+
+DEFAULT_MEMORY_BUDGET_MB = 256
+
+
+def normalize_embeddings(embeddings: np.ndarray) -> np.ndarray:
+    """将嵌入按行归一化为单位向量（float32）。"""
+    if isinstance(embeddings, QuantizedEmbeddings):
+        embeddings = embeddings.reference
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return embeddings / norms
+
+
+def _rows_per_block(n_columns: int, memory_budget_mb: float) -> int:
+    """根据内存预算计算每块可以处理的行数（相似度块及其临时数组约占 3 份 float32）。"""
+    budget_bytes = memory_budget_mb * 1024 * 1024
+    return max(1, int(budget_bytes // (max(n_columns, 1) * 4 * 3)))
+
+
+def _collect_communities(rows: np.ndarray, columns: np.ndarray, scores: np.ndarray,
+                         threshold: float, min_community_size: int, communities: List[Tuple[int, List[int]]]):
+    """
+    从一个相似度块中收集候选社区，以 (查询行号, 社区成员) 的形式追加到 `communities`。
+
+    Args:
+        rows: 块内每一行对应的全局行号。
+        columns: 块内每一列对应的全局行号。
+        scores: 形状为 (len(rows), len(columns)) 的相似度块。
+    """
+    mask = scores >= threshold
+    counts = mask.sum(axis=1)
+    for i in np.flatnonzero(counts >= min_community_size):
+        hit = np.flatnonzero(mask[i])
+        order = np.argsort(-scores[i, hit], kind="stable")
+        communities.append((int(rows[i]), columns[hit[order]].tolist()))
+
+
+def _collect_rescored_communities(start: int, n_rows: int, rows: np.ndarray, columns: np.ndarray, scores: np.ndarray,
+                                  threshold: float, min_community_size: int, communities: List[Tuple[int, List[int]]]):
+    """
+    与 `_collect_communities` 相同，但输入是重打分后的稀疏候选对
+    (块内行号, 全局列号, 相似度)，按行号、列号升序排列。
+    """
+    keep = scores >= threshold
+    rows, columns, scores = rows[keep], columns[keep], scores[keep]
+    bounds = np.searchsorted(rows, np.arange(n_rows + 1))
+    for i in np.flatnonzero(np.diff(bounds) >= min_community_size):
+        lo, hi = bounds[i], bounds[i + 1]
+        order = np.argsort(-scores[lo:hi], kind="stable")
+        communities.append((start + int(i), columns[lo:hi][order].tolist()))
+
+
+def finalize_communities(extracted_communities: List[List[int]], min_community_size: int) -> List[List[int]]:
+    """
+    去除重叠社区：从最大的社区开始，每个属性只保留在第一个包含它的社区中。
+
+    与 `util.community_detection` 的第二步完全一致。
+    """
+    extracted_communities = sorted(extracted_communities, key=lambda x: len(x), reverse=True)
+    unique_communities = []
+    extracted_ids = set()
+    for community in extracted_communities:
+        non_overlapped_community = [idx for idx in community if idx not in extracted_ids]
+        if len(non_overlapped_community) >= min_community_size:
+            unique_communities.append(non_overlapped_community)
+            extracted_ids.update(non_overlapped_community)
+    return sorted(unique_communities, key=lambda x: len(x), reverse=True)
+
+
+def dense_community_detection(embeddings: np.ndarray, threshold: float, min_community_size: int,
+                              device: Optional[str] = None, **_) -> List[List[int]]:
+    """使用 `sentence_transformers.util.community_detection` 的稠密实现。device 为 None 时自动选择。"""
+    import torch
+    from sentence_transformers import util
+
+    if device is None:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+    if isinstance(embeddings, QuantizedEmbeddings):
+        embeddings = np.array(embeddings.reference)
+    tensor = torch.from_numpy(np.ascontiguousarray(embeddings, dtype=np.float32)).to(device)
+    return util.community_detection(tensor, min_community_size=min_community_size, threshold=threshold)
+
+
+def blocked_community_detection(embeddings: np.ndarray, threshold: float, min_community_size: int,
+                                memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB, rescore_margin: float = None,
+                                **_) -> List[List[int]]:
+    """
+    分块精确近邻社区发现。
+
+    每次只计算一块行与全部属性的相似度，块大小由 `memory_budget_mb` 决定，
+    因此峰值内存与 n 成线性关系而不是平方关系。
+
+    传入 `QuantizedEmbeddings` 时，相似度块由低精度数据计算，所有不低于
+    `threshold - rescore_margin` 的候选再用完整精度重新打分，结果与 float32 一致。
+    """
+    quantized = isinstance(embeddings, QuantizedEmbeddings)
+    if quantized:
+        margin = DEFAULT_RESCORE_MARGIN[embeddings.precision] if rescore_margin is None else rescore_margin
+    else:
+        embeddings = normalize_embeddings(embeddings)
+    n = len(embeddings)
+    if n == 0:
+        return []
+    min_community_size = min(min_community_size, n)
+    block = _rows_per_block(n, memory_budget_mb)
+    columns = np.arange(n)
+
+    communities: List[Tuple[int, List[int]]] = []
+    for start in range(0, n, block):
+        stop = min(start + block, n)
+        if quantized:
+            rows, hits, exact = embeddings.rescore(start, embeddings.block_scores(start, stop), threshold - margin)
+            _collect_rescored_communities(start, stop - start, rows, hits, exact, threshold, min_community_size, communities)
+        else:
+            scores = embeddings[start:stop] @ embeddings.T
+            _collect_communities(columns[start:stop], columns, scores, threshold, min_community_size, communities)
+    return finalize_communities([community for _, community in communities], min_community_size)
+
+
+class IVFIndex:
+    """
+    一个简单的倒排文件 (IVF) 索引：先用球面 k-means 把向量划分到若干粗聚类
+    单元，查询时只在最近的 `n_probe` 个单元内计算相似度。
+
+    Args:
+        embeddings: 已归一化的嵌入矩阵。
+        n_lists: 粗聚类单元数量，默认约为 sqrt(n)。
+        n_iter: k-means 迭代次数。
+        seed: 随机种子，保证结果可复现。
+    """
+
+    def __init__(self, embeddings: np.ndarray, n_lists: int = None, n_iter: int = 10, seed: int = 0,
+                 memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB):
+        self.embeddings = embeddings
+        self.memory_budget_mb = memory_budget_mb
+        n = len(embeddings)
+        self.n_lists = max(1, min(n_lists or int(np.sqrt(n)), n))
+        rng = np.random.default_rng(seed)
+
+        # 在样本上训练质心
+        sample_size = min(n, self.n_lists * 256)
+        sample = embeddings[rng.choice(n, size=sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, size=self.n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            labels = self._nearest(sample, centroids)
+            for c in range(self.n_lists):
+                members = sample[labels == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = normalize_embeddings(centroids)
+        self.centroids = centroids
+
+        labels = self._nearest(embeddings, centroids)
+        order = np.argsort(labels, kind="stable")
+        bounds = np.searchsorted(labels[order], np.arange(self.n_lists + 1))
+        self.lists = [order[bounds[c]:bounds[c + 1]] for c in range(self.n_lists)]
+
+    def _nearest(self, vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        """分块计算每个向量最近的质心编号。"""
+        labels = np.empty(len(vectors), dtype=np.int64)
+        block = _rows_per_block(len(centroids), self.memory_budget_mb)
+        for start in range(0, len(vectors), block):
+            labels[start:start + block] = np.argmax(vectors[start:start + block] @ centroids.T, axis=1)
+        return labels
+
+    def probe_lists(self, n_probe: int) -> np.ndarray:
+        """返回每个单元最近的 `n_probe` 个单元（包含其自身）。"""
+        n_probe = max(1, min(n_probe, self.n_lists))
+        centroid_scores = self.centroids @ self.centroids.T
+        np.fill_diagonal(centroid_scores, np.inf)
+        return np.argsort(-centroid_scores, axis=1, kind="stable")[:, :n_probe]
+
+
+def ivf_community_detection(embeddings: np.ndarray, threshold: float, min_community_size: int,
+                            memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB, n_lists: int = None,
+                            n_probe: int = 8, seed: int = 0, **_) -> List[List[int]]:
+    """
+    基于 IVF 近似近邻的社区发现。
+
+    每个粗聚类单元内的属性只与最近 `n_probe` 个单元中的属性比较相似度，
+    因此计算量约为 O(n * n * n_probe / n_lists)。阈值和最小簇大小的语义与
+    精确后端一致，只是可能漏掉落在未探测单元中的少量近邻。
+    """
+    embeddings = normalize_embeddings(embeddings)
+    n = len(embeddings)
+    if n == 0:
+        return []
+    min_community_size = min(min_community_size, n)
+    index = IVFIndex(embeddings, n_lists=n_lists, seed=seed, memory_budget_mb=memory_budget_mb)
+    probes = index.probe_lists(n_probe)
+
+    communities: List[Tuple[int, List[int]]] = []
+    for c in range(index.n_lists):
+        queries = index.lists[c]
+        if len(queries) == 0:
+            continue
+        candidates = np.sort(np.concatenate([index.lists[p] for p in probes[c]]))
+        candidate_embeddings = embeddings[candidates]
+        block = _rows_per_block(len(candidates), memory_budget_mb)
+        for start in range(0, len(queries), block):
+            rows = queries[start:start + block]
+            scores = embeddings[rows] @ candidate_embeddings.T
+            _collect_communities(rows, candidates, scores, threshold, min_community_size, communities)
+
+    # 按查询行号排序，保持与精确后端一致的顺序，使去重叠步骤的结果可复现
+    communities.sort(key=lambda item: item[0])
+    return finalize_communities([community for _, community in communities], min_community_size)
+
+
+def _group_communities(embeddings: np.ndarray, start: int, size: int, threshold: float,
+                       memory_budget_mb: float) -> List[List[int]]:
+    """单个分组内的候选社区（局部行号），相似度矩阵超出内存预算时按行分块计算。"""
+    group = embeddings[start:start + size]
+    local = np.arange(size)
+    block = _rows_per_block(size, memory_budget_mb / 2)
+    communities: List[Tuple[int, List[int]]] = []
+    for row in range(0, size, block):
+        stop = min(row + block, size)
+        _collect_communities(local[row:stop], local, group[row:stop] @ group.T, threshold, 1, communities)
+    return [community for _, community in communities]
+
+
+def block_diagonal_communities(embeddings: np.ndarray, block_sizes: Sequence[int], threshold: float,
+                               min_community_size: int = 1,
+                               memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB) -> List[List[List[int]]]:
+    """
+    对若干首尾相接的独立分组同时做社区发现（块对角批处理）。
+
+    `embeddings` 由多个分组的嵌入按顺序拼接而成，`block_sizes` 给出每个分组的
+    行数。分组按大小排序后，大小相近（不超过该批最小分组的两倍）的分组补齐到同一
+    大小，用一次 (k, s, d) @ (k, d, s) 批量矩阵乘法计算各分组内部的相似度，计算量
+    与各分组相似度矩阵的总面积成正比，而不是与整个批次的平方成正比。相似度矩阵
+    超出内存预算的大分组单独按行分块计算。每个分组的结果与单独对该分组运行社区
+    发现完全相同；相似度以 float64 计算，使结果不受批次划分方式的影响。
+
+    Returns:
+        与 `block_sizes` 一一对应的社区列表，社区内的行号为分组内的局部行号。
+    """
+    embeddings = normalize_embeddings(embeddings).astype(np.float64)
+    block_sizes = np.asarray(block_sizes, dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(block_sizes)])
+    dimension = embeddings.shape[1] if embeddings.ndim == 2 else 0
+    budget_bytes = memory_budget_mb * 1024 * 1024
+    # 补齐后每个分组占用的字节数: 嵌入 (s, d) 与相似度块及其临时数组 (约 3 份 s×s)，均为 float64
+    group_bytes = lambda s: 8 * (s * dimension + 3 * s * s)
+
+    extracted: List[List[List[int]]] = [[] for _ in range(len(block_sizes))]
+    order = np.argsort(block_sizes, kind="stable")
+    sizes = block_sizes[order].tolist()
+    i = 0
+    while i < len(order):
+        size = sizes[i]
+        if size == 0:
+            i += 1
+            continue
+        if group_bytes(size) > budget_bytes:
+            b = int(order[i])
+            extracted[b] = _group_communities(embeddings, int(offsets[b]), size, threshold, memory_budget_mb)
+            i += 1
+            continue
+        j = i + 1
+        while j < len(order) and sizes[j] <= 2 * size and (j + 1 - i) * group_bytes(sizes[j]) <= budget_bytes:
+            j += 1
+        groups = order[i:j]
+        width = sizes[j - 1]
+        group_sizes = block_sizes[groups]
+        columns = np.arange(width)
+        valid = columns[None, :] < group_sizes[:, None]
+        rows = np.where(valid, offsets[groups][:, None] + columns[None, :], 0)
+        padded = embeddings[rows]
+        padded[~valid] = 0.0
+        scores = padded @ padded.transpose(0, 2, 1)
+        # 补齐的列不参与比较；每行的近邻按相似度降序（相同时按列号升序）排在前面
+        scores[~np.broadcast_to(valid[:, None, :], scores.shape)] = -np.inf
+        counts = (scores >= threshold).sum(axis=2).tolist()
+        neighbors = np.argsort(-scores, axis=2, kind="stable").tolist()
+        for g, b in enumerate(groups.tolist()):
+            extracted[b] = [neighbors[g][r][:counts[g][r]] for r in range(int(group_sizes[g])) if counts[g][r] >= 1]
+        i = j
+
+    return [
+        finalize_communities(block_communities, min(min_community_size, int(size)))
+        for block_communities, size in zip(extracted, block_sizes)
+    ]
+
+
+def minhash_community_detection(embeddings: np.ndarray, threshold: float, min_community_size: int,
+                                **kwargs) -> List[List[int]]:
+    """以字符 n-gram MinHash/LSH 分桶为前置步骤的社区发现，需要 `terms` 参数（见 minhash_lsh.py）。"""
+    from minhash_lsh import minhash_community_detection as detect
+    return detect(embeddings, threshold, min_community_size, **kwargs)
+
+
+BACKENDS: Dict[str, Callable[..., List[List[int]]]] = {
+    "dense": dense_community_detection,
+    "blocked": blocked_community_detection,
+    "ivf": ivf_community_detection,
+    "minhash": minhash_community_detection,
+}
+
+
+def get_backend(name: str) -> Callable[..., List[List[int]]]:
+    """按名称返回聚类后端函数。"""
+    if name not in BACKENDS:
+        raise ValueError(f"未知的聚类后端 '{name}'，可选: {', '.join(BACKENDS)}")
+    return BACKENDS[name]
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+列式的最终聚类结果。
+
+分析器的输出在内存中保存为若干平行数组，而不是逐行的列表: 属性文本只在词表中
+出现一次，输出行由属性 id 和频次数组表示，簇由行偏移量划分。这样在写出完整结果
+的同一次运行中，就可以用向量化操作完成后续步骤（去掉 'Others'、按簇总频次筛选、
+为每个簇选出代表属性），并同时写出筛选结果和代表属性文件，而不必再用 pandas
+重新读取和解析输出 CSV。
+"""
+import csv
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+CSV_HEADER = ['cluster_id', 'cluster_total_frequency', 'member_count', 'property', 'count']
+OTHERS_ID = 'Others'
+PARENT_COLUMN = 'parent_cluster_id'
+
+
+class ClusterResult:
+    """
+    列式的簇输出。第 i 个簇的输出行为 `[offsets[i], offsets[i + 1])`。
+
+    Attributes:
+        terms (List[str]): 词表，属性 id -> 属性文本。
+        term_ids (np.ndarray): 每一输出行的属性 id (int64)。
+        counts (np.ndarray): 每一输出行的属性频次 (int64)。
+        offsets (np.ndarray): 长度为 簇数+1 的行偏移量 (int64)。
+        cluster_ids (List[str]): 每个簇在输出中的 ID（数字编号或 'Others'）。
+        totals (np.ndarray): 每个簇的 cluster_total_frequency (int64)。
+        member_counts (np.ndarray): 每个簇的 member_count (int64)。筛选出代表属性后仍保留原簇的成员数。
+        parent_ids (Optional[List[str]]): 每个簇的上一级簇 ID（未归入上一级簇时为空字符串）；
+            不为 None 时写出 `parent_cluster_id` 列。
+    """
+
+    def __init__(self, terms: List[str], term_ids: np.ndarray, counts: np.ndarray, offsets: np.ndarray,
+                 cluster_ids: List[str], totals: np.ndarray, member_counts: Optional[np.ndarray] = None,
+                 parent_ids: Optional[List[str]] = None):
+        self.terms = terms
+        self.term_ids = np.asarray(term_ids, dtype=np.int64)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.cluster_ids = list(cluster_ids)
+        self.totals = np.asarray(totals, dtype=np.int64)
+        self.member_counts = np.diff(self.offsets) if member_counts is None else np.asarray(member_counts, dtype=np.int64)
+        self.parent_ids = parent_ids
+
+    @classmethod
+    def from_groups(cls, groups: Iterable[Tuple[str, int, Sequence[Tuple[str, int]]]]) -> "ClusterResult":
+        """
+        由 `(簇 ID, 簇总频次, [(属性, 频次), ...])` 序列构建结果，簇按给定顺序排列。
+        """
+        vocabulary: Dict[str, int] = {}
+        terms: List[str] = []
+        term_ids: List[int] = []
+        counts: List[int] = []
+        offsets = [0]
+        cluster_ids: List[str] = []
+        totals: List[int] = []
+        for cluster_id, total, members in groups:
+            for term, count in members:
+                term_id = vocabulary.get(term)
+                if term_id is None:
+                    term_id = vocabulary[term] = len(terms)
+                    terms.append(term)
+                term_ids.append(term_id)
+                counts.append(count)
+            offsets.append(len(term_ids))
+            cluster_ids.append(str(cluster_id))
+            totals.append(total)
+        return cls(terms, np.asarray(term_ids, dtype=np.int64), np.asarray(counts, dtype=np.int64),
+                   np.asarray(offsets, dtype=np.int64), cluster_ids, np.asarray(totals, dtype=np.int64))
+
+    @classmethod
+    def read_csv(cls, path: str) -> "ClusterResult":
+        """读取 `write_csv` 格式的簇 CSV；同一簇的行按该簇首次出现的位置归并在一起。"""
+        groups: Dict[str, list] = {}
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.DictReader(f)
+            has_parents = PARENT_COLUMN in (reader.fieldnames or [])
+            for row in reader:
+                group = groups.get(row['cluster_id'])
+                if group is None:
+                    group = groups[row['cluster_id']] = [int(row['cluster_total_frequency']), int(row['member_count']),
+                                                         row[PARENT_COLUMN] if has_parents else '', []]
+                group[3].append((row['property'], int(row['count'])))
+        result = cls.from_groups((cluster_id, total, members) for cluster_id, (total, _, _, members) in groups.items())
+        result.member_counts = np.asarray([group[1] for group in groups.values()], dtype=np.int64)
+        if has_parents:
+            result.parent_ids = [group[2] for group in groups.values()]
+        return result
+
+    def __len__(self) -> int:
+        """簇的数量。"""
+        return len(self.cluster_ids)
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.term_ids)
+
+    @property
+    def sizes(self) -> np.ndarray:
+        """每个簇的输出行数。"""
+        return np.diff(self.offsets)
+
+    def row_clusters(self) -> np.ndarray:
+        """每一输出行所属簇的位置。"""
+        return np.repeat(np.arange(len(self), dtype=np.int64), self.sizes)
+
+    def _select_parents(self, cluster_mask: np.ndarray) -> Optional[List[str]]:
+        if self.parent_ids is None:
+            return None
+        return [pid for pid, keep in zip(self.parent_ids, cluster_mask) if keep]
+
+    def select(self, cluster_mask: np.ndarray) -> "ClusterResult":
+        """只保留 cluster_mask 为 True 的簇（共享同一词表）。"""
+        cluster_mask = np.asarray(cluster_mask, dtype=bool)
+        sizes = self.sizes
+        row_mask = np.repeat(cluster_mask, sizes)
+        offsets = np.concatenate([[0], np.cumsum(sizes[cluster_mask])])
+        return ClusterResult(self.terms, self.term_ids[row_mask], self.counts[row_mask], offsets,
+                             [cid for cid, keep in zip(self.cluster_ids, cluster_mask) if keep],
+                             self.totals[cluster_mask], self.member_counts[cluster_mask],
+                             self._select_parents(cluster_mask))
+
+    def filter(self, min_total_frequency: float = 0, drop_others: bool = True) -> "ClusterResult":
+        """保留簇总频次不低于 min_total_frequency 的簇，默认去掉 'Others'。"""
+        mask = self.totals >= min_total_frequency
+        if drop_others:
+            mask &= np.array([cid != OTHERS_ID for cid in self.cluster_ids], dtype=bool)
+        return self.select(mask)
+
+    def representatives(self) -> "ClusterResult":
+        """
+        每个簇只保留频次最高的一个属性（频次相同时取输出顺序中靠前的），作为该簇的代表；
+        簇总频次和成员数保持原簇的值。
+        """
+        if self.n_rows == 0:
+            return self.select(np.zeros(len(self), dtype=bool))
+        nonempty = self.sizes > 0
+        starts = self.offsets[:-1][nonempty]
+        row_clusters = self.row_clusters()
+        maxima = np.full(len(self), np.iinfo(np.int64).min, dtype=np.int64)
+        maxima[nonempty] = np.maximum.reduceat(self.counts, starts)
+        candidates = np.flatnonzero(self.counts == maxima[row_clusters])
+        _, first = np.unique(row_clusters[candidates], return_index=True)
+        rows = candidates[first]
+        return ClusterResult(self.terms, self.term_ids[rows], self.counts[rows],
+                             np.arange(len(rows) + 1, dtype=np.int64),
+                             [cid for cid, keep in zip(self.cluster_ids, nonempty) if keep],
+                             self.totals[nonempty], self.member_counts[nonempty], self._select_parents(nonempty))
+
+    def iter_rows(self, extra: Optional[Sequence[str]] = None) -> Iterable[list]:
+        """
+        按输出格式逐行产生 [簇 ID, 簇总频次, 成员数, 属性, 频次]，有上一级簇时追加上一级簇 ID；
+        extra 为每个簇再追加的一列。
+        """
+        terms = self.terms
+        term_ids, counts = self.term_ids.tolist(), self.counts.tolist()
+        totals, member_counts, offsets = self.totals.tolist(), self.member_counts.tolist(), self.offsets.tolist()
+        for i, cluster_id in enumerate(self.cluster_ids):
+            suffix = ([self.parent_ids[i]] if self.parent_ids is not None else []) + ([extra[i]] if extra is not None else [])
+            for row in range(offsets[i], offsets[i + 1]):
+                yield [cluster_id, totals[i], member_counts[i], terms[term_ids[row]], counts[row]] + suffix
+
+    def write_csv(self, path: str, extra_column: Optional[Tuple[str, Sequence[str]]] = None):
+        """按 `CSV_HEADER`（以及 `parent_cluster_id`）写出 CSV；extra_column 为 (列名, 每个簇的值)。"""
+        header = CSV_HEADER + ([PARENT_COLUMN] if self.parent_ids is not None else []) + \
+            ([extra_column[0]] if extra_column is not None else [])
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(self.iter_rows(extra_column[1] if extra_column is not None else None))
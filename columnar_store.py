@@ -0,0 +1,114 @@
+"""
+紧凑的列式提取结果格式。
+
+每个字段 (key) 只保存一份按频次降序排列的数据:
+- `<key>.strings.bin`: 所有唯一值的 UTF-8 编码首尾相接；
+- `<key>.offsets.bin`: uint64 偏移数组 (n+1 个)，第 i 个值为 strings[offsets[i]:offsets[i+1]]；
+- `<key>.counts.bin`: int64 频次数组 (n 个)。
+目录中的 `meta.json` 记录字段列表、条目数和字节序。
+
+写入只依赖标准库；读取时用 numpy 内存映射偏移和频次数组，无需解析整个 JSON。
+也可以额外写出一个 `<key>.npz` 变体，便于在 numpy / pandas 中直接加载。
+"""
+import json
+import os
+import sys
+from array import array
+from typing import Dict, Iterable, List, Tuple
+
+COLUMNAR_DIR_NAME = "extracted_fields.columnar"
+META_FILE = "meta.json"
+FORMAT_VERSION = 1
+
+
+def write_columnar(output_dir: str, key: str, sorted_by_freq: Iterable[Tuple[str, int]], write_npz: bool = False) -> str:
+    """
+    写出一个字段的列式数据。
+
+    Args:
+        output_dir: 列式数据目录。
+        key: 字段名。
+        sorted_by_freq: 按频次降序排列的 (值, 频次) 序列。
+        write_npz: 是否额外写出 `<key>.npz` 变体（需要 numpy）。
+
+    Returns:
+        列式数据目录路径。
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    offsets = array('Q', [0])
+    counts = array('q')
+    total = 0
+    with open(os.path.join(output_dir, f"{key}.strings.bin"), 'wb') as f:
+        for value, count in sorted_by_freq:
+            encoded = value.encode('utf-8')
+            f.write(encoded)
+            offsets.append(offsets[-1] + len(encoded))
+            counts.append(count)
+            total += count
+    with open(os.path.join(output_dir, f"{key}.offsets.bin"), 'wb') as f:
+        offsets.tofile(f)
+    with open(os.path.join(output_dir, f"{key}.counts.bin"), 'wb') as f:
+        counts.tofile(f)
+
+    meta_path = os.path.join(output_dir, META_FILE)
+    meta = {"version": FORMAT_VERSION, "byteorder": sys.byteorder, "fields": {}}
+    if os.path.exists(meta_path):
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    meta["fields"][key] = {"unique_count": len(counts), "total_occurrences": total}
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    if write_npz:
+        import numpy as np
+        with open(os.path.join(output_dir, f"{key}.strings.bin"), 'rb') as f:
+            blob = f.read()
+        np.savez(os.path.join(output_dir, f"{key}.npz"),
+                 strings=np.frombuffer(blob, dtype=np.uint8),
+                 offsets=np.frombuffer(offsets.tobytes(), dtype=np.uint64),
+                 counts=np.frombuffer(counts.tobytes(), dtype=np.int64))
+    return output_dir
+
+
+class ColumnarField:
+    """
+    一个字段的只读列式视图，偏移和频次数组以内存映射方式加载。
+
+    Attributes:
+        counts (np.ndarray): 按频次降序排列的 int64 频次数组。
+    """
+
+    def __init__(self, directory: str, key: str):
+        import numpy as np
+
+        meta_path = os.path.join(directory, META_FILE)
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if key not in meta.get("fields", {}):
+            raise ValueError(f"列式数据 '{directory}' 中未找到字段 '{key}'")
+        if meta.get("byteorder", sys.byteorder) != sys.byteorder:
+            raise ValueError(f"列式数据 '{directory}' 的字节序与本机不一致")
+
+        self.key = key
+        n = meta["fields"][key]["unique_count"]
+        self.offsets = np.memmap(os.path.join(directory, f"{key}.offsets.bin"), dtype=np.uint64, mode='r', shape=(n + 1,)) if n else np.zeros(1, dtype=np.uint64)
+        self.counts = np.memmap(os.path.join(directory, f"{key}.counts.bin"), dtype=np.int64, mode='r', shape=(n,)) if n else np.zeros(0, dtype=np.int64)
+        strings_path = os.path.join(directory, f"{key}.strings.bin")
+        self._strings = np.memmap(strings_path, dtype=np.uint8, mode='r') if os.path.getsize(strings_path) else np.zeros(0, dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def term(self, i: int) -> str:
+        """返回第 i 个值。"""
+        return bytes(self._strings[int(self.offsets[i]):int(self.offsets[i + 1])]).decode('utf-8')
+
+    def terms(self) -> List[str]:
+        """按频次降序返回所有值。"""
+        blob = bytes(self._strings)
+        offsets = self.offsets.tolist()
+        return [blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(self))]
+
+    def to_dict(self) -> Dict[str, int]:
+        """返回 值 -> 频次 的字典（按频次降序插入）。"""
+        return dict(zip(self.terms(), self.counts.tolist()))
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+跨运行持久化的嵌入缓存。
+
+缓存按模型名称分目录存放，每个目录包含:
+- `embeddings.f32`: 内存映射的 float32 矩阵，每行一个属性的嵌入。
+- `index.sqlite`: 属性文本 -> (行号, 最近使用时钟) 的 SQLite 索引，以及维度等元信息。
+
+分析器在调用 `SentenceTransformer.encode` 之前先查询缓存，只对缺失的属性
+进行编码。缓存条目数有上限，超出时按最近最少使用 (LRU) 策略淘汰。
+
+每次调用结束时只把发生变化的行（新增、淘汰以及命中后更新了使用时钟的行）写入
+索引，写入开销与缓存大小无关；全部命中的调用也会持久化使用时钟，保证跨运行的
+淘汰顺序是真正的 LRU。
+"""
+import contextlib
+import hashlib
+import os
+import re
+import sqlite3
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+INDEX_FILE = "index.sqlite"
+MATRIX_FILE = "embeddings.f32"
+
+
+class EmbeddingCache:
+    """
+    一个按 (模型名称, 属性文本) 寻址的持久化嵌入缓存。
+
+    Args:
+        cache_dir (str): 缓存根目录，不同模型各占一个子目录。
+        model_name (str): 模型名称，作为缓存键的一部分。
+        max_entries (int): 缓存最多保存的属性条目数。
+    """
+
+    def __init__(self, cache_dir: str, model_name: str, max_entries: int = 1_000_000):
+        if max_entries <= 0:
+            raise ValueError("max_entries 必须为正整数")
+        self.model_name = model_name
+        self.max_entries = max_entries
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        digest = hashlib.sha1(model_name.encode("utf-8")).hexdigest()[:8]
+        self.path = os.path.join(cache_dir, f"{safe_name}-{digest}")
+        os.makedirs(self.path, exist_ok=True)
+
+        self.dim: Optional[int] = None
+        self.clock = 0
+        self.rows: Dict[str, int] = {}
+        self.last_used: List[int] = []  # 按行号存放最近使用时钟
+        self.row_terms: List[Optional[str]] = []  # 按行号存放属性文本
+        self._matrix: Optional[np.memmap] = None
+        # 自上次写入索引以来的变化: 新写入的行、命中（使用时钟变化）的行、被淘汰的属性
+        self._written_rows: set = set()
+        self._used_rows: set = set()
+        self._evicted_terms: List[str] = []
+        self._load_index()
+
+    # ------------------------------------------------------------------
+    # 持久化
+    # ------------------------------------------------------------------
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(os.path.join(self.path, INDEX_FILE))
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS entries ("
+                     "term TEXT PRIMARY KEY, row INTEGER NOT NULL, last_used INTEGER NOT NULL)")
+        return conn
+
+    def _load_index(self):
+        matrix_path = os.path.join(self.path, MATRIX_FILE)
+        if not os.path.exists(matrix_path):
+            return
+        if not os.path.exists(os.path.join(self.path, INDEX_FILE)):
+            return
+        try:
+            with contextlib.closing(self._connect()) as conn:
+                meta = dict(conn.execute("SELECT key, value FROM meta"))
+                if meta.get("model_name") != self.model_name or "dim" not in meta:
+                    return
+                entries = conn.execute("SELECT term, row, last_used FROM entries").fetchall()
+        except sqlite3.Error as e:
+            print(f"警告: 嵌入缓存索引损坏，将重新建立: {e}")
+            return
+        self._restore(int(meta["dim"]), int(meta["clock"]), int(meta["n_rows"]),
+                      ((term, row, used) for term, row, used in entries))
+
+    def _restore(self, dim: int, clock: int, n_rows: int, entries):
+        self.dim = dim
+        self.clock = clock
+        self.row_terms = [None] * n_rows
+        self.last_used = [0] * n_rows
+        for term, row, used in entries:
+            self.rows[term] = row
+            self.row_terms[row] = term
+            self.last_used[row] = used
+        self._open_matrix(n_rows)
+
+    def _open_matrix(self, n_rows: int):
+        """以读写模式打开（必要时扩展）内存映射矩阵文件。"""
+        matrix_path = os.path.join(self.path, MATRIX_FILE)
+        needed = n_rows * self.dim * 4
+        with open(matrix_path, "ab") as f:
+            if f.tell() < needed:
+                f.truncate(needed)
+        self._matrix = np.memmap(matrix_path, dtype=np.float32, mode="r+", shape=(n_rows, self.dim)) if n_rows else None
+
+    def save(self):
+        """
+        将矩阵刷新到磁盘，并在一个事务中把新增、淘汰的条目以及命中条目的使用时钟写入索引。
+        自上次写入以来没有任何变化时什么也不写。
+        """
+        if self.dim is None or not (self._written_rows or self._used_rows or self._evicted_terms):
+            return
+        if self._matrix is not None:
+            self._matrix.flush()
+        with contextlib.closing(self._connect()) as conn, conn:
+            conn.executemany("DELETE FROM entries WHERE term = ?", ((term,) for term in self._evicted_terms))
+            conn.executemany("INSERT OR REPLACE INTO entries (term, row, last_used) VALUES (?, ?, ?)",
+                             ((self.row_terms[row], row, self.last_used[row])
+                              for row in sorted(self._written_rows | self._used_rows)
+                              if self.row_terms[row] is not None))
+            conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [
+                ("model_name", self.model_name),
+                ("dim", str(self.dim)),
+                ("clock", str(self.clock)),
+                ("n_rows", str(len(self.row_terms))),
+            ])
+        self._written_rows.clear()
+        self._used_rows.clear()
+        self._evicted_terms.clear()
+
+    # ------------------------------------------------------------------
+    # 查询与写入
+    # ------------------------------------------------------------------
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __contains__(self, term: str) -> bool:
+        return term in self.rows
+
+    def _allocate_rows(self, count: int, protected: set) -> List[int]:
+        """为新条目分配行号：优先追加新行，达到上限后淘汰最近最少使用的行。"""
+        n_rows = len(self.row_terms)
+        free = [row for row, term in enumerate(self.row_terms) if term is None]
+        grow = min(max(count - len(free), 0), self.max_entries - n_rows)
+        if grow > 0:
+            self.row_terms.extend([None] * grow)
+            self.last_used.extend([0] * grow)
+            free.extend(range(n_rows, n_rows + grow))
+            if self._matrix is not None:
+                self._matrix.flush()
+                del self._matrix
+            self._open_matrix(len(self.row_terms))
+
+        if len(free) < count:
+            # LRU 淘汰: 本次请求正在使用的条目不会被淘汰
+            candidates = sorted(
+                (row for row, term in enumerate(self.row_terms) if term is not None and term not in protected),
+                key=lambda row: self.last_used[row],
+            )
+            for row in candidates[:count - len(free)]:
+                del self.rows[self.row_terms[row]]
+                self._evicted_terms.append(self.row_terms[row])
+                self.row_terms[row] = None
+                free.append(row)
+        return free[:count]
+
+    def get_or_encode(self, terms: Sequence[str], encode_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        返回所有属性的嵌入矩阵，只对缓存中缺失的属性调用 `encode_fn`。
+
+        Args:
+            terms: 需要嵌入的属性列表。
+            encode_fn: 接收缺失属性列表、返回 (m, d) 嵌入矩阵的函数。
+
+        Returns:
+            形状为 (len(terms), d) 的 float32 矩阵，行顺序与 `terms` 一致。
+        """
+        self.clock += 1
+        missing = list(dict.fromkeys(term for term in terms if term not in self.rows))
+        print(f"  - 嵌入缓存命中 {len(terms) - len(missing)}/{len(terms)} 个属性，需编码 {len(missing)} 个。")
+
+        new_embeddings = None
+        if missing:
+            new_embeddings = np.asarray(encode_fn(missing), dtype=np.float32)
+            if self.dim is None:
+                self.dim = new_embeddings.shape[1]
+            elif new_embeddings.shape[1] != self.dim:
+                raise ValueError(f"嵌入维度 ({new_embeddings.shape[1]}) 与缓存维度 ({self.dim}) 不一致")
+
+        if self.dim is None:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        # 先读出命中的行，避免它们在本次写入时被淘汰后覆盖
+        result = np.empty((len(terms), self.dim), dtype=np.float32)
+        hit_positions = [i for i, term in enumerate(terms) if term in self.rows]
+        if hit_positions:
+            hit_rows = np.asarray([self.rows[terms[i]] for i in hit_positions], dtype=np.int64)
+            result[hit_positions] = self._matrix[hit_rows]
+            for row in hit_rows.tolist():
+                self.last_used[row] = self.clock
+            self._used_rows.update(hit_rows.tolist())
+
+        if missing:
+            missing_position = {term: i for i, term in enumerate(missing)}
+            for i, term in enumerate(terms):
+                if term in missing_position:
+                    result[i] = new_embeddings[missing_position[term]]
+
+            storable = missing[:self.max_entries]
+            rows = self._allocate_rows(len(storable), protected=set(terms))
+            storable = storable[:len(rows)]
+            if rows:
+                self._matrix[np.asarray(rows, dtype=np.int64)] = new_embeddings[:len(rows)]
+                for term, row in zip(storable, rows):
+                    self.rows[term] = row
+                    self.row_terms[row] = term
+                    self.last_used[row] = self.clock
+                self._written_rows.update(rows)
+        self.save()
+        return result
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+分析器在一次运行内共享的嵌入存储。
+
+所有属性只编码一次，结果保存在一个 (n, d) 的嵌入矩阵中，并维护
+“属性 -> 行号”的映射。后续的各个阶段（第二轮聚类、Others 处理以及
+其它任何后续聚类）都只对该矩阵做索引切片，而不再调用模型重新编码。
+"""
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from quantization import QuantizedEmbeddings
+
+# 传给模型的编码批大小（与 SentenceTransformer.encode 的默认值相同）
+ENCODE_BATCH_SIZE = 32
+
+
+class LazyEncoder:
+    """
+    第一次调用 `encode` 时才通过 `loader()` 取得模型的编码器。
+
+    属性全部命中嵌入缓存时模型不会被调用，包装后也就不会被加载（连同 torch）。
+    """
+
+    def __init__(self, loader: Callable[[], Any]):
+        self._loader = loader
+
+    def encode(self, sentences, **kwargs):
+        return self._loader().encode(sentences, **kwargs)
+
+
+class EmbeddingStore:
+    """
+    一个“属性 -> 嵌入矩阵行”的存储。
+
+    Attributes:
+        terms (List[str]): 按行号排列的属性列表。
+        index (Dict[str, int]): 属性到行号的映射。
+        embeddings (np.ndarray): 形状为 (n, d) 的 float32 嵌入矩阵。低精度模式下为
+            磁盘上已归一化的只读 float32 参考副本（内存映射）。
+        quantized (Optional[QuantizedEmbeddings]): 低精度模式下常驻内存的 float16 / int8 矩阵。
+    """
+
+    def __init__(self, terms: Sequence[str], embeddings: np.ndarray, device: Optional[str] = None,
+                 precision: str = "float32", reference_dir: Optional[str] = None):
+        if len(terms) != len(embeddings):
+            raise ValueError(f"属性数量 ({len(terms)}) 与嵌入行数 ({len(embeddings)}) 不一致")
+        self.terms: List[str] = list(terms)
+        self.index: Dict[str, int] = {term: i for i, term in enumerate(self.terms)}
+        self.device = device
+        self.precision = precision
+        if precision == "float32":
+            self.quantized = None
+            self.embeddings = embeddings
+        else:
+            self.quantized = QuantizedEmbeddings(embeddings, precision, reference_dir=reference_dir)
+            self.embeddings = self.quantized.reference
+
+    @staticmethod
+    def encode_terms(model, terms: Sequence[str], show_progress_bar: bool = True, cache=None,
+                     stats: Optional[Dict[str, int]] = None) -> np.ndarray:
+        """
+        编码一组属性并返回 float32 矩阵。
+
+        如果提供了持久化缓存 (`EmbeddingCache`)，则只编码缓存中缺失的属性。
+        如果提供了 stats 字典，则在其中累加实际送入模型的属性数 ("encoded") 和批次数 ("batches")。
+        """
+        def encode(batch: List[str]) -> np.ndarray:
+            if stats is not None:
+                stats["encoded"] = stats.get("encoded", 0) + len(batch)
+                stats["batches"] = stats.get("batches", 0) + -(-len(batch) // ENCODE_BATCH_SIZE)
+            return model.encode(batch, batch_size=ENCODE_BATCH_SIZE, convert_to_numpy=True, show_progress_bar=show_progress_bar)
+
+        if cache is not None:
+            embeddings = cache.get_or_encode(list(terms), encode)
+        else:
+            embeddings = encode(list(terms))
+        return np.asarray(embeddings, dtype=np.float32)
+
+    @classmethod
+    def build(cls, model, terms: Sequence[str], device: Optional[str] = None, show_progress_bar: bool = True,
+              cache=None, stats: Optional[Dict[str, int]] = None, precision: str = "float32") -> "EmbeddingStore":
+        """使用给定模型一次性编码所有属性并构建存储。"""
+        embeddings = cls.encode_terms(model, terms, show_progress_bar=show_progress_bar, cache=cache, stats=stats)
+        return cls(terms, embeddings, device=device, precision=precision)
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def __contains__(self, term: str) -> bool:
+        return term in self.index
+
+    def rows(self, terms: Iterable[str]) -> List[int]:
+        """返回一组属性对应的行号。"""
+        return [self.index[term] for term in terms]
+
+    def matrix(self):
+        """供聚类后端使用的完整矩阵: 低精度模式下为 `QuantizedEmbeddings`，否则为 float32 矩阵。"""
+        return self.quantized if self.quantized is not None else self.embeddings
+
+    @property
+    def nbytes(self) -> int:
+        """嵌入矩阵常驻内存的字节数。"""
+        return self.quantized.nbytes if self.quantized is not None else self.embeddings.nbytes
+
+    def slice(self, indices: Optional[Sequence[int]] = None) -> np.ndarray:
+        """按行号切片嵌入矩阵；indices 为 None 时返回整个矩阵。"""
+        if indices is None:
+            return self.embeddings
+        return self.embeddings[np.asarray(indices, dtype=np.int64)]
+
+    def get(self, terms: Iterable[str]) -> np.ndarray:
+        """按属性文本取出嵌入。"""
+        return self.slice(self.rows(terms))
+
+    def tensor(self, indices: Optional[Sequence[int]] = None):
+        """以 torch 张量形式返回切片，放在分析器所用的设备上（未指定时自动选择）。"""
+        import torch
+        device = self.device or ("cuda" if torch.cuda.is_available() else "cpu")
+        return torch.from_numpy(np.ascontiguousarray(self.slice(indices))).to(device)
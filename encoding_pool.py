@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+CPU 节点上的多进程编码引擎。
+
+输入属性的长度差异很大（从 "ZnO" 到上百个字符的描述性短语），而一个批次会被
+填充到其中最长的成员。本模块先把属性按长度排序并切分为长度相近的任务块，
+再把任务块分发给一个进程池，每个工作进程各自持有一份模型；任务块按从长到短
+的顺序调度，使各进程的负载大致均衡。所有结果按原始顺序重新组装。
+
+`EncodingPool.encode` 的接口与 `SentenceTransformer.encode` 相同（所用到的参数），
+因此可以直接替代模型传给 `EmbeddingStore`。
+"""
+import os
+from multiprocessing import get_context
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+
+from parallel_extract import limit_worker_threads
+
+# 每个任务块包含的批次数
+BATCHES_PER_TASK = 8
+
+# 工作进程中的模型（由进程池初始化函数创建）
+_worker_model = None
+
+
+def _init_worker(model_name: str, model: Any, threads: int):
+    """工作进程初始化: 限制 BLAS / OpenMP / torch 线程数并加载模型。"""
+    global _worker_model
+    limit_worker_threads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    if model is not None:
+        _worker_model = model
+    else:
+        from sentence_transformers import SentenceTransformer
+        _worker_model = SentenceTransformer(model_name, device="cpu")
+
+
+def _encode_task(task) -> tuple:
+    """工作进程入口: 编码一个任务块，返回 (原始位置, 嵌入矩阵)。"""
+    positions, texts, batch_size = task
+    embeddings = _worker_model.encode(texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+    return positions, np.asarray(embeddings, dtype=np.float32)
+
+
+def length_bucketed_tasks(terms: Sequence[str], batch_size: int, batches_per_task: int = BATCHES_PER_TASK) -> List[tuple]:
+    """
+    按长度从长到短排序属性，并切分为任务块。
+
+    Returns:
+        [(原始位置列表, 属性列表), ...]，同一任务块内的属性长度相近。
+    """
+    order = sorted(range(len(terms)), key=lambda i: len(terms[i]), reverse=True)
+    task_size = max(1, batch_size * batches_per_task)
+    return [
+        (order[start:start + task_size], [terms[i] for i in order[start:start + task_size]])
+        for start in range(0, len(order), task_size)
+    ]
+
+
+class EncodingPool:
+    """
+    持有模型副本的编码进程池。进程在第一次编码时才启动，用完后调用 `close()`
+    （或作为上下文管理器使用）释放。
+
+    Args:
+        model_name: SentenceTransformer 模型名称，工作进程各自加载。
+        workers: 进程数。
+        model: 可选的可 pickle 编码器对象（例如测试用的确定性编码器）；提供时直接
+               发送给工作进程，而不是按名称加载。
+        threads_per_worker: 每个进程的 torch 线程数，默认平分 CPU 核数。
+    """
+
+    def __init__(self, model_name: str, workers: int, model: Any = None, threads_per_worker: Optional[int] = None):
+        self.model_name = model_name
+        self.workers = max(1, workers)
+        self.model = model
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // self.workers)
+        self._pool = None
+
+    def _ensure_pool(self):
+        if self._pool is None:
+            # 使用 spawn 启动，避免 fork 继承已初始化的 torch / OpenMP 线程状态
+            self._pool = get_context("spawn").Pool(
+                processes=self.workers,
+                initializer=_init_worker,
+                initargs=(self.model_name, self.model, self.threads_per_worker),
+            )
+        return self._pool
+
+    def encode(self, sentences: Sequence[str], batch_size: int = 32, convert_to_numpy: bool = True,
+               show_progress_bar: bool = False, **_) -> np.ndarray:
+        """按长度分桶、多进程编码，返回与输入顺序一致的 float32 矩阵。"""
+        terms = list(sentences)
+        if not terms:
+            return np.zeros((0, 0), dtype=np.float32)
+        tasks = length_bucketed_tasks(terms, batch_size)
+        result = None
+        done = 0
+        report_every = max(1, len(terms) // 10)
+        next_report = report_every
+        for positions, embeddings in self._ensure_pool().imap_unordered(
+                _encode_task, [(positions, texts, batch_size) for positions, texts in tasks]):
+            if result is None:
+                result = np.empty((len(terms), embeddings.shape[1]), dtype=np.float32)
+            result[positions] = embeddings
+            done += len(positions)
+            if show_progress_bar and (done >= next_report or done == len(terms)):
+                print(f"  - 编码进度: {done}/{len(terms)}")
+                next_report = done + report_every
+        return result
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self) -> "EncodingPool":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,109 @@
+"""
+增量提取清单 (manifest)。
+
+清单为每个已处理的文件记录路径、大小、修改时间、可选的内容哈希，以及该文件
+按key统计的频次。再次运行时只重新解析新增或修改过的文件，已删除文件的记录
+会被移除，最终的汇总频次由清单中各文件的记录按目录遍历顺序合并得到，
+因此输出文件与全量处理完全一致。
+"""
+import hashlib
+import json
+import os
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+MANIFEST_VERSION = 1
+
+
+def file_sha1(file_path: str, block_size: int = 1 << 20) -> str:
+    """计算文件内容的 SHA-1 哈希。"""
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ExtractionManifest:
+    """
+    一个按文件路径索引的提取结果清单。
+
+    Args:
+        path: 清单文件路径（JSON）。
+        keys_to_extract: 本次提取的key列表；与清单中记录的不一致时清单整体失效。
+        use_hash: 是否记录内容哈希。开启后，大小或修改时间变化但内容未变的文件不会被重新解析。
+    """
+
+    def __init__(self, path: str, keys_to_extract: List[str], use_hash: bool = False):
+        self.path = path
+        self.keys_to_extract = list(keys_to_extract)
+        self.use_hash = use_hash
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"警告: 提取清单无法读取，将全部重新处理: {e}")
+            return
+        if data.get("version") != MANIFEST_VERSION or data.get("keys") != self.keys_to_extract:
+            print("提示: 提取清单的key与本次不一致，将全部重新处理。")
+            return
+        self.entries = data.get("files", {})
+
+    def save(self):
+        """原子地写入清单文件。"""
+        data = {"version": MANIFEST_VERSION, "keys": self.keys_to_extract, "files": self.entries}
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def is_current(self, file_path: str) -> bool:
+        """判断文件自上次记录以来是否未发生变化。"""
+        entry = self.entries.get(file_path)
+        if entry is None:
+            return False
+        stat = os.stat(file_path)
+        if entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return True
+        if self.use_hash and entry.get("sha1") and entry["size"] == stat.st_size:
+            if file_sha1(file_path) == entry["sha1"]:
+                # 内容未变，只刷新修改时间
+                entry["mtime_ns"] = stat.st_mtime_ns
+                return True
+        return False
+
+    def update(self, file_path: str, counts: Dict[str, Counter], found: bool):
+        """记录一个文件的最新统计结果。"""
+        stat = os.stat(file_path)
+        entry = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "found": found,
+            # 以 [值, 次数] 列表保存，保留文件内首次出现的顺序
+            "counts": {key: [[value, count] for value, count in counts[key].items()] for key in self.keys_to_extract},
+        }
+        if self.use_hash:
+            entry["sha1"] = file_sha1(file_path)
+        self.entries[file_path] = entry
+
+    def prune(self, present_paths: List[str]) -> int:
+        """移除已不存在的文件的记录，返回被移除的数量。"""
+        present = set(present_paths)
+        removed = [path for path in self.entries if path not in present]
+        for path in removed:
+            del self.entries[path]
+        return len(removed)
+
+    def counts(self, file_path: str, key: str) -> Dict[str, int]:
+        """返回某个文件某个key的频次（保持插入顺序）。"""
+        return dict(self.entries[file_path]["counts"][key])
+
+    def found(self, file_path: str) -> Optional[bool]:
+        entry = self.entries.get(file_path)
+        return None if entry is None else entry["found"]
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+增量分配模式所用的簇输出文件读写工具。
+
+增量分配模式读取上一次运行生成的 `property_clusters_output_secondary.csv`，
+把新出现或频次发生变化的属性分配到已有簇中，并保持原有簇 ID 不变。
+"""
+import csv
+import os
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from cluster_result import CSV_HEADER, OTHERS_ID, PARENT_COLUMN, ClusterResult
+
+
+def file_fingerprint(path: str) -> str:
+    """返回文件的简单指纹（大小与修改时间），用于校验质心索引是否过期。"""
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def load_cluster_csv(path: str) -> Tuple["OrderedDict[str, List[List]]", List[List], Optional[Dict[str, str]]]:
+    """
+    读取簇输出 CSV。
+
+    Returns:
+        (簇字典, Others 成员列表, 上一级簇字典)。簇字典按文件中的出现顺序保存
+        `簇 ID -> [[属性, 频次], ...]`；文件含 `parent_cluster_id` 列时上一级簇字典为
+        `簇 ID -> 上一级簇 ID`（包括 'Others'），否则为 None。
+    """
+    clusters: "OrderedDict[str, List[List]]" = OrderedDict()
+    others: List[List] = []
+    parents: Optional[Dict[str, str]] = None
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.DictReader(f)
+        if PARENT_COLUMN in (reader.fieldnames or []):
+            parents = {}
+        for row in reader:
+            member = [row['property'], int(row['count'])]
+            if parents is not None:
+                parents.setdefault(row['cluster_id'], row[PARENT_COLUMN])
+            if row['cluster_id'] == OTHERS_ID:
+                others.append(member)
+            else:
+                clusters.setdefault(row['cluster_id'], []).append(member)
+    return clusters, others, parents
+
+
+def write_cluster_csv(path: str, clusters: Dict[str, List[List]], others: List[List],
+                      parents: Optional[Dict[str, str]] = None) -> ClusterResult:
+    """
+    按与 `PropertyClusterAnalyzer` 相同的列格式写出簇 CSV，Others 放在最后，并返回列式结果。
+    提供 parents 时写出 `parent_cluster_id` 列，不在其中的簇（如新建的簇）该列为空。
+    """
+    groups = [(cluster_id, sum(count for _, count in members), members) for cluster_id, members in clusters.items()]
+    if others:
+        groups.append((OTHERS_ID, sum(count for _, count in others), others))
+    result = ClusterResult.from_groups(groups)
+    if parents is not None:
+        result.parent_ids = [parents.get(cluster_id, '') for cluster_id, _, _ in groups]
+    result.write_csv(path)
+    return result
+
+
+def next_cluster_id(clusters: Dict[str, List[List]]) -> int:
+    """返回下一个可用的数字簇 ID。"""
+    numeric_ids = [int(cid) for cid in clusters if cid.isdigit()]
+    return max(numeric_ids, default=0) + 1
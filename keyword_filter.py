@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+按关键词表筛选簇输出文件。
+
+每个关键词表（taxonomy）是一个文本文件，每行一个关键词，`#` 开头的行为注释；
+表名取文件名（不含扩展名）。所有表的关键词被编译进同一个 Aho-Corasick 自动机，
+每个不同的属性只扫描一遍即可得到它命中的全部关键词表，因此关键词表的数量和大小
+不影响扫描次数（而 `'|'.join(keywords)` 正则需要对每个表扫描一遍整个文件）。
+筛选直接作用于列式的 `ClusterResult`，分析器可以在写出结果的同一次运行中完成筛选。
+
+匹配不区分大小写，连续空白视为一个空格；默认按子串匹配，与笔记本中 `str.contains`
+的结果相同（"crack" 也会匹配 "cracks"）。可选按整词匹配，即关键词两侧不能紧挨着
+字母、数字或下划线（"Void" 不会匹配 "Avoided"，但也不再匹配复数 "voids"）。
+
+一个簇只要有任何成员命中某个关键词表，整个簇就被标记为该表；'Others' 不参与筛选。
+命令行用法:
+
+    python keyword_filter.py property_clusters_output_secondary.csv taxonomies/ -o matching_clusters.csv
+"""
+import argparse
+import os
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from cluster_result import OTHERS_ID, ClusterResult
+
+TAXONOMY_COLUMN = 'taxonomies'
+TAXONOMY_SEPARATOR = ';'
+
+
+def normalize_text(text: str) -> str:
+    """匹配前的规范化: 小写并把连续空白压缩为一个空格。"""
+    return " ".join(text.lower().split())
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == '_'
+
+
+class KeywordAutomaton:
+    """
+    多个关键词表编译成的 Aho-Corasick 自动机。
+
+    Args:
+        taxonomies: 关键词表名 -> 关键词列表。
+        whole_words: 是否只匹配完整的词；默认按子串匹配。
+    """
+
+    def __init__(self, taxonomies: Dict[str, Sequence[str]], whole_words: bool = False):
+        self.taxonomies: List[str] = list(taxonomies)
+        self.whole_words = whole_words
+        # 状态转移表、失败指针，以及在每个状态结束的 (关键词长度, 关键词表位掩码)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._outputs: List[List[Tuple[int, int]]] = [[]]
+
+        keyword_masks: Dict[str, int] = {}
+        for bit, name in enumerate(self.taxonomies):
+            for keyword in taxonomies[name]:
+                keyword = normalize_text(keyword)
+                if keyword:
+                    keyword_masks[keyword] = keyword_masks.get(keyword, 0) | (1 << bit)
+        self.n_keywords = len(keyword_masks)
+        for keyword, mask in keyword_masks.items():
+            self._insert(keyword, mask)
+        self._build_failure_links()
+
+    def _insert(self, keyword: str, mask: int):
+        node = 0
+        for ch in keyword:
+            next_node = self._goto[node].get(ch)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][ch] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            node = next_node
+        self._outputs[node].append((len(keyword), mask))
+
+    def _build_failure_links(self):
+        """按广度优先设置失败指针，并把失败链上的输出合并到每个状态。"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(ch, 0)
+                self._outputs[child] = self._outputs[child] + self._outputs[self._fail[child]]
+                queue.append(child)
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, int]]:
+        """
+        在规范化后的文本中查找所有关键词。
+
+        Yields:
+            (起始位置, 结束位置(不含), 关键词表位掩码)，位置相对于 `normalize_text(text)`。
+        """
+        text = normalize_text(text)
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for length, mask in outputs[node]:
+                start, end = i + 1 - length, i + 1
+                if self.whole_words and ((start > 0 and _is_word_char(text[start - 1]))
+                                         or (end < len(text) and _is_word_char(text[end]))):
+                    continue
+                yield start, end, mask
+
+    def match_mask(self, text: str) -> int:
+        """文本命中的关键词表位掩码（第 i 位对应 `taxonomies[i]`）。"""
+        mask = 0
+        for _, _, keyword_mask in self.iter_matches(text):
+            mask |= keyword_mask
+        return mask
+
+    def names(self, mask: int) -> List[str]:
+        """把位掩码转换为关键词表名列表。"""
+        return [name for bit, name in enumerate(self.taxonomies) if mask >> bit & 1]
+
+    def match(self, text: str) -> List[str]:
+        """文本命中的关键词表名列表。"""
+        return self.names(self.match_mask(text))
+
+
+def load_keywords(path: str) -> List[str]:
+    """读取关键词文件: 每行一个关键词，忽略空行和 `#` 开头的注释行。"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+
+def load_taxonomies(paths: Sequence[str]) -> Dict[str, List[str]]:
+    """
+    读取关键词表。每个路径可以是一个关键词文件，也可以是包含若干 `.txt` 关键词文件的目录；
+    表名取文件名（不含扩展名）。
+    """
+    taxonomies: Dict[str, List[str]] = {}
+    for path in paths:
+        if os.path.isdir(path):
+            files = [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith('.txt')]
+        else:
+            files = [path]
+        for file_path in files:
+            name = os.path.splitext(os.path.basename(file_path))[0]
+            taxonomies.setdefault(name, []).extend(load_keywords(file_path))
+    return taxonomies
+
+
+def cluster_masks(result: ClusterResult, automaton: KeywordAutomaton) -> np.ndarray:
+    """
+    每个簇命中的关键词表位掩码（'Others' 为 0）。词表中的每个属性只匹配一次，
+    再按簇的行偏移量做按位或归约。
+    """
+    term_masks = np.array([automaton.match_mask(term) for term in result.terms], dtype=object)
+    masks = np.zeros(len(result), dtype=object)
+    nonempty = result.sizes > 0
+    if result.n_rows:
+        masks[nonempty] = np.bitwise_or.reduceat(term_masks[result.term_ids], result.offsets[:-1][nonempty])
+    masks[[i for i, cluster_id in enumerate(result.cluster_ids) if cluster_id == OTHERS_ID]] = 0
+    return masks
+
+
+def filter_result(result: ClusterResult, output_path: str, automaton: KeywordAutomaton,
+                  split_dir: Optional[str] = None) -> Dict[str, int]:
+    """
+    写出命中任一关键词表的簇的全部成员行（不含 'Others'），并追加一列 `taxonomies`
+    列出该簇命中的关键词表。提供 split_dir 时，还在其中为每个关键词表写出 `<表名>.csv`。
+
+    Returns:
+        每个关键词表命中的簇数。
+    """
+    masks = cluster_masks(result, automaton)
+    matched = np.array([mask != 0 for mask in masks], dtype=bool)
+    names = [automaton.names(mask) for mask in masks[matched]]
+    result.select(matched).write_csv(output_path, extra_column=(TAXONOMY_COLUMN, [TAXONOMY_SEPARATOR.join(n) for n in names]))
+
+    counts = {}
+    for bit, name in enumerate(automaton.taxonomies):
+        selected = np.array([mask >> bit & 1 for mask in masks], dtype=bool)
+        counts[name] = int(selected.sum())
+        if split_dir:
+            os.makedirs(split_dir, exist_ok=True)
+            result.select(selected).write_csv(os.path.join(split_dir, f"{name}.csv"))
+    return counts
+
+
+def filter_clusters(csv_path: str, output_path: str, automaton: KeywordAutomaton,
+                    split_dir: Optional[str] = None) -> Dict[str, int]:
+    """读取簇 CSV 并按 `filter_result` 筛选。"""
+    return filter_result(ClusterResult.read_csv(csv_path), output_path, automaton, split_dir=split_dir)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="按关键词表筛选簇输出文件（多关键词表一次扫描，不区分大小写）")
+    parser.add_argument("clusters_csv", help="main.py 写出的簇 CSV")
+    parser.add_argument("taxonomies", nargs="+", help="关键词文件或包含 .txt 关键词文件的目录")
+    parser.add_argument("-o", "--output", default="matching_clusters.csv", help="命中簇的输出 CSV")
+    parser.add_argument("--split-dir", default=None, help="为每个关键词表单独写出 <表名>.csv 的目录")
+    parser.add_argument("--whole-words", action="store_true", help="只匹配完整的词（检查词边界，复数等屈折形式将不再命中）")
+    args = parser.parse_args(argv)
+
+    taxonomies = load_taxonomies(args.taxonomies)
+    automaton = KeywordAutomaton(taxonomies, whole_words=args.whole_words)
+    print(f"🔍 已加载 {len(taxonomies)} 个关键词表，共 {automaton.n_keywords} 个关键词。")
+    counts = filter_clusters(args.clusters_csv, args.output, automaton, split_dir=args.split_dir)
+    for name, count in counts.items():
+        print(f"  - {name}: {count} 个簇")
+    print(f"✅ 命中的簇已保存到 '{args.output}'。")
+
+
+if __name__ == "__main__":
+    main()
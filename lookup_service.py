@@ -0,0 +1,477 @@
+# -*- coding: utf-8 -*-
+"""
+常驻的“属性 -> 簇”查询服务。
+
+基于 `PropertyClusterAnalyzer` 写出的簇 CSV，为下游的实时入库任务把原始的
+name / physical_form 字符串映射到簇:
+
+1. 精确匹配: 属性文本 -> 簇的哈希索引；
+2. 规范化匹配: 按 `canonicalize` 的规则计算规范化键后再查哈希索引；
+3. 嵌入回退: 以上都未命中时编码该字符串，查询最近的簇质心（`CentroidIndex`），
+   相似度不低于 `min_score` 时返回该簇。质心与增量分配模式共用输出文件旁的
+   `*.centroids.npz`，不存在或已过期时启动时计算一次并保存。
+
+非精确匹配的结果保存在一个 LRU 缓存中。并发的单条查询在嵌入回退时会被合并成
+一个批次编码（等待至多 `batch_window_ms`），批量接口一次编码全部未命中的字符串。
+
+HTTP 接口（JSON）:
+- `GET  /lookup?term=...`          单条查询
+- `POST /lookup/batch`             请求体 `{"terms": [...]}`，返回 `{"results": [...]}`
+- `GET  /metrics`                  请求数、QPS、延迟分位数、各匹配方式计数和缓存命中率
+- `GET  /health`
+
+用法:
+
+    python lookup_service.py property_clusters_output_secondary.csv --port 8765
+    python lookup_service.py property_clusters_output_secondary.csv --unix /tmp/lookup.sock
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from canonicalize import canonical_key
+from centroid_index import CentroidIndex
+from cluster_backends import DEFAULT_MEMORY_BUDGET_MB
+from cluster_result import OTHERS_ID, ClusterResult
+from embedding_store import EmbeddingStore, LazyEncoder
+from incremental_assign import file_fingerprint
+
+# 请求体的默认大小上限 (字节)，超出时返回 413
+DEFAULT_MAX_BODY_BYTES = 1 << 20
+# 延迟统计保留的最近请求数，以及计算 QPS 的滑动窗口 (秒)
+LATENCY_RESERVOIR = 10_000
+QPS_WINDOW_S = 60
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class LRUCache:
+    """按最近使用顺序淘汰的查询结果缓存。"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._items: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self._items.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: Dict[str, Any]):
+        if self.capacity <= 0:
+            return
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.capacity:
+            self._items.popitem(last=False)
+
+
+class ClusterLookup:
+    """
+    查询服务的同步核心（不含网络部分）。
+
+    Args:
+        csv_path: 簇输出 CSV。
+        rules: 规范化规则；应与生成该输出时的 `canonicalization_rules` 一致（默认不规范化，与分析器相同）。
+        encoder: 提供 `encode` 接口的编码器；为 None 时不做嵌入回退。
+        min_score: 嵌入回退接受最近簇所需的最低余弦相似度。
+        embedding_cache: 计算质心时使用的持久化嵌入缓存 (`EmbeddingCache`)。
+    """
+
+    def __init__(self, csv_path: str, rules: Sequence[str] = (), encoder=None, min_score: float = 0.9,
+                 cache_size: int = 100_000, embedding_cache=None, memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB):
+        self.rules = list(rules)
+        self.encoder = encoder
+        self.min_score = min_score
+        self.memory_budget_mb = memory_budget_mb
+        self.cache = LRUCache(cache_size)
+
+        result = ClusterResult.read_csv(csv_path)
+        representatives = result.representatives()
+        self.clusters: List[Dict[str, Any]] = []
+        for i, cluster_id in enumerate(result.cluster_ids):
+            info = {"cluster_id": cluster_id, "representative": representatives.terms[representatives.term_ids[i]],
+                    "cluster_total_frequency": int(result.totals[i])}
+            if result.parent_ids is not None:
+                info["parent_cluster_id"] = result.parent_ids[i]
+            self.clusters.append(info)
+
+        # 精确索引取属性第一次出现的簇；规范化索引取频次最高的写法所在的簇
+        self.exact: Dict[str, int] = {}
+        self.canonical: Dict[str, int] = {}
+        best_counts: Dict[str, int] = {}
+        for position, row_terms, row_counts in self._cluster_rows(result):
+            for term, count in zip(row_terms, row_counts):
+                self.exact.setdefault(term, position)
+                key = canonical_key(term, self.rules)
+                if count > best_counts.get(key, -1):
+                    best_counts[key] = count
+                    self.canonical[key] = position
+
+        self.centroids: Optional[CentroidIndex] = None
+        self._centroid_positions: List[int] = []
+        if encoder is not None:
+            self._load_centroids(csv_path, result, embedding_cache)
+
+    @staticmethod
+    def _cluster_rows(result: ClusterResult):
+        offsets = result.offsets.tolist()
+        term_ids, counts = result.term_ids.tolist(), result.counts.tolist()
+        for position in range(len(result)):
+            rows = range(offsets[position], offsets[position + 1])
+            yield position, [result.terms[term_ids[r]] for r in rows], [counts[r] for r in rows]
+
+    def _load_centroids(self, csv_path: str, result: ClusterResult, embedding_cache):
+        """加载输出文件旁的质心索引；不存在或已过期时根据簇成员的嵌入计算并保存。"""
+        positions = [i for i, cluster_id in enumerate(result.cluster_ids) if cluster_id != OTHERS_ID]
+        cluster_ids = [result.cluster_ids[i] for i in positions]
+        self._centroid_positions = positions
+        sidecar = csv_path + '.centroids.npz'
+        if os.path.exists(sidecar):
+            try:
+                index, fingerprint = CentroidIndex.load(sidecar)
+            except ValueError as e:
+                print(f"  - 质心文件 '{sidecar}' 无法读取，将重新计算: {e}")
+                index, fingerprint = None, None
+            if index is not None and fingerprint == file_fingerprint(csv_path) and index.cluster_ids == cluster_ids:
+                print(f"  - 已从 '{sidecar}' 加载 {len(index)} 个簇质心。")
+                self.centroids = index
+                return
+
+        print(f"  - 正在根据 {len(cluster_ids)} 个簇的成员计算质心...")
+        offsets = result.offsets.tolist()
+        member_terms = [result.terms[t] for i in positions for t in result.term_ids[offsets[i]:offsets[i + 1]].tolist()]
+        embeddings = EmbeddingStore.encode_terms(self.encoder, member_terms, show_progress_bar=False, cache=embedding_cache)
+        rows, start = [], 0
+        for i in positions:
+            size = offsets[i + 1] - offsets[i]
+            rows.append(list(range(start, start + size)))
+            start += size
+        self.centroids = CentroidIndex.from_members(cluster_ids, rows, embeddings)
+        self.centroids.save(sidecar, file_fingerprint(csv_path))
+        print(f"  - 质心已保存到 '{sidecar}'。")
+
+    def _answer(self, term: str, position: Optional[int], match: str, score: Optional[float] = None) -> Dict[str, Any]:
+        answer: Dict[str, Any] = {"term": term, "match": match, "cluster_id": None}
+        if position is not None:
+            answer.update(self.clusters[position])
+        if score is not None:
+            answer["score"] = round(score, 4)
+        return answer
+
+    def fast_lookup(self, term: str) -> Optional[Dict[str, Any]]:
+        """精确、缓存和规范化匹配；都未命中时返回 None（需要嵌入回退）。"""
+        position = self.exact.get(term)
+        if position is not None:
+            return self._answer(term, position, "exact")
+        cached = self.cache.get(term)
+        if cached is not None:
+            return cached
+        position = self.canonical.get(canonical_key(term, self.rules))
+        if position is not None:
+            answer = self._answer(term, position, "canonical")
+            self.cache.put(term, answer)
+            return answer
+        if self.centroids is None:
+            answer = self._answer(term, None, "none")
+            self.cache.put(term, answer)
+            return answer
+        return None
+
+    def embedding_lookup(self, terms: Sequence[str]) -> List[Dict[str, Any]]:
+        """批量编码并查询最近的簇质心（不写缓存，可在工作线程中调用）。"""
+        vectors = np.asarray(self.encoder.encode(list(terms), batch_size=64, convert_to_numpy=True,
+                                                 show_progress_bar=False), dtype=np.float32)
+        nearest, scores = self.centroids.nearest(vectors, memory_budget_mb=self.memory_budget_mb)
+        answers = []
+        for term, pos, score in zip(terms, nearest.tolist(), scores.tolist()):
+            if pos >= 0 and score >= self.min_score:
+                answers.append(self._answer(term, self._centroid_positions[pos], "embedding", score))
+            else:
+                answers.append(self._answer(term, None, "none", score if pos >= 0 else None))
+        return answers
+
+    def lookup_many(self, terms: Sequence[str]) -> List[Dict[str, Any]]:
+        """同步的批量查询（命令行和测试使用）。"""
+        answers = [self.fast_lookup(term) for term in terms]
+        missing = [i for i, answer in enumerate(answers) if answer is None]
+        if missing:
+            for i, answer in zip(missing, self.embedding_lookup([terms[i] for i in missing])):
+                answers[i] = answer
+                self.cache.put(terms[i], answer)
+        return answers
+
+
+class LookupMetrics:
+    """请求数、滑动窗口 QPS、延迟分位数和各匹配方式的计数。"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.requests = 0
+        self.lookups = 0
+        self.errors = 0
+        self.matches: Counter = Counter()
+        self._latencies_ms: deque = deque(maxlen=LATENCY_RESERVOIR)
+        self._recent: deque = deque()  # (时间戳, 查询条数)
+
+    def record(self, answers: Sequence[Dict[str, Any]], seconds: float):
+        now = time.time()
+        self.requests += 1
+        self.lookups += len(answers)
+        self.matches.update(answer["match"] for answer in answers)
+        self._latencies_ms.append(seconds * 1000)
+        self._recent.append((now, len(answers)))
+        while self._recent and self._recent[0][0] < now - QPS_WINDOW_S:
+            self._recent.popleft()
+
+    def snapshot(self, cache: LRUCache) -> Dict[str, Any]:
+        uptime = time.time() - self.started
+        window = min(QPS_WINDOW_S, max(uptime, 1e-9))
+        latencies = np.asarray(self._latencies_ms, dtype=np.float64)
+        percentiles = {}
+        if len(latencies):
+            for name, q in (("p50", 50), ("p95", 95), ("p99", 99)):
+                percentiles[name] = round(float(np.percentile(latencies, q)), 3)
+            percentiles["max"] = round(float(latencies.max()), 3)
+        lookups_in_window = sum(n for _, n in self._recent)
+        return {
+            "uptime_s": round(uptime, 1),
+            "requests": self.requests,
+            "lookups": self.lookups,
+            "errors": self.errors,
+            "qps": round(lookups_in_window / window, 1),
+            "requests_per_s": round(len(self._recent) / window, 1),
+            "latency_ms": percentiles,
+            "matches": dict(self.matches),
+            "cache": {"size": len(cache), "hits": cache.hits, "misses": cache.misses,
+                      "hit_rate": round(cache.hits / max(cache.hits + cache.misses, 1), 4)},
+        }
+
+
+class LookupServer:
+    """
+    asyncio HTTP 服务。嵌入回退在单独的工作线程中执行，事件循环只处理哈希查询和网络读写。
+
+    Args:
+        lookup: 查询核心。
+        max_batch: 单条查询合并编码时每批的最大条数。
+        batch_window_ms: 单条查询等待与其它查询合并的最长时间。
+        max_body_bytes: 请求体的大小上限，超出时返回 413 并关闭连接。
+    """
+
+    def __init__(self, lookup: ClusterLookup, max_batch: int = 256, batch_window_ms: float = 2.0,
+                 max_body_bytes: int = DEFAULT_MAX_BODY_BYTES):
+        self.lookup = lookup
+        self.max_body_bytes = max_body_bytes
+        self.metrics = LookupMetrics()
+        self.max_batch = max_batch
+        self.batch_window_ms = batch_window_ms
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="lookup-encode")
+        self._queue: Optional[asyncio.Queue] = None
+        self._batcher: Optional[asyncio.Task] = None
+
+    async def _embed(self, terms: Sequence[str]) -> List[Dict[str, Any]]:
+        answers = await asyncio.get_running_loop().run_in_executor(self._executor, self.lookup.embedding_lookup, list(terms))
+        for term, answer in zip(terms, answers):
+            self.lookup.cache.put(term, answer)
+        return answers
+
+    async def _run_batcher(self):
+        """把排队的单条嵌入查询合并成批次。"""
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self._queue.get()]
+            deadline = loop.time() + self.batch_window_ms / 1000
+            while len(pending) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    pending.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                answers = await self._embed([term for term, _ in pending])
+                for (_, future), answer in zip(pending, answers):
+                    if not future.done():
+                        future.set_result(answer)
+            except Exception as e:  # 把编码错误传给等待中的请求，批处理任务继续运行
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+
+    async def lookup_one(self, term: str) -> Dict[str, Any]:
+        answer = self.lookup.fast_lookup(term)
+        if answer is not None:
+            return answer
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((term, future))
+        return await future
+
+    async def lookup_batch(self, terms: Sequence[str]) -> List[Dict[str, Any]]:
+        answers = [self.lookup.fast_lookup(term) for term in terms]
+        missing = [i for i, answer in enumerate(answers) if answer is None]
+        for start in range(0, len(missing), self.max_batch):
+            chunk = missing[start:start + self.max_batch]
+            for i, answer in zip(chunk, await self._embed([terms[i] for i in chunk])):
+                answers[i] = answer
+        return answers
+
+    async def _route(self, method: str, target: str, body: bytes) -> Tuple[int, Any]:
+        url = urlsplit(target)
+        if url.path == "/health":
+            return 200, {"status": "ok", "clusters": len(self.lookup.clusters), "terms": len(self.lookup.exact)}
+        if url.path == "/metrics":
+            return 200, self.metrics.snapshot(self.lookup.cache)
+        if url.path == "/lookup":
+            if method != "GET":
+                return 405, {"error": "请使用 GET /lookup?term=..."}
+            terms = parse_qs(url.query).get("term")
+            if not terms:
+                return 400, {"error": "缺少参数 term"}
+            start = time.perf_counter()
+            answer = await self.lookup_one(terms[0])
+            self.metrics.record([answer], time.perf_counter() - start)
+            return 200, answer
+        if url.path == "/lookup/batch":
+            if method != "POST":
+                return 405, {"error": "请使用 POST /lookup/batch"}
+            try:
+                terms = json.loads(body or b"{}").get("terms")
+            except (json.JSONDecodeError, AttributeError):
+                terms = None
+            if not isinstance(terms, list) or not all(isinstance(term, str) for term in terms):
+                return 400, {"error": "请求体应为 {\"terms\": [字符串, ...]}"}
+            start = time.perf_counter()
+            answers = await self.lookup_batch(terms)
+            self.metrics.record(answers, time.perf_counter() - start)
+            return 200, {"results": answers}
+        return 404, {"error": f"未知路径 {url.path}"}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """处理一个连接上的若干 HTTP/1.1 请求（支持 keep-alive）。"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                parts = request_line.decode("latin-1").split()
+                headers: Dict[str, str] = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = len(parts) == 3 and parts[2] == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                length = int(headers.get("content-length") or 0)
+                if length > self.max_body_bytes:
+                    # 不读取过大的请求体，直接拒绝并关闭连接
+                    status, payload = 413, {"error": f"请求体超过上限 {self.max_body_bytes} 字节"}
+                    keep_alive = False
+                elif len(parts) != 3:
+                    await reader.readexactly(length)
+                    status, payload = 400, {"error": "无效的请求行"}
+                else:
+                    body = await reader.readexactly(length)
+                    try:
+                        status, payload = await self._route(parts[0], parts[1], body)
+                    except Exception as e:
+                        self.metrics.errors += 1
+                        status, payload = 500, {"error": str(e)}
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765, unix_path: Optional[str] = None):
+        """启动服务并一直运行。"""
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.create_task(self._run_batcher())
+        if unix_path:
+            server = await asyncio.start_unix_server(self.handle, path=unix_path)
+            print(f"🚀 查询服务已启动: unix:{unix_path}")
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+            print(f"🚀 查询服务已启动: http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self._batcher.cancel()
+            self._executor.shutdown(wait=False)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="属性 -> 簇的本地查询服务（精确/规范化哈希索引 + 最近质心回退 + LRU 缓存）")
+    parser.add_argument("clusters_csv", help="main.py 写出的簇 CSV")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None, help="改为监听该 Unix 套接字路径")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2", help="嵌入回退使用的 SBERT 模型（应与生成簇时一致）")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--rules", default="", help="规范化规则，逗号分隔（应与生成簇时的 canonicalization_rules 一致，默认不规范化）")
+    parser.add_argument("--min-score", type=float, default=0.9, help="嵌入回退接受最近簇的最低余弦相似度")
+    parser.add_argument("--cache-size", type=int, default=100_000, help="LRU 缓存的最大条数")
+    parser.add_argument("--embedding-cache-dir", default=None, help="计算质心时使用的持久化嵌入缓存目录")
+    parser.add_argument("--no-embedding", action="store_true", help="只做精确与规范化匹配，不加载模型")
+    parser.add_argument("--max-batch", type=int, default=256, help="嵌入回退每批的最大条数")
+    parser.add_argument("--batch-window-ms", type=float, default=2.0, help="单条查询等待合并成批的最长时间")
+    parser.add_argument("--max-body-bytes", type=int, default=DEFAULT_MAX_BODY_BYTES, help="请求体的大小上限 (字节)，超出时返回 413")
+    args = parser.parse_args(argv)
+
+    encoder, cache = None, None
+    if not args.no_embedding:
+        def load_model():
+            if not hasattr(load_model, "model"):
+                from sentence_transformers import SentenceTransformer
+                print(f"INFO: 正在加载模型 '{args.model}'...")
+                load_model.model = SentenceTransformer(args.model, device=args.device)
+            return load_model.model
+        encoder = LazyEncoder(load_model)
+        if args.embedding_cache_dir:
+            from embedding_cache import EmbeddingCache
+            cache = EmbeddingCache(args.embedding_cache_dir, args.model)
+
+    rules = [rule for rule in args.rules.split(",") if rule]
+    print(f"🔄 正在从 '{args.clusters_csv}' 构建索引...")
+    lookup = ClusterLookup(args.clusters_csv, rules=rules, encoder=encoder, min_score=args.min_score,
+                           cache_size=args.cache_size, embedding_cache=cache)
+    print(f"✅ 已索引 {len(lookup.exact)} 个属性、{len(lookup.clusters)} 个簇。")
+    server = LookupServer(lookup, max_batch=args.max_batch, batch_window_ms=args.batch_window_ms,
+                          max_body_bytes=args.max_body_bytes)
+    try:
+        asyncio.run(server.serve(args.host, args.port, unix_path=args.unix))
+    except KeyboardInterrupt:
+        print("\n查询服务已停止。")
+
+
+if __name__ == "__main__":
+    main()
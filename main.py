@@ -13,36 +13,181 @@
 5.  根据频率阈值，在细粒度簇内部进行合并。
 6.  处理所有聚类和未聚类项，并将最终结果保存到 CSV 文件。
 """
+import contextlib
 import json
-import torch
-from sentence_transformers import SentenceTransformer, util
-import pandas as pd
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import csv
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+
+from centroid_index import CentroidIndex
+from canonicalize import RULES, collapse_terms
+from checkpoint import CheckpointStore, path_fingerprint, stage_fingerprint
+from cluster_backends import BACKENDS, DEFAULT_MEMORY_BUDGET_MB, block_diagonal_communities, get_backend
+from cluster_result import OTHERS_ID, ClusterResult
+from columnar_store import ColumnarField
+from embedding_cache import EmbeddingCache
+from embedding_store import EmbeddingStore, LazyEncoder
+from encoding_pool import EncodingPool
+from incremental_assign import file_fingerprint, load_cluster_csv, next_cluster_id, write_cluster_csv
+from keyword_filter import KeywordAutomaton, filter_result, load_taxonomies
+from metrics import MetricsRecorder
+from parallel_extract import limit_worker_threads
+from quantization import PRECISIONS, assignment_changes
+from similarity_graph import SimilarityGraph
+from term_store import TermStore, is_term_store
+
+# 可检查点化的阶段（按执行顺序）及各阶段输出所依赖的配置项。
+# 每个阶段的指纹还包含上一阶段的指纹，因此前面阶段失效时后面的阶段也随之失效。
+CHECKPOINT_STAGES = {
+    'terms': ['input_json_path', 'field_to_analyze', 'canonicalization_rules', 'tiered_min_frequency', 'tiered_head_coverage',
+              'term_store_min_count', 'term_store_top_n'],
+    'embeddings': ['sbert_model'],
+    'primary': ['cluster_backend', 'primary_cluster_threshold', 'min_community_size', 'ivf_n_lists', 'ivf_n_probe',
+                'embedding_precision', 'rescore_margin', 'minhash_jaccard_threshold', 'minhash_num_perm', 'minhash_ngram',
+                'minhash_bands'],
+    'secondary': ['secondary_cluster_threshold'],
+}
+
+MODES = ('cluster', 'assign', 'sweep', 'dry_run')
+REQUIRED_KEYS = ['input_json_path', 'output_csv_path', 'field_to_analyze', 'sbert_model', 'primary_cluster_threshold',
+                 'secondary_cluster_threshold', 'min_community_size', 'file_count_for_threshold', 'frequency_threshold_percent']
+
+
+def _tiering_enabled(config: Dict[str, Any]) -> bool:
+    """是否配置了分层聚类（只有头部属性参与完整聚类）。"""
+    return config.get('tiered_min_frequency') is not None or config.get('tiered_head_coverage') is not None
+
+
+def validate_config(config: Dict[str, Any]) -> List[str]:
+    """
+    检查配置（不加载模型和数据），返回错误信息列表；列表为空表示配置有效。
+    """
+    errors = [f"缺少配置项 '{key}'" for key in REQUIRED_KEYS if config.get(key) is None]
+    mode = config.get('mode', 'cluster')
+    if mode not in MODES:
+        errors.append(f"未知的运行模式 '{mode}'，可选: {', '.join(MODES)}")
+    if config.get('input_json_path') and not os.path.exists(config['input_json_path']):
+        errors.append(f"输入路径 '{config['input_json_path']}' 不存在")
+    if mode == 'assign' and not (config.get('assign_previous_csv_path') and os.path.exists(config['assign_previous_csv_path'])):
+        errors.append("'assign' 模式需要存在的 'assign_previous_csv_path'")
+    if mode == 'sweep' and _tiering_enabled(config):
+        errors.append("'sweep' 模式不执行长尾分配，结果与分层运行不一致；请先关闭 'tiered_min_frequency' / 'tiered_head_coverage'")
+
+    thresholds = {key: config.get(key) for key in ('primary_cluster_threshold', 'secondary_cluster_threshold', 'tiered_assign_threshold',
+                                             'parent_cluster_threshold', 'minhash_jaccard_threshold')}
+    for key in ('sweep_primary_thresholds', 'sweep_secondary_thresholds'):
+        for i, value in enumerate(config.get(key) or []):
+            thresholds[f"{key}[{i}]"] = value
+    for key, value in thresholds.items():
+        if value is not None and not (isinstance(value, (int, float)) and 0 < value <= 1):
+            errors.append(f"'{key}' 应在 (0, 1] 内，当前为 {value!r}")
+
+    for key in ('min_community_size', 'parent_min_community_size', 'encoding_workers', 'encoding_threads_per_worker',
+                'secondary_workers', 'minhash_num_perm', 'minhash_ngram', 'minhash_bands', 'term_store_top_n'):
+        value = config.get(key)
+        if value is not None and not (isinstance(value, int) and value >= 1):
+            errors.append(f"'{key}' 应为正整数，当前为 {value!r}")
+    min_count = config.get('term_store_min_count')
+    if min_count is not None and not (isinstance(min_count, int) and min_count >= 0):
+        errors.append(f"'term_store_min_count' 应为非负整数，当前为 {min_count!r}")
+    if config.get('cluster_backend', 'dense') not in BACKENDS:
+        errors.append(f"未知的聚类后端 '{config.get('cluster_backend')}'，可选: {', '.join(BACKENDS)}")
+    if config.get('embedding_precision', 'float32') not in PRECISIONS:
+        errors.append(f"未知的嵌入精度 '{config.get('embedding_precision')}'，可选: {', '.join(PRECISIONS)}")
+    elif config.get('embedding_precision', 'float32') != 'float32' and config.get('cluster_backend', 'dense') != 'blocked':
+        # 其余后端会把低精度嵌入还原成 float32 副本，峰值内存反而高于直接使用 float32
+        errors.append(f"嵌入精度 '{config.get('embedding_precision')}' 只能与 'blocked' 后端一起使用，"
+                      f"当前后端为 '{config.get('cluster_backend', 'dense')}'")
+    missing_taxonomies = [path for path in config.get('keyword_taxonomies') or [] if not os.path.exists(path)]
+    if missing_taxonomies:
+        errors.append(f"关键词表路径不存在: {missing_taxonomies}")
+    unknown_rules = [rule for rule in config.get('canonicalization_rules') or [] if rule not in RULES]
+    if unknown_rules:
+        errors.append(f"未知的规范化规则 {unknown_rules}，可选: {', '.join(RULES)}")
+    return errors
+
 
 class PropertyClusterAnalyzer:
     """
     一个用于对属性列表进行两轮语义聚类分析的类。
     """
 
-    def __init__(self, config: Dict[str, Any]):
+    def __init__(self, config: Dict[str, Any], model=None):
         """
         初始化分析器。
 
         Args:
             config (Dict[str, Any]): 包含所有配置参数的字典。
+            model: 可选的编码模型（需提供与 SentenceTransformer 相同的 `encode` 接口）。
+                   为 None 时在第一次需要编码时按 config['sbert_model'] 加载 SentenceTransformer。
         """
         self.config = config
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        print(f"INFO: 使用设备 '{self.device}'")
-        self.model = SentenceTransformer(config['sbert_model'], device=self.device)
+        self._device = config.get('device')  # None 表示第一次需要时自动检测
+        self._injected_model = model
+        self._model = model
         self.term_counts = {}
         self.terms_to_cluster = []
         self.unclustered_items = []
+        self.tail_terms = []  # 分层模式下不参与完整聚类的长尾属性
+        self.variants = {}  # 规范化后 代表项 -> 所有原始写法
+        self.original_counts = {}  # 规范化前各原始写法的频次
+        self.store = None  # 本次运行共享的嵌入存储 (EmbeddingStore)
+        self.metrics = MetricsRecorder(config.get('metrics_path'), profile_dir=config.get('profile_dir'),
+                                       run_info={"script": "main.py", "config": config})
+        checkpoint_dir = config.get('checkpoint_dir')
+        self.checkpoints = CheckpointStore(checkpoint_dir) if checkpoint_dir else None
+        self.stage_fingerprints = {}  # 阶段名 -> 本次运行中该阶段输入的指纹
+
+    @property
+    def device(self) -> str:
+        """计算设备；第一次访问时才导入 torch 检测 GPU。"""
+        if self._device is None:
+            import torch
+            self._device = "cuda" if torch.cuda.is_available() else "cpu"
+            print(f"INFO: 使用设备 '{self._device}'")
+        return self._device
+
+    @property
+    def model(self):
+        """编码模型；第一次访问时才加载 SentenceTransformer（嵌入全部来自缓存或检查点时不会加载）。"""
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+            print(f"INFO: 正在加载模型 '{self.config['sbert_model']}'...")
+            self._model = SentenceTransformer(self.config['sbert_model'], device=self.device)
+        return self._model
+
+    @contextlib.contextmanager
+    def _encoder(self):
+        """
+        编码整张属性表时使用的编码器。在 CPU 上且 `encoding_workers` 大于 1 时为按长度分桶的
+        多进程编码池（每个进程各持有一份模型），否则为分析器自身的模型。两者都在真正需要
+        编码时才加载模型。
+        """
+        workers = self.config.get('encoding_workers')
+        if not workers or workers <= 1 or self.device != 'cpu':
+            yield LazyEncoder(lambda: self.model)
+            return
+        # 注入的编码器直接发送给工作进程，SentenceTransformer 则由各进程按名称加载
+        print(f"  - 使用 {workers} 个编码进程")
+        with EncodingPool(self.config['sbert_model'], workers, model=self._injected_model,
+                          threads_per_worker=self.config.get('encoding_threads_per_worker')) as pool:
+            yield pool
 
     def _load_data(self):
-        """从输入JSON文件中加载和准备数据。"""
+        """从输入文件中加载和准备数据（汇总JSON文件、列式数据目录或 SQLite 频次库）。"""
         print(f"🔄 步骤 1: 正在从 '{self.config['input_json_path']}' 加载数据...")
+        if os.path.isdir(self.config['input_json_path']):
+            self._load_columnar_data()
+            return
+        if is_term_store(self.config['input_json_path']):
+            self._load_term_store_data()
+            return
         try:
             with open(self.config['input_json_path'], "r", encoding="utf-8") as f:
                 data = json.load(f)
@@ -52,10 +197,8 @@ class PropertyClusterAnalyzer:
                 raise ValueError(f"JSON 文件中未找到 '{field_key}' 或其下的 'sorted_by_frequency' 键")
 
             property_list = data[field_key]['sorted_by_frequency']
-            df = pd.DataFrame(property_list, columns=['property', 'count'])
-            
-            self.terms_to_cluster = df['property'].tolist()
-            self.term_counts = df.set_index('property')['count'].to_dict()
+            self.terms_to_cluster = [prop for prop, _ in property_list]
+            self.term_counts = {prop: count for prop, count in property_list}
 
             print(f"  - 成功从 '{field_key}' 加载了 {len(self.terms_to_cluster)} 个唯一属性。")
             print("✅ 数据准备完成！")
@@ -66,16 +209,152 @@ class PropertyClusterAnalyzer:
             print(f"错误: 解析 JSON 文件时出错: {e}")
             exit()
 
-    def _perform_primary_clustering(self, term_embeddings):
-        """执行第一轮初步聚类。"""
+    def _input_field(self) -> str:
+        """列式数据和频次库中的字段名（兼容 JSON 输出中的 '<key>_frequency' 写法）。"""
+        field_key = self.config['field_to_analyze']
+        if field_key.endswith('_frequency'):
+            field_key = field_key[:-len('_frequency')]
+        return field_key
+
+    def _load_columnar_data(self):
+        """从 simple.py 写出的列式数据目录中加载属性及频次（频次数组以内存映射方式读取）。"""
+        field_key = self._input_field()
+        try:
+            field = ColumnarField(self.config['input_json_path'], field_key)
+        except (OSError, ValueError) as e:
+            print(f"错误: 读取列式数据时出错: {e}")
+            exit()
+        self.terms_to_cluster = field.terms()
+        self.term_counts = dict(zip(self.terms_to_cluster, field.counts.tolist()))
+        print(f"  - 成功从列式数据 '{field_key}' 加载了 {len(self.terms_to_cluster)} 个唯一属性。")
+        print("✅ 数据准备完成！")
+
+    def _load_term_store_data(self):
+        """
+        从 SQLite 频次库中加载属性及频次。`term_store_min_count`（频次下限）和
+        `term_store_top_n`（只取频次最高的前 N 个）在 SQL 中完成筛选。
+        """
+        field_key = self._input_field()
+        min_count = self.config.get('term_store_min_count')
+        top_n = self.config.get('term_store_top_n')
+        try:
+            with TermStore(self.config['input_json_path'], readonly=True) as store:
+                property_list = store.top_terms(field_key, min_count=min_count, limit=top_n)
+                unique_count = store.fields()[field_key]['unique_count']
+        except FileNotFoundError:
+            print(f"错误: 输入文件 '{self.config['input_json_path']}' 未找到。")
+            exit()
+        except (sqlite3.Error, ValueError) as e:
+            print(f"错误: 读取频次库时出错: {e}")
+            exit()
+        self.terms_to_cluster = [prop for prop, _ in property_list]
+        self.term_counts = {prop: count for prop, count in property_list}
+        print(f"  - 成功从频次库字段 '{field_key}' 加载了 {len(self.terms_to_cluster)} 个唯一属性"
+              f"（共 {unique_count} 个，频次下限={min_count}，前 N 个={top_n}）。")
+        print("✅ 数据准备完成！")
+
+    def _input_fingerprint(self) -> str:
+        """输入的指纹: 频次库取字段的版本号（写回簇归属不改变它），其余取文件大小与修改时间。"""
+        if is_term_store(self.config['input_json_path']) and os.path.exists(self.config['input_json_path']):
+            with TermStore(self.config['input_json_path'], readonly=True) as store:
+                return store.fingerprint(self._input_field())
+        return path_fingerprint(self.config['input_json_path'])
+
+    def _term_store_path(self) -> Optional[str]:
+        """写回簇归属的频次库: `term_store_path`，未配置时若输入本身是频次库则写回输入。"""
+        path = self.config.get('term_store_path')
+        if path:
+            return path
+        return self.config['input_json_path'] if is_term_store(self.config['input_json_path']) else None
+
+    def _record_assignments(self, result: ClusterResult):
+        """把本次结果的簇与簇归属写回频次库。"""
+        path = self._term_store_path()
+        with TermStore(path) as store:
+            written = store.write_assignments(self._input_field(), result)
+        print(f"✅ {written} 个属性的簇归属已写回频次库 '{path}'。")
+
+    def _open_embedding_cache(self):
+        """如果配置了缓存目录，则打开对应模型的持久化嵌入缓存。"""
+        cache_dir = self.config.get('embedding_cache_dir')
+        if not cache_dir:
+            return None
+        cache = EmbeddingCache(
+            cache_dir,
+            self.config['sbert_model'],
+            max_entries=self.config.get('embedding_cache_max_entries', 1_000_000)
+        )
+        print(f"  - 使用嵌入缓存 '{cache.path}' (已缓存 {len(cache)} 个属性)")
+        return cache
+
+    def _stage_fingerprint(self, stage: str) -> str:
+        """计算一个阶段的指纹: 上一阶段的指纹 (第一阶段为输入文件指纹) + 本阶段依赖的配置项。"""
+        stages = list(CHECKPOINT_STAGES)
+        position = stages.index(stage)
+        previous = self.stage_fingerprints[stages[position - 1]] if position else self._input_fingerprint()
+        fingerprint = stage_fingerprint(stage, previous, {key: self.config.get(key) for key in CHECKPOINT_STAGES[stage]})
+        self.stage_fingerprints[stage] = fingerprint
+        return fingerprint
+
+    def _checkpointed(self, stage: str, compute):
+        """
+        阶段输出的检查点: 如果检查点中保存的指纹与本次输入一致，直接返回保存的输出；
+        否则调用 compute() 计算并保存。未配置 `checkpoint_dir` 时总是直接计算。
+        """
+        if self.checkpoints is None:
+            return compute()
+        fingerprint = self._stage_fingerprint(stage)
+        payload = self.checkpoints.load(stage, fingerprint)
+        if payload is not None:
+            print(f"⏩ 阶段 '{stage}' 的输入与配置未变，已从检查点恢复。")
+            return payload
+        payload = compute()
+        self.checkpoints.save(stage, fingerprint, payload)
+        return payload
+
+    def _load_term_table(self) -> Dict[str, Any]:
+        """加载、规范化并分层后的属性表（检查点 'terms' 的内容）。"""
+        self._load_data()
+        self._canonicalize()
+        self._split_frequency_tiers()
+        return {
+            'terms_to_cluster': self.terms_to_cluster,
+            'term_counts': self.term_counts,
+            'tail_terms': self.tail_terms,
+            'variants': self.variants,
+            'original_counts': self.original_counts,
+        }
+
+    def _primary_stage(self) -> Dict[str, Any]:
+        """第一轮聚类的结果与未聚类项（检查点 'primary' 的内容）。"""
+        clusters = self._perform_primary_clustering()
+        return {'clusters': clusters, 'unclustered_items': self.unclustered_items}
+
+    def _perform_primary_clustering(self, embeddings=None):
+        """
+        执行第一轮初步聚类。
+
+        Args:
+            embeddings: 用于聚类的矩阵；默认使用嵌入存储中的矩阵（低精度模式下为量化矩阵）。
+        """
         print("\n🤖 步骤 2: 正在执行第一轮初步聚类...")
         print(f"  - 参数: 相似度阈值={self.config['primary_cluster_threshold']}, 最小簇大小={self.config['min_community_size']}")
         
-        clusters = util.community_detection(
-            term_embeddings,
-            min_community_size=self.config['min_community_size'],
-            threshold=self.config['primary_cluster_threshold']
-        )
+        backend_name = self.config.get('cluster_backend', 'dense')
+        print(f"  - 聚类后端: {backend_name}")
+        with self.metrics.profile('primary_clustering'):
+            clusters = get_backend(backend_name)(
+                self.store.matrix() if embeddings is None else embeddings,
+                min_community_size=self.config['min_community_size'],
+                threshold=self.config['primary_cluster_threshold'],
+                device=self._device,
+                memory_budget_mb=self.config.get('cluster_memory_budget_mb', DEFAULT_MEMORY_BUDGET_MB),
+                n_lists=self.config.get('ivf_n_lists'),
+                n_probe=self.config.get('ivf_n_probe', 8),
+                rescore_margin=self.config.get('rescore_margin'),
+                terms=self.terms_to_cluster,
+                **self._minhash_options()
+            )
         print(f"✅ 初步聚类完成！共找到 {len(clusters)} 个簇。")
         
         # 处理结果并识别未聚类项
@@ -85,6 +364,7 @@ class PropertyClusterAnalyzer:
             cluster_members = [{'property': self.terms_to_cluster[idx], 'count': self.term_counts.get(self.terms_to_cluster[idx], 0)} for idx in cluster_indices]
             clustered_results.append({
                 'cluster_id': f"primary_{i+1}",
+                'indices': list(cluster_indices),
                 'members': cluster_members
             })
             clustered_indices.update(cluster_indices)
@@ -98,12 +378,83 @@ class PropertyClusterAnalyzer:
         
         return clustered_results
 
+    def _minhash_options(self) -> Dict[str, Any]:
+        """'minhash' 后端的候选分桶参数。"""
+        return {
+            'jaccard_threshold': self.config.get('minhash_jaccard_threshold', 0.5),
+            'num_perm': self.config.get('minhash_num_perm', 128),
+            'ngram': self.config.get('minhash_ngram', 3),
+            'bands': self.config.get('minhash_bands'),
+        }
+
+    def _secondary_sub_clusters(self, primary_clusters: List[Dict]) -> List[List[List[int]]]:
+        """
+        计算每个主簇内部的子簇（簇内局部行号）。
+
+        小簇按顺序打包成块对角批次，在一次矩阵乘法中完成；大簇分发到进程池
+        并行处理。两条路径使用同一个计算核，结果与逐簇顺序计算一致。
+        """
+        threshold = self.config['secondary_cluster_threshold']
+        budget = self.config.get('cluster_memory_budget_mb', DEFAULT_MEMORY_BUDGET_MB)
+        batch_rows = self.config.get('secondary_batch_rows', 512)
+        parallel_min_size = self.config.get('secondary_parallel_min_size', 1024)
+        workers = self.config.get('secondary_workers') or os.cpu_count() or 1
+
+        results: List[List[List[int]]] = [[] for _ in primary_clusters]
+        large = [i for i, p in enumerate(primary_clusters) if len(p['indices']) >= parallel_min_size]
+        small = [i for i, p in enumerate(primary_clusters) if 1 < len(p['indices']) < parallel_min_size]
+
+        # 小簇: 按顺序装入不超过 batch_rows 行的批次
+        batches, current, current_rows = [], [], 0
+        for i in small:
+            size = len(primary_clusters[i]['indices'])
+            if current and current_rows + size > batch_rows:
+                batches.append(current)
+                current, current_rows = [], 0
+            current.append(i)
+            current_rows += size
+        if current:
+            batches.append(current)
+        for batch in batches:
+            rows = [idx for i in batch for idx in primary_clusters[i]['indices']]
+            sizes = [len(primary_clusters[i]['indices']) for i in batch]
+            start = time.perf_counter()
+            for i, communities in zip(batch, block_diagonal_communities(self.store.slice(rows), sizes, threshold, memory_budget_mb=budget)):
+                results[i] = communities
+            self.metrics.event('secondary_batch', time.perf_counter() - start, clusters=len(batch), rows=len(rows),
+                               first_cluster=primary_clusters[batch[0]]['cluster_id'])
+        print(f"  - {len(small)} 个小簇被打包为 {len(batches)} 个批次处理。")
+
+        # 大簇: 进程池并行，每个簇单独作为一个块
+        if large:
+            tasks = [(self.store.slice(primary_clusters[i]['indices']), [len(primary_clusters[i]['indices'])]) for i in large]
+            if workers > 1 and len(large) > 1:
+                # 每个进程单线程计算，避免进程数 × BLAS 线程数超过 CPU 核数
+                with ProcessPoolExecutor(max_workers=min(workers, len(large)), initializer=limit_worker_threads) as executor:
+                    outputs = list(executor.map(_timed_block_diagonal,
+                                                [t[0] for t in tasks], [t[1] for t in tasks],
+                                                [threshold] * len(tasks), [budget] * len(tasks)))
+            else:
+                outputs = [_timed_block_diagonal(emb, sizes, threshold, budget) for emb, sizes in tasks]
+            for i, (output, seconds) in zip(large, outputs):
+                results[i] = output[0]
+                self.metrics.event('secondary_cluster', seconds, cluster_id=primary_clusters[i]['cluster_id'],
+                                   size=len(primary_clusters[i]['indices']), sub_clusters=len(output[0]))
+            print(f"  - {len(large)} 个大簇使用 {min(workers, len(large))} 个进程并行处理。")
+        return results
+
     def _perform_secondary_clustering(self, primary_clusters: List[Dict]) -> List[Dict]:
         """在每个主簇内执行第二轮精聚类和合并。"""
         print("\n🔬 步骤 3: 正在执行第二轮精聚类与合并...")
         final_clusters = []
+
+        def compute():
+            with self.metrics.profile('secondary_clustering'):
+                return self._secondary_sub_clusters(primary_clusters)
+        # 只有子簇划分被检查点化；频率合并很快，总是按当前配置重新执行
+        all_sub_clusters = self._checkpointed('secondary', compute)
         
-        for p_cluster in primary_clusters:
+        for p_cluster, sub_clusters_indices in zip(primary_clusters, all_sub_clusters):
             members = [member['property'] for member in p_cluster['members']]
             if len(members) <= 1:
                 # 如果主簇成员过少，直接视为一个最终簇
@@ -113,122 +464,575 @@ class PropertyClusterAnalyzer:
                 })
                 continue
 
-            member_embeddings = self.model.encode(members, convert_to_tensor=True, show_progress_bar=False)
-            sub_clusters_indices = util.community_detection(
-                member_embeddings,
-                min_community_size=1,
-                threshold=self.config['secondary_cluster_threshold']
-            )
             print(f"  - 在簇 {p_cluster['cluster_id']} 内部找到 {len(sub_clusters_indices)} 个子簇。")
-
-            middle_clusters = []
-            for indices in sub_clusters_indices:
-                sub_members = [members[idx] for idx in indices]
-                sub_freq = sum(self.term_counts.get(m, 0) for m in sub_members)
-                middle_clusters.append({
-                    'sub_cluster_members': sub_members,
-                    'sub_cluster_total_frequency': sub_freq
-                })
-            
-            if not middle_clusters:
-                continue
-
-            # 按频率排序并合并低频子簇
-            sorted_middle = sorted(middle_clusters, key=lambda x: x['sub_cluster_total_frequency'], reverse=True)
-            base_cluster = sorted_middle[0]
-            retained_sub_clusters = []
-            
-            freq_threshold_value = self.config['file_count_for_threshold'] * self.config['frequency_threshold_percent']
-
-            for i in range(1, len(sorted_middle)):
-                sub_cluster = sorted_middle[i]
-                if sub_cluster['sub_cluster_total_frequency'] < freq_threshold_value:
-                    base_cluster['sub_cluster_members'].extend(sub_cluster['sub_cluster_members'])
-                    base_cluster['sub_cluster_total_frequency'] += sub_cluster['sub_cluster_total_frequency']
-                else:
-                    retained_sub_clusters.append(sub_cluster)
-            
-            retained_sub_clusters.insert(0, base_cluster)
-            final_clusters.extend(retained_sub_clusters)
+            final_clusters.extend(self._merge_sub_clusters(members, sub_clusters_indices))
             
         print(f"✅ 第二轮处理完成！共形成 {len(final_clusters)} 个最终簇。")
         return final_clusters
 
-    def _save_results_to_csv(self, final_clusters: List[Dict]):
-        """将最终结果保存到CSV文件。"""
-        output_path = self.config['output_csv_path']
-        print(f"\n💾 步骤 4: 正在将详细结果保存到 '{output_path}'...")
+    def _merge_sub_clusters(self, members: List[str], sub_clusters_indices: List[List[int]]) -> List[Dict]:
+        """把一个主簇内低于频率阈值的子簇合并到频率最高的子簇中，返回保留的子簇。"""
+        middle_clusters = []
+        for indices in sub_clusters_indices:
+            sub_members = [members[idx] for idx in indices]
+            sub_freq = sum(self.term_counts.get(m, 0) for m in sub_members)
+            middle_clusters.append({
+                'sub_cluster_members': sub_members,
+                'sub_cluster_total_frequency': sub_freq
+            })
         
-        csv_data = [['cluster_id', 'cluster_total_frequency', 'member_count', 'property', 'count']]
-        cluster_id_counter = 1
+        if not middle_clusters:
+            return []
+
+        # 按频率排序并合并低频子簇
+        sorted_middle = sorted(middle_clusters, key=lambda x: x['sub_cluster_total_frequency'], reverse=True)
+        base_cluster = sorted_middle[0]
+        retained_sub_clusters = []
         
-        # 处理聚类后形成的簇
-        sorted_clusters = sorted(final_clusters, key=lambda x: x['sub_cluster_total_frequency'], reverse=True)
-        for cluster in sorted_clusters:
-            total_freq = cluster['sub_cluster_total_frequency']
-            member_count = len(cluster['sub_cluster_members'])
-            for member in cluster['sub_cluster_members']:
-                csv_data.append([
-                    cluster_id_counter,
-                    total_freq,
-                    member_count,
-                    member,
-                    self.term_counts.get(member, 0)
-                ])
-            cluster_id_counter += 1
-            
-        # 处理未聚类的项
-        others_group = []
         freq_threshold_value = self.config['file_count_for_threshold'] * self.config['frequency_threshold_percent']
+
+        for i in range(1, len(sorted_middle)):
+            sub_cluster = sorted_middle[i]
+            if sub_cluster['sub_cluster_total_frequency'] < freq_threshold_value:
+                base_cluster['sub_cluster_members'].extend(sub_cluster['sub_cluster_members'])
+                base_cluster['sub_cluster_total_frequency'] += sub_cluster['sub_cluster_total_frequency']
+            else:
+                retained_sub_clusters.append(sub_cluster)
         
+        retained_sub_clusters.insert(0, base_cluster)
+        return retained_sub_clusters
+
+    def _canonicalize(self):
+        """
+        词法规范化与精确去重: 规范化键相同的属性合并为一个代表项（频次求和），
+        只有代表项参与编码和聚类，保存结果时再展开回所有原始写法。
+        """
+        rules = self.config.get('canonicalization_rules') or []
+        if not rules:
+            return
+        before = len(self.terms_to_cluster)
+        self.original_counts = dict(self.term_counts)
+        self.terms_to_cluster, self.term_counts, self.variants = collapse_terms(self.terms_to_cluster, self.original_counts, rules)
+        print(f"  - 规范化 ({', '.join(rules)}): {before} 个属性合并为 {len(self.terms_to_cluster)} 个代表项。")
+
+    def _expand_variants(self, term: str) -> List[tuple]:
+        """返回代表项对应的所有原始写法及其各自频次。"""
+        if term in self.variants:
+            return [(variant, self.original_counts.get(variant, 0)) for variant in self.variants[term]]
+        return [(term, self.term_counts.get(term, 0))]
+
+    def _build_cluster_result(self, final_clusters: List[Dict]) -> ClusterResult:
+        """
+        把最终簇、达到频率阈值的未聚类项和 'Others' 组装为列式结果。
+        簇按总频次降序编号，未聚类项各自成簇，'Others' 放在最后。
+        """
+        groups = []
+        for cluster in sorted(final_clusters, key=lambda x: x['sub_cluster_total_frequency'], reverse=True):
+            # 展开规范化阶段合并的写法
+            expanded = [variant for member in cluster['sub_cluster_members'] for variant in self._expand_variants(member)]
+            groups.append((len(groups) + 1, cluster['sub_cluster_total_frequency'], expanded))
+
+        others_group = []
+        freq_threshold_value = self.config['file_count_for_threshold'] * self.config['frequency_threshold_percent']
         for item in self.unclustered_items:
             if item['count'] < freq_threshold_value:
                 others_group.append(item)
             else:
-                csv_data.append([
-                    cluster_id_counter,
-                    item['count'],
-                    1,
-                    item['property'],
-                    item['count']
-                ])
-                cluster_id_counter += 1
-        
+                groups.append((len(groups) + 1, item['count'], self._expand_variants(item['property'])))
+
         if others_group:
-            total_others_freq = sum(item['count'] for item in others_group)
-            for item in others_group:
-                csv_data.append([
-                    'Others',
-                    total_others_freq,
-                    len(others_group),
-                    item['property'],
-                    item['count']
-                ])
-
-        with open(output_path, 'w', encoding='utf-8', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerows(csv_data)
-            
+            expanded_others = [variant for item in others_group for variant in self._expand_variants(item['property'])]
+            groups.append((OTHERS_ID, sum(item['count'] for item in others_group), expanded_others))
+        return ClusterResult.from_groups(groups)
+
+    def _write_derived_outputs(self, result: ClusterResult):
+        """
+        在内存中的列式结果上完成后处理: 去掉 'Others' 并按簇总频次筛选，再为每个簇选出频次
+        最高的代表属性，分别写入 `filtered_output_csv_path` 和 `representative_output_csv_path`。
+        """
+        filtered_path = self.config.get('filtered_output_csv_path')
+        representative_path = self.config.get('representative_output_csv_path')
+        if not filtered_path and not representative_path:
+            return
+        min_total = self.config.get('filter_min_total_frequency', 10)
+        filtered = result.filter(min_total_frequency=min_total, drop_others=True)
+        print(f"  - 去掉 'Others' 并保留簇总频次 >= {min_total} 的簇: {result.n_rows} 行 -> {filtered.n_rows} 行，共 {len(filtered)} 个簇。")
+        if filtered_path:
+            filtered.write_csv(filtered_path)
+            print(f"  - 筛选结果已保存到 '{filtered_path}'。")
+        if representative_path:
+            filtered.representatives().write_csv(representative_path)
+            print(f"  - 各簇代表属性已保存到 '{representative_path}'。")
+
+    def _cluster_parents(self, result: ClusterResult) -> List[str]:
+        """
+        上一级聚类: 对筛选后（去掉 'Others'、簇总频次 >= filter_min_total_frequency）每个簇的代表属性
+        以较宽松的 `parent_cluster_threshold` 再做一次社区发现，返回每个簇的上一级簇 ID
+        （'P1'、'P2'...，未归入任何上一级簇或未参与筛选的簇为空字符串）。
+
+        代表属性的嵌入直接取自本次运行的嵌入存储（规范化合并的写法映射回其代表项），
+        只有存储中没有的属性（例如分层模式下的长尾属性）才会编码。
+        """
+        threshold = self.config['parent_cluster_threshold']
+        min_size = self.config.get('parent_min_community_size', 2)
+        mask = result.totals >= self.config.get('filter_min_total_frequency', 10)
+        mask &= np.array([cluster_id != OTHERS_ID for cluster_id in result.cluster_ids], dtype=bool)
+        mask &= result.sizes > 0
+        positions = np.flatnonzero(mask)
+        representatives = result.select(mask).representatives()
+        terms = [representatives.terms[term_id] for term_id in representatives.term_ids.tolist()]
+        print(f"\n🌳 正在对 {len(terms)} 个簇的代表属性进行上一级聚类 (阈值={threshold}, 最小簇大小={min_size})...")
+
+        embeddings = self._term_embeddings(terms)
+
+        parent_ids = [''] * len(result)
+        if len(terms):
+            start = time.perf_counter()
+            with self.metrics.profile('parent_clustering'):
+                communities = get_backend(self.config.get('cluster_backend', 'dense'))(
+                    embeddings,
+                    min_community_size=min_size,
+                    threshold=threshold,
+                    device=self._device,
+                    memory_budget_mb=self.config.get('cluster_memory_budget_mb', DEFAULT_MEMORY_BUDGET_MB),
+                    n_lists=self.config.get('ivf_n_lists'),
+                    n_probe=self.config.get('ivf_n_probe', 8),
+                    terms=terms,
+                    **self._minhash_options()
+                )
+            for k, community in enumerate(communities):
+                for idx in community:
+                    parent_ids[positions[idx]] = f"P{k + 1}"
+            covered = sum(len(community) for community in communities)
+            self.metrics.event('parent_clustering', time.perf_counter() - start, items=len(terms), parents=len(communities))
+            print(f"✅ 上一级聚类完成！{covered} 个簇归入 {len(communities)} 个上一级簇，{len(terms) - covered} 个未归入。")
+        return parent_ids
+
+    def _term_embeddings(self, terms: List[str]) -> np.ndarray:
+        """
+        输出中属性的嵌入: 直接取自本次运行的嵌入存储（规范化合并的写法映射回其代表项），
+        只有存储中没有的属性（例如分层模式下的长尾属性）才会编码。
+        """
+        canonical = {variant: term for term, variants in self.variants.items() for variant in variants}
+        keys = [canonical.get(term, term) for term in terms]
+        stored = [i for i, key in enumerate(keys) if key in self.store]
+        missing = [i for i, key in enumerate(keys) if key not in self.store]
+        embeddings = np.empty((len(terms), self.store.embeddings.shape[1]), dtype=np.float32)
+        if stored:
+            embeddings[stored] = self.store.get(keys[i] for i in stored)
+        if missing:
+            with self._encoder() as encoder:
+                embeddings[missing] = EmbeddingStore.encode_terms(encoder, [keys[i] for i in missing], show_progress_bar=False,
+                                                                  cache=self._open_embedding_cache())
+        print(f"  - 复用 {len(stored)} 个已有嵌入，新编码 {len(missing)} 个。")
+        return embeddings
+
+    def _save_centroid_index(self, result: ClusterResult, output_path: str):
+        """
+        在簇输出旁写出质心索引 (`<csv>.centroids.npz`)，簇 ID 与 `load_cluster_csv` 读回的一致
+        （不含 'Others'）。之后以该输出为基础的增量分配直接加载它，不必重新编码全部已有成员。
+        """
+        members: Dict[str, List[str]] = {}
+        for row in result.iter_rows():
+            if row[0] != OTHERS_ID:
+                members.setdefault(str(row[0]), []).append(row[3])
+        print("  - 正在计算簇质心...")
+        terms = [term for cluster_terms in members.values() for term in cluster_terms]
+        embeddings = self._term_embeddings(terms)
+        rows, offset = [], 0
+        for cluster_terms in members.values():
+            rows.append(list(range(offset, offset + len(cluster_terms))))
+            offset += len(cluster_terms)
+        sidecar = output_path + '.centroids.npz'
+        CentroidIndex.from_members(list(members), rows, embeddings).save(sidecar, file_fingerprint(output_path))
+        print(f"  - {len(members)} 个簇质心已保存到 '{sidecar}'。")
+
+    def _save_results_to_csv(self, final_clusters: List[Dict]) -> ClusterResult:
+        """将最终结果保存到CSV文件（以及配置的筛选结果和代表属性文件），并返回列式结果。"""
+        output_path = self.config['output_csv_path']
+        print(f"\n💾 步骤 4: 正在将详细结果保存到 '{output_path}'...")
+
+        result = self._build_cluster_result(final_clusters)
+        if self.config.get('parent_cluster_threshold') is not None:
+            result.parent_ids = self._cluster_parents(result)
+        result.write_csv(output_path)
         print(f"✅ 结果已成功保存。")
-        # 减去未聚类但满足频率阈值的项和'Others'
-        new_property_count = cluster_id_counter - 1 - len([item for item in self.unclustered_items if item['count'] >= freq_threshold_value])
-        if others_group:
-            new_property_count -=1 # 如果有Others组，ID计数器会多一个
-        
-        print(f"\n🎉 所有流程完成！共定义了 {new_property_count} 个核心属性簇。")
+        if self.config.get('write_centroid_index', False):
+            self._save_centroid_index(result, output_path)
+        self._write_derived_outputs(result)
 
+        print(f"\n🎉 所有流程完成！共定义了 {len(final_clusters)} 个核心属性簇。")
+        return result
+
+
+    def _load_centroid_index(self, previous_csv: str, clusters: Dict[str, List[List]]) -> CentroidIndex:
+        """
+        加载上次保存的质心索引；若不存在或已过期，则编码全部已有簇成员重新计算
+        （开销与完整编码相同，除非嵌入缓存命中）。配置 `write_centroid_index` 时完整聚类
+        会在输出旁写出该索引。
+        """
+        sidecar = previous_csv + '.centroids.npz'
+        if os.path.exists(sidecar):
+            try:
+                index, fingerprint = CentroidIndex.load(sidecar)
+            except ValueError as e:
+                print(f"  - 质心文件 '{sidecar}' 无法读取，将重新计算: {e}")
+                index, fingerprint = None, None
+            if index is not None and fingerprint == file_fingerprint(previous_csv) and set(index.cluster_ids) == set(clusters):
+                print(f"  - 已从 '{sidecar}' 加载 {len(index)} 个簇质心。")
+                return index
+
+        print("  - 正在根据已有簇成员计算质心...")
+        cluster_ids = list(clusters)
+        member_terms = [prop for cid in cluster_ids for prop, _ in clusters[cid]]
+        with self._encoder() as encoder:
+            store = EmbeddingStore.build(encoder, member_terms, device=self._device, cache=self._open_embedding_cache())
+        rows, offset = [], 0
+        for cid in cluster_ids:
+            rows.append(list(range(offset, offset + len(clusters[cid]))))
+            offset += len(clusters[cid])
+        return CentroidIndex.from_members(cluster_ids, rows, store.slice())
+
+    def run_assign(self):
+        """
+        增量分配模式: 把新出现或频次变化的属性放入已有的簇输出中，而不重新聚类。
+
+        新属性被分配到相似度不低于 `secondary_cluster_threshold` 的最近簇；否则
+        根据频率阈值成为新的独立簇或归入 'Others'。已有簇 ID 保持不变。
+        """
+        with self.metrics.stage('load') as record:
+            self._load_data()
+            record['items'] = len(self.terms_to_cluster)
+        previous_csv = self.config['assign_previous_csv_path']
+        print(f"\n📂 正在从 '{previous_csv}' 加载已有聚类结果...")
+        clusters, others, parents = load_cluster_csv(previous_csv)
+        print(f"  - 已有 {len(clusters)} 个簇，{len(others)} 个 'Others' 属性。")
+        freq_threshold_value = self.config['file_count_for_threshold'] * self.config['frequency_threshold_percent']
+
+        # 更新已有属性的频次，找出需要分配的新属性
+        members_by_term = {member[0]: member for members in clusters.values() for member in members}
+        others_by_term = {member[0]: member for member in others}
+        delta_terms = []
+        for term in self.terms_to_cluster:
+            count = self.term_counts.get(term, 0)
+            if term in members_by_term:
+                members_by_term[term][1] = count
+            elif term in others_by_term:
+                others_by_term[term][1] = count
+                if count >= freq_threshold_value:
+                    # 频次升至阈值以上的 'Others' 属性重新参与分配
+                    delta_terms.append(term)
+            else:
+                delta_terms.append(term)
+        # 新输入中已不存在的属性: 簇成员的频次清零（保留成员，使簇 ID 与质心不变），'Others' 中的直接移除
+        def absent(term: str) -> bool:
+            return term not in self.term_counts and term not in self.original_counts
+        for member in members_by_term.values():
+            if absent(member[0]):
+                member[1] = 0
+        delta_set = set(delta_terms)
+        others = [member for member in others if member[0] not in delta_set and not absent(member[0])]
+        print(f"  - 共有 {len(delta_terms)} 个新增或需重新分配的属性。")
+
+        with self.metrics.stage('encode', items=len(delta_terms)) as record:
+            index = self._load_centroid_index(previous_csv, clusters)
+            if delta_terms:
+                stats = {}
+                with self._encoder() as encoder:
+                    self.store = EmbeddingStore.build(encoder, delta_terms, device=self._device, cache=self._open_embedding_cache(), stats=stats)
+                positions, scores = index.nearest(self.store.slice())
+                record.update(stats)
+            else:
+                positions, scores = [], []
+
+        threshold = self.config['secondary_cluster_threshold']
+        new_cluster_id = next_cluster_id(clusters)
+        assigned = created = to_others = 0
+        for row, (term, pos, score) in enumerate(zip(delta_terms, positions, scores)):
+            count = self.term_counts.get(term, 0)
+            vector = self.store.slice([row])
+            if pos >= 0 and score >= threshold:
+                cluster_id = index.cluster_ids[pos]
+                clusters[cluster_id].append([term, count])
+                index.add(cluster_id, vector)
+                assigned += 1
+            elif count >= freq_threshold_value:
+                cluster_id = str(new_cluster_id)
+                new_cluster_id += 1
+                clusters[cluster_id] = [[term, count]]
+                index.add(cluster_id, vector)
+                created += 1
+            else:
+                others.append([term, count])
+                to_others += 1
+        print(f"  - {assigned} 个分配到已有簇，{created} 个成为新簇，{to_others} 个归入 'Others'。")
+
+        output_path = self.config['output_csv_path']
+        with self.metrics.stage('save', items=sum(len(members) for members in clusters.values()) + len(others)):
+            result = write_cluster_csv(output_path, clusters, others, parents)
+            index.save(output_path + '.centroids.npz', file_fingerprint(output_path))
+        print(f"✅ 增量分配结果已保存到 '{output_path}'。")
+        self._write_derived_outputs(result)
+        if self.config.get('keyword_taxonomies'):
+            with self.metrics.stage('keyword_filter', items=result.n_rows) as record:
+                record['clusters'] = self._filter_keywords(result)
+        if self._term_store_path():
+            with self.metrics.stage('term_store', items=result.n_rows):
+                self._record_assignments(result)
+        self.metrics.close()
+
+    def _filter_keywords(self, result: ClusterResult) -> Dict[str, int]:
+        """按 `keyword_taxonomies` 中的关键词表筛选本次的列式结果，返回每个关键词表命中的簇数。"""
+        taxonomies = load_taxonomies(self.config['keyword_taxonomies'])
+        automaton = KeywordAutomaton(taxonomies, whole_words=self.config.get('keyword_whole_words', False))
+        output_path = self.config.get('keyword_output_csv_path', 'matching_clusters.csv')
+        print(f"\n🔍 正在按 {len(taxonomies)} 个关键词表（共 {automaton.n_keywords} 个关键词）筛选簇...")
+        counts = filter_result(result, output_path, automaton, split_dir=self.config.get('keyword_split_dir'))
+        for name, count in counts.items():
+            print(f"  - {name}: {count} 个簇")
+        print(f"✅ 命中的簇已保存到 '{output_path}'。")
+        return counts
+
+    def _split_frequency_tiers(self):
+        """
+        分层模式: 只让高频的头部属性参与完整的两轮聚类，其余长尾属性留待之后按质心分配。
+
+        头部由 `tiered_min_frequency`（频次下限）或 `tiered_head_coverage`（头部累计频次
+        占总频次的比例）决定；两者都未配置时不分层。
+        """
+        min_frequency = self.config.get('tiered_min_frequency')
+        coverage = self.config.get('tiered_head_coverage')
+        if min_frequency is None and coverage is None:
+            return
+
+        ordered = sorted(self.terms_to_cluster, key=lambda t: self.term_counts.get(t, 0), reverse=True)
+        if min_frequency is not None:
+            head_size = sum(1 for t in ordered if self.term_counts.get(t, 0) >= min_frequency)
+        else:
+            total = sum(self.term_counts.get(t, 0) for t in ordered)
+            running, head_size = 0, 0
+            for t in ordered:
+                if running >= coverage * total:
+                    break
+                running += self.term_counts.get(t, 0)
+                head_size += 1
+        head = set(ordered[:head_size])
+        self.tail_terms = [t for t in self.terms_to_cluster if t not in head]
+        self.terms_to_cluster = [t for t in self.terms_to_cluster if t in head]
+        print(f"  - 分层模式: {len(self.terms_to_cluster)} 个头部属性参与完整聚类，{len(self.tail_terms)} 个长尾属性将按质心分配。")
+
+    def _assign_tail(self, final_clusters: List[Dict]):
+        """把长尾属性分批编码，并分配到最近的头部簇；未达到阈值的归入未聚类项。"""
+        print(f"\n🧲 正在将 {len(self.tail_terms)} 个长尾属性分配到头部簇...")
+        member_rows = [self.store.rows(cluster['sub_cluster_members']) for cluster in final_clusters]
+        index = CentroidIndex.from_members([str(i) for i in range(len(final_clusters))], member_rows, self.store.slice())
+        threshold = self.config.get('tiered_assign_threshold', self.config['secondary_cluster_threshold'])
+        batch_size = self.config.get('tiered_batch_size', 4096)
+        budget = self.config.get('cluster_memory_budget_mb', DEFAULT_MEMORY_BUDGET_MB)
+        cache = self._open_embedding_cache()
+
+        assigned = 0
+        with self._encoder() as encoder:
+            for start in range(0, len(self.tail_terms), batch_size):
+                batch = self.tail_terms[start:start + batch_size]
+                embeddings = EmbeddingStore.encode_terms(encoder, batch, show_progress_bar=False, cache=cache)
+                positions, scores = index.nearest(embeddings, memory_budget_mb=budget)
+                for term, pos, score in zip(batch, positions, scores):
+                    count = self.term_counts.get(term, 0)
+                    if pos >= 0 and score >= threshold:
+                        cluster = final_clusters[pos]
+                        cluster['sub_cluster_members'].append(term)
+                        cluster['sub_cluster_total_frequency'] += count
+                        assigned += 1
+                    else:
+                        self.unclustered_items.append({'property': term, 'count': count})
+        print(f"✅ 长尾分配完成！{assigned} 个属性并入头部簇，{len(self.tail_terms) - assigned} 个作为未聚类项处理。")
+
+    def _report_precision_changes(self, final_clusters: List[Dict]) -> Dict[str, int]:
+        """以完整精度重新执行两轮聚类，统计低精度模式下簇归属发生变化的属性数。"""
+        print(f"\n📏 正在以 float32 重新聚类，评估 {self.store.precision} 对聚类结果的影响...")
+        unclustered_items = self.unclustered_items
+        primary_clusters = self._perform_primary_clustering(embeddings=np.asarray(self.store.embeddings))
+        reference_clusters = []
+        for p_cluster, sub_clusters_indices in zip(primary_clusters, self._secondary_sub_clusters(primary_clusters)):
+            members = [member['property'] for member in p_cluster['members']]
+            if len(members) <= 1:
+                reference_clusters.append(members)
+                continue
+            reference_clusters.extend(c['sub_cluster_members'] for c in self._merge_sub_clusters(members, sub_clusters_indices))
+        self.unclustered_items = unclustered_items
+
+        changes = assignment_changes(reference_clusters, [c['sub_cluster_members'] for c in final_clusters])
+        print(f"✅ 精度对比完成: {changes['terms']} 个属性中有 {changes['changed']} 个的簇归属与 float32 不同。")
+        return changes
+
+    def _load_similarity_graph(self, min_threshold: float) -> SimilarityGraph:
+        """
+        读取 `sweep_graph_path` 中的近邻图；如果不存在、与当前属性和嵌入不一致，或构建阈值
+        高于 min_threshold，则以 min_threshold 重新构建并保存。
+        """
+        path = self.config.get('sweep_graph_path', 'similarity_graph.npz')
+        max_neighbors = self.config.get('sweep_max_neighbors')
+        self._stage_fingerprint('terms')
+        fingerprint = stage_fingerprint('graph', self._stage_fingerprint('embeddings'), max_neighbors)
+        if os.path.exists(path):
+            graph, saved_fingerprint = SimilarityGraph.load(path)
+            if saved_fingerprint == fingerprint and graph.min_threshold <= min_threshold:
+                print(f"  - 已从 '{path}' 加载近邻图 ({graph.nnz} 条边，构建阈值 {graph.min_threshold})。")
+                return graph
+
+        print(f"  - 正在以阈值 {min_threshold} 构建近邻图...")
+        with self.metrics.stage('graph', items=len(self.store)) as record:
+            graph = SimilarityGraph.build(
+                self.store.slice(), min_threshold, max_neighbors=max_neighbors,
+                memory_budget_mb=self.config.get('cluster_memory_budget_mb', DEFAULT_MEMORY_BUDGET_MB)
+            )
+            record['edges'] = graph.nnz
+        graph.save(path, fingerprint)
+        print(f"  - 近邻图共 {graph.nnz} 条边，已保存到 '{path}'。")
+        return graph
+
+    def run_sweep(self):
+        """
+        阈值扫描模式: 只构建一次稀疏近邻图，然后在图上对
+        第一轮阈值 × 最小簇大小 × 第二轮阈值 的整个网格运行聚类，
+        报告每组参数的簇数量、覆盖率和 'Others' 规模，写入 `sweep_output_csv_path`。
+        不支持分层模式: 扫描不执行长尾分配，结果会与同一阈值下的 `run` 不一致。
+        """
+        if _tiering_enabled(self.config):
+            print("错误: 阈值扫描不支持分层模式，请先关闭 'tiered_min_frequency' / 'tiered_head_coverage'。")
+            return
+        with self.metrics.stage('load') as record:
+            for name, value in self._checkpointed('terms', self._load_term_table).items():
+                setattr(self, name, value)
+            record['items'] = len(self.terms_to_cluster)
+
+        print("\n🧠 正在为所有属性生成语义向量...")
+        with self.metrics.stage('encode', items=len(self.terms_to_cluster)):
+            with self._encoder() as encoder:
+                embeddings = self._checkpointed('embeddings', lambda: EmbeddingStore.encode_terms(
+                    encoder, self.terms_to_cluster, cache=self._open_embedding_cache()))
+            self.store = EmbeddingStore(self.terms_to_cluster, embeddings, device=self._device,
+                                        precision=self.config.get('embedding_precision', 'float32'))
+
+        primary_thresholds = self.config.get('sweep_primary_thresholds') or [self.config['primary_cluster_threshold']]
+        secondary_thresholds = self.config.get('sweep_secondary_thresholds') or [self.config['secondary_cluster_threshold']]
+        min_sizes = self.config.get('sweep_min_community_sizes') or [self.config['min_community_size']]
+        print(f"\n📈 正在执行阈值扫描: 第一轮阈值 {primary_thresholds}，最小簇大小 {min_sizes}，第二轮阈值 {secondary_thresholds}")
+        graph = self._load_similarity_graph(min(primary_thresholds + secondary_thresholds))
+
+        terms = self.terms_to_cluster
+        counts = [self.term_counts.get(term, 0) for term in terms]
+        total_frequency = sum(counts) or 1
+        freq_threshold_value = self.config['file_count_for_threshold'] * self.config['frequency_threshold_percent']
+        header = ['primary_threshold', 'min_community_size', 'secondary_threshold', 'primary_clusters',
+                  'primary_coverage', 'frequency_coverage', 'final_clusters', 'singleton_clusters',
+                  'total_clusters', 'others_terms', 'others_frequency_share']
+        rows = []
+        with self.metrics.stage('sweep') as record:
+            for primary_threshold in primary_thresholds:
+                for min_size in min_sizes:
+                    primary = graph.community_detection(primary_threshold, min_size)
+                    clustered = {idx for cluster in primary for idx in cluster}
+                    unclustered = [i for i in range(len(terms)) if i not in clustered]
+                    others = [i for i in unclustered if counts[i] < freq_threshold_value]
+                    singletons = len(unclustered) - len(others)
+                    clustered_frequency = sum(counts[i] for i in clustered)
+                    for secondary_threshold in secondary_thresholds:
+                        final_count = 0
+                        for cluster in primary:
+                            if len(cluster) <= 1:
+                                final_count += 1
+                                continue
+                            members = [terms[i] for i in cluster]
+                            final_count += len(self._merge_sub_clusters(members, graph.sub_communities(cluster, secondary_threshold)))
+                        rows.append([
+                            primary_threshold, min_size, secondary_threshold, len(primary),
+                            round(len(clustered) / max(len(terms), 1), 4), round(clustered_frequency / total_frequency, 4),
+                            final_count, singletons, final_count + singletons,
+                            len(others), round(sum(counts[i] for i in others) / total_frequency, 4)
+                        ])
+            record['items'] = len(rows)
+
+        output_path = self.config.get('sweep_output_csv_path', 'threshold_sweep.csv')
+        with open(output_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+        import pandas as pd
+        print(pd.DataFrame(rows, columns=header).to_string(index=False))
+        print(f"✅ 阈值扫描完成！{len(rows)} 组参数的结果已保存到 '{output_path}'。")
+        self.metrics.close()
+
+    def run_dry(self):
+        """
+        试运行: 加载属性表，报告参与聚类的属性数、需要重新编码的属性数以及各检查点阶段能否复用。
+        不加载模型，也不做编码和聚类。
+        """
+        for name, value in self._checkpointed('terms', self._load_term_table).items():
+            setattr(self, name, value)
+        print("\n🔎 试运行结果:")
+        print(f"  - 参与完整聚类的属性: {len(self.terms_to_cluster)}，长尾属性: {len(self.tail_terms)}")
+        cache = self._open_embedding_cache()
+        terms = self.terms_to_cluster + self.tail_terms
+        missing = sum(1 for term in terms if term not in cache) if cache is not None else len(terms)
+        print(f"  - 需要编码的属性: {missing}" + ("，不会加载模型。" if missing == 0 else "。"))
+        if self.checkpoints is not None:
+            for stage in CHECKPOINT_STAGES:
+                reusable = self.checkpoints.index.get(stage) == self._stage_fingerprint(stage)
+                print(f"  - 检查点 '{stage}': {'可复用' if reusable else '需要重新计算'}")
+        self.metrics.close()
 
     def run(self):
-        """执行完整的聚类分析流程。"""
-        self._load_data()
+        """执行完整的聚类分析流程。各阶段的耗时与内存记录到 `metrics_path`（如已配置）。"""
+        with self.metrics.stage('load') as record:
+            for name, value in self._checkpointed('terms', self._load_term_table).items():
+                setattr(self, name, value)
+            record['items'] = len(self.terms_to_cluster) + len(self.tail_terms)
         
         print("\n🧠 正在为所有属性生成语义向量...")
-        term_embeddings = self.model.encode(self.terms_to_cluster, convert_to_tensor=True, show_progress_bar=True)
-        print(f"✅ 已为 {len(term_embeddings)} 个属性生成向量。")
+        with self.metrics.stage('encode', items=len(self.terms_to_cluster)) as record:
+            stats = {}
+            with self._encoder() as encoder:
+                embeddings = self._checkpointed('embeddings', lambda: EmbeddingStore.encode_terms(
+                    encoder, self.terms_to_cluster, cache=self._open_embedding_cache(), stats=stats))
+            self.store = EmbeddingStore(self.terms_to_cluster, embeddings, device=self._device,
+                                        precision=self.config.get('embedding_precision', 'float32'))
+            record.update(stats)
+        print(f"✅ 已为 {len(self.store)} 个属性生成向量。")
+        if self.store.quantized is not None:
+            print(f"  - 嵌入以 {self.store.precision} 保存，占用 {self.store.nbytes / 2**20:.1f} MB "
+                  f"(float32 为 {len(self.store) * self.store.embeddings.shape[1] * 4 / 2**20:.1f} MB)。")
         
-        primary_clusters = self._perform_primary_clustering(term_embeddings)
-        final_clusters = self._perform_secondary_clustering(primary_clusters)
-        self._save_results_to_csv(final_clusters)
+        with self.metrics.stage('primary', items=len(self.store)) as record:
+            primary = self._checkpointed('primary', self._primary_stage)
+            primary_clusters, self.unclustered_items = primary['clusters'], primary['unclustered_items']
+            record['clusters'] = len(primary_clusters)
+        with self.metrics.stage('secondary', items=sum(len(c['indices']) for c in primary_clusters)) as record:
+            final_clusters = self._perform_secondary_clustering(primary_clusters)
+            record['clusters'] = len(final_clusters)
+        if self.store.quantized is not None and self.config.get('precision_report'):
+            with self.metrics.stage('precision_report', items=len(self.store)) as record:
+                record.update(self._report_precision_changes(final_clusters))
+        if self.tail_terms:
+            with self.metrics.stage('assign_tail', items=len(self.tail_terms)):
+                self._assign_tail(final_clusters)
+        with self.metrics.stage('save', items=len(self.term_counts)):
+            result = self._save_results_to_csv(final_clusters)
+        if self.config.get('keyword_taxonomies'):
+            with self.metrics.stage('keyword_filter', items=result.n_rows) as record:
+                record['clusters'] = self._filter_keywords(result)
+        if self._term_store_path():
+            with self.metrics.stage('term_store', items=result.n_rows):
+                self._record_assignments(result)
+        self.metrics.close()
+
+
+def _timed_block_diagonal(embeddings, block_sizes: List[int], threshold: float, memory_budget_mb: int):
+    """进程池入口: 计算块对角子簇，并返回 (结果, 耗时秒数)。"""
+    start = time.perf_counter()
+    output = block_diagonal_communities(embeddings, block_sizes, threshold, memory_budget_mb=memory_budget_mb)
+    return output, time.perf_counter() - start
 
 
 if __name__ == '__main__':
@@ -236,8 +1040,13 @@ if __name__ == '__main__':
     # 配置区域
     # ==============================================================================
     CONFIG = {
+        # --- 运行模式 ---
+        "mode": 'cluster',                    # 'cluster': 完整两轮聚类; 'assign': 增量分配到已有簇输出; 'sweep': 阈值扫描; 'dry_run': 只校验配置并报告工作量
+        "assign_previous_csv_path": 'property_clusters_output_secondary.csv',  # 'assign' 模式读取的已有结果
+        "write_centroid_index": False,        # 完整聚类后在输出旁写出簇质心 (*.centroids.npz)，供之后的 'assign' 直接加载
+        
         # --- 文件路径 ---
-        "input_json_path": '/Volumes/mac_outstore/work/3-5-9w-item/extracted_fields.json',
+        "input_json_path": '/Volumes/mac_outstore/work/3-5-9w-item/extracted_fields.json',  # 也可以是 simple.py 写出的 extracted_fields.columnar 目录或 extracted_fields.sqlite 频次库
         "output_csv_path": 'property_clusters_output_secondary.csv',
         
         # --- 数据字段 ---
@@ -245,15 +1054,97 @@ if __name__ == '__main__':
         
         # --- 模型与聚类参数 ---
         "sbert_model": 'all-MiniLM-L6-v2',
+        "device": None,                       # 'cpu' / 'cuda'；None 表示在第一次需要时自动检测（会导入 torch）
         "primary_cluster_threshold": 0.85,    # 第一轮聚类相似度阈值
         "secondary_cluster_threshold": 0.95,  # 第二轮聚类相似度阈值
         "min_community_size": 2,              # 第一轮聚类中，一个簇最少包含的成员数量
+        "cluster_backend": 'dense',           # 第一轮聚类后端: 'dense' / 'blocked' (分块精确) / 'ivf' (近似) / 'minhash' (字面候选分桶)
+        "cluster_memory_budget_mb": 256,      # 'blocked' / 'ivf' 后端每个相似度块的内存预算
+        "ivf_n_lists": None,                  # 'ivf' 后端的粗聚类单元数，None 表示约 sqrt(n)
+        "ivf_n_probe": 8,                     # 'ivf' 后端每个单元探测的相邻单元数
+        "minhash_jaccard_threshold": 0.5,     # 'minhash' 后端候选分桶针对的字符 n-gram Jaccard 阈值，越低召回越高
+        "minhash_num_perm": 128,              # 'minhash' 后端的 MinHash 签名长度
+        "minhash_ngram": 3,                   # 'minhash' 后端的字符 n-gram 长度
+        "minhash_bands": None,                # 'minhash' 后端的 LSH 段数，None 表示按 Jaccard 阈值自动选择
+        "embedding_precision": 'float32',     # 嵌入在内存中的精度: 'float32' / 'float16' / 'int8' (按向量缩放)，低精度须配合 'blocked' 后端，可节省 2-4 倍内存
+        "rescore_margin": None,               # 低精度相似度在 [阈值-margin, 1] 内的候选用完整精度重新打分；None 表示按精度取默认值
+        "precision_report": False,            # 低精度模式下是否再以 float32 聚类一次，报告簇归属变化的属性数
+        "secondary_batch_rows": 512,          # 第二轮聚类中，小簇打包成批次时每批的最大行数
+        "secondary_parallel_min_size": 1024,  # 成员数达到该值的主簇交给进程池并行处理
+        "secondary_workers": None,            # 第二轮并行进程数，None 表示使用全部 CPU 核
+        
+        # --- 规范化与去重 ---
+        # 可选规则: 'unicode', 'whitespace', 'quotes', 'case', 'parenthetical'；空列表表示不规范化 (默认)
+        "canonicalization_rules": [],
+        
+        # --- 分层聚类 (长尾按质心分配) ---
+        "tiered_min_frequency": None,         # 频次不低于该值的属性参与完整聚类，其余按质心分配；None 表示不分层
+        "tiered_head_coverage": None,         # 或: 头部属性累计频次达到总频次的该比例 (如 0.9)
+        "tiered_assign_threshold": 0.95,      # 长尾属性并入头部簇所需的最低余弦相似度
+        "tiered_batch_size": 4096,            # 长尾属性分批编码与分配的批大小
+        
+        # --- 嵌入缓存 ---
+        "embedding_cache_dir": None,                # 持久化嵌入缓存目录 (如 '.embedding_cache')，None 表示不使用缓存
+        "embedding_cache_max_entries": 1_000_000,   # 缓存最多保存的属性数量，超出时按 LRU 淘汰
+        
+        # --- 多进程编码 (CPU) ---
+        "encoding_workers": None,             # 编码进程数 (每个进程加载一份模型，属性按长度分桶后分发)；None 或 1 表示在当前进程中编码
+        "encoding_threads_per_worker": None,  # 每个编码进程的 torch 线程数，None 表示 CPU 核数 / 进程数
+        
+        # --- 阈值扫描 ('sweep' 模式) ---
+        "sweep_primary_thresholds": [0.75, 0.8, 0.85, 0.9],   # 第一轮阈值网格
+        "sweep_secondary_thresholds": [0.9, 0.95],            # 第二轮阈值网格
+        "sweep_min_community_sizes": [2, 3, 5],               # 最小簇大小网格
+        "sweep_graph_path": 'similarity_graph.npz',           # 稀疏近邻图 (CSR) 的保存路径，输入与嵌入不变时直接复用
+        "sweep_max_neighbors": None,                          # 每个属性最多保存的近邻数 (top-k)，None 表示不截断
+        "sweep_output_csv_path": 'threshold_sweep.csv',       # 扫描结果表
+        
+        # --- 后处理 (筛选与代表属性) ---
+        "filtered_output_csv_path": None,     # 去掉 Others 且簇总频次 >= filter_min_total_frequency 的簇，None 表示不写出
+        "representative_output_csv_path": None,  # 筛选后每个簇频次最高的代表属性 (每簇一行)，None 表示不写出
+        "filter_min_total_frequency": 10,     # 筛选时保留的最低簇总频次
+        
+        # --- 上一级聚类 ---
+        "parent_cluster_threshold": None,     # 对筛选后各簇的代表属性以该阈值 (如 0.5) 再聚类一次，输出中增加 parent_cluster_id 列；None 表示不做
+        "parent_min_community_size": 2,       # 上一级簇最少包含的簇数
+        
+        # --- 关键词筛选 ---
+        "keyword_taxonomies": None,           # 关键词表文件或目录列表 (每行一个关键词，表名取文件名)，如 ['taxonomies']；None 表示不筛选
+        "keyword_output_csv_path": 'matching_clusters.csv',  # 命中任一关键词表的簇 (不含 Others)，附带 taxonomies 列
+        "keyword_split_dir": None,            # 为每个关键词表单独写出 <表名>.csv 的目录，None 表示不拆分
+        "keyword_whole_words": False,         # 是否按整词匹配；False (默认) 时按子串匹配，与笔记本的 str.contains 相同
+
+        # --- SQLite 频次库 ---
+        "term_store_min_count": None,         # 输入为频次库时，只加载频次不低于该值的属性 (在 SQL 中筛选)；None 表示不限
+        "term_store_top_n": None,             # 输入为频次库时，只加载频次最高的前 N 个属性；None 表示不限
+        "term_store_path": None,              # 写回簇归属的频次库；None 表示输入为频次库时写回输入，否则不写回
+        
+        # --- 检查点 ---
+        "checkpoint_dir": None,               # 阶段检查点目录 (属性表/嵌入/第一轮/第二轮子簇)，再次运行时从最早失效的阶段继续；None 表示不使用
+        
+        # --- 运行指标 ---
+        "metrics_path": None,                 # 各阶段耗时/内存等指标的 JSONL 输出路径，None 表示不写出
+        "profile_dir": None,                  # 为热点循环开启 cProfile 时 .prof 文件的输出目录
         
         # --- 频率筛选参数 ---
         "file_count_for_threshold": 80000,     # 用于计算频率百分比基数的总文件数
         "frequency_threshold_percent": 0.01   # 频率筛选阈值 (例如 0.01 代表 1%)
     }
 
+    errors = validate_config(CONFIG)
+    if errors:
+        print("❌ 配置无效:")
+        for error in errors:
+            print(f"  - {error}")
+        sys.exit(1)
+
     # 创建分析器实例并运行
     analyzer = PropertyClusterAnalyzer(CONFIG)
-    analyzer.run()
+    if CONFIG.get('mode', 'cluster') == 'assign':
+        analyzer.run_assign()
+    elif CONFIG.get('mode') == 'sweep':
+        analyzer.run_sweep()
+    elif CONFIG.get('mode') == 'dry_run':
+        analyzer.run_dry()
+    else:
+        analyzer.run()
@@ -0,0 +1,229 @@
+"""
+分阶段的运行指标记录。
+
+`main.py`、`simple.py` 和 `simple_extract.py` 共用同一个记录器: 每个阶段记录
+墙钟时间、CPU 时间（含已结束的子进程）、阶段内的峰值内存 (RSS) 及 RSS 增量和处理
+条目数；逐文件、逐簇等细粒度事件也写入同一个 JSONL 文件，每行一条记录，运行
+中途崩溃时已写出的记录仍然可用。关闭时追加一条 summary 记录，列出各阶段汇总
+以及每类事件中最慢的若干条（例如最慢的主簇）。
+
+可选地为热点循环开启 cProfile，每个被分析的代码块输出一个 `.prof` 文件，
+可用 `python -m pstats` 或 snakeviz 查看。
+"""
+import contextlib
+import cProfile
+import heapq
+import json
+import os
+import resource
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+# summary 中每类事件保留的最慢记录数
+SLOWEST_EVENTS = 10
+
+# 本进程在最近一次重置峰值 RSS 之前达到的最大值 (MB)
+_peak_before_reset = 0.0
+
+
+def _read_status_mb(field: str) -> Optional[float]:
+    """读取 /proc/self/status 中的内存字段 (MB)；不可用时返回 None。"""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _high_water_mb() -> float:
+    """自上次重置以来的峰值常驻内存 (MB)。Linux 上 ru_maxrss 单位为 KB，macOS 上为字节。"""
+    peak = _read_status_mb('VmHWM')
+    if peak is not None:
+        return peak
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def peak_rss_mb() -> float:
+    """当前进程整个生命周期的峰值常驻内存 (MB)。"""
+    return max(_peak_before_reset, _high_water_mb())
+
+
+def current_rss_mb() -> float:
+    """当前进程的常驻内存 (MB)；不可用时返回生命周期峰值。"""
+    current = _read_status_mb('VmRSS')
+    return peak_rss_mb() if current is None else current
+
+
+def _reset_high_water() -> bool:
+    """重置内核记录的峰值 RSS (Linux 的 /proc/self/clear_refs)，返回是否成功。"""
+    global _peak_before_reset
+    _peak_before_reset = peak_rss_mb()
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+class RssWindow:
+    """
+    测量一段代码执行期间的峰值 RSS 和 RSS 增量。
+
+    进入时重置内核的峰值记录，因此 `peak_mb` 是这段代码内的峰值，而不是之前更大阶段
+    留下的进程峰值。嵌套的窗口在重置前把当前峰值计入外层窗口。无法重置时（非 Linux）
+    `peak_mb` 退化为进程生命周期的峰值，此时 `scope` 为 'process'。
+    """
+    _open: List['RssWindow'] = []
+
+    def __init__(self):
+        self.peak_mb = 0.0
+        self.delta_mb = 0.0
+        self.scope = 'stage'
+        self._start_mb = 0.0
+
+    def __enter__(self) -> 'RssWindow':
+        high_water = _high_water_mb()
+        for window in self._open:
+            window.peak_mb = max(window.peak_mb, high_water)
+        self._start_mb = current_rss_mb()
+        self.scope = 'stage' if _reset_high_water() else 'process'
+        self.peak_mb = self._start_mb
+        self._open.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        self._open.remove(self)
+        self.peak_mb = max(self.peak_mb, _high_water_mb()) if self.scope == 'stage' else peak_rss_mb()
+        self.delta_mb = current_rss_mb() - self._start_mb
+        for window in self._open:
+            window.peak_mb = max(window.peak_mb, self.peak_mb)
+        return False
+
+
+def cpu_seconds() -> float:
+    """本进程及已结束的子进程累计的 CPU 时间（用户态 + 内核态）。"""
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+class MetricsRecorder:
+    """
+    把阶段指标和事件写入 JSONL 文件的记录器。
+
+    Args:
+        path: JSONL 输出路径；为 None 时不写文件，只在内存中保留阶段记录。
+        profile_dir: cProfile 输出目录；为 None 时 `profile()` 不做任何事。
+        run_info: 写入第一条 run 记录的附加信息（如配置）。
+    """
+
+    def __init__(self, path: Optional[str] = None, profile_dir: Optional[str] = None,
+                 run_info: Optional[Dict[str, Any]] = None):
+        self.path = path
+        self.profile_dir = profile_dir
+        self.stages: List[Dict[str, Any]] = []
+        self._slowest: Dict[str, List] = {}
+        self._event_counts: Dict[str, int] = {}
+        self._started = time.perf_counter()
+        self._profilers: Dict[str, cProfile.Profile] = {}
+        self._file = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(path, 'a', encoding='utf-8')
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+        self._write({"type": "run", "time": time.time(), "pid": os.getpid(), **(run_info or {})})
+
+    def _write(self, record: Dict[str, Any]):
+        if self._file is not None:
+            self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            self._file.flush()
+
+    @contextlib.contextmanager
+    def stage(self, name: str, items: int = 0, **fields) -> Iterator[Dict[str, Any]]:
+        """
+        记录一个阶段。产出的字典可在阶段内修改，例如在得知条目数后设置
+        `record["items"]`，或添加 `batches` 等附加字段。
+        """
+        record: Dict[str, Any] = {"type": "stage", "stage": name, "items": items, **fields}
+        wall_start, cpu_start = time.perf_counter(), cpu_seconds()
+        rss = RssWindow()
+        try:
+            with rss:
+                yield record
+        finally:
+            wall = time.perf_counter() - wall_start
+            record["wall_s"] = round(wall, 6)
+            record["cpu_s"] = round(cpu_seconds() - cpu_start, 6)
+            record["peak_rss_mb"] = round(rss.peak_mb, 1)
+            record["rss_delta_mb"] = round(rss.delta_mb, 1)
+            record["peak_rss_scope"] = rss.scope
+            if record.get("items") and wall > 0:
+                record["items_per_s"] = round(record["items"] / wall, 3)
+            if record.get("batches") and wall > 0:
+                record["batches_per_s"] = round(record["batches"] / wall, 3)
+            self.stages.append(record)
+            self._write(record)
+
+    def event(self, name: str, seconds: float, **fields):
+        """记录一个细粒度事件（例如单个文件的解析或单个簇的计算）。"""
+        self._event_counts[name] = self._event_counts.get(name, 0) + 1
+        self._write({"type": "event", "event": name, "seconds": round(seconds, 6), **fields})
+        self._keep_slowest(name, seconds, fields)
+
+    def _keep_slowest(self, name: str, seconds: float, fields: Dict[str, Any]):
+        heap = self._slowest.setdefault(name, [])
+        entry = (seconds, self._event_counts[name], fields)
+        if len(heap) < SLOWEST_EVENTS:
+            heapq.heappush(heap, entry)
+        elif seconds > heap[0][0]:
+            heapq.heapreplace(heap, entry)
+
+    @contextlib.contextmanager
+    def profile(self, name: str):
+        """
+        在配置了 profile_dir 时用 cProfile 分析代码块（只分析本进程）。同名代码块的多次
+        执行累计到同一个分析器中，关闭记录器时输出 `<profile_dir>/<name>.prof`。
+        """
+        if not self.profile_dir:
+            yield
+            return
+        profiler = self._profilers.setdefault(name, cProfile.Profile())
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+
+    def summary(self) -> Dict[str, Any]:
+        """返回各阶段汇总以及每类事件中最慢的记录。"""
+        return {
+            "type": "summary",
+            "wall_s": round(time.perf_counter() - self._started, 6),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "stages": {s["stage"]: {k: s[k] for k in ("wall_s", "cpu_s", "items", "peak_rss_mb", "rss_delta_mb") if k in s} for s in self.stages},
+            "events": {name: {"count": self._event_counts[name],
+                              "slowest": [{"seconds": round(seconds, 6), **fields}
+                                          for seconds, _, fields in sorted(heap, key=lambda e: -e[0])]}
+                       for name, heap in self._slowest.items()},
+        }
+
+    def close(self):
+        """输出 cProfile 结果，写出 summary 记录并关闭文件。"""
+        for name, profiler in self._profilers.items():
+            output = os.path.join(self.profile_dir, f"{name}.prof")
+            profiler.dump_stats(output)
+            self._write({"type": "profile", "name": name, "path": output})
+        self._profilers = {}
+        self._write(self.summary())
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            print(f"  - 运行指标已写入 '{self.path}'")
@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+"""
+基于字符 n-gram MinHash 与 LSH 分桶的近重复候选生成。
+
+材料名称中有大量化学式一类的字符串（ZnO、GaN、CdSe/CdS、a-Si:H 的各种写法），
+对它们计算 SBERT 相似度既昂贵又不可靠。本模块把每个名称表示为字符 n-gram 集合，
+计算其 MinHash 签名，再把签名切成 `bands` 段、每段 `rows` 个值分桶: 至少有一段
+完全相同的名称才成为候选对。候选对的数量与名称数近似线性，因此相似度只需在
+候选对之间计算，而不是 n×n。
+
+两种用法:
+
+- 聚类后端 `minhash`（`cluster_backend: 'minhash'`）: 在 `community_detection` 之前
+  做候选分桶，只对候选对计算嵌入的余弦相似度，阈值与最小簇大小的语义不变；
+  不在任何候选桶中的属性对（字面上差异很大的近义词）不会被聚到一起。
+- 纯字面的近重复分组（取代 `community_detection`）: `lexical_communities` 以 MinHash
+  估计的 Jaccard 相似度为边做社区发现，不需要模型。命令行:
+
+      python minhash_lsh.py material_name.txt --threshold 0.7 -o material_name_groups.csv
+"""
+import argparse
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from cluster_backends import DEFAULT_MEMORY_BUDGET_MB, normalize_embeddings
+from cluster_result import ClusterResult
+from similarity_graph import SimilarityGraph
+
+# 梅森素数 2^31 - 1；哈希函数为 (a * x + b) mod p，x 为 32 位的 crc32，乘积不会溢出 uint64
+_MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+DEFAULT_NUM_PERM = 128
+DEFAULT_NGRAM = 3
+DEFAULT_MAX_BUCKET_SIZE = 1000
+# 计算签名时每块取最小值的数据量 (MB)；保持在 CPU 缓存量级比大块更快
+SIGNATURE_BLOCK_MB = 2
+
+
+def char_ngrams(text: str, n: int = DEFAULT_NGRAM, lowercase: bool = True) -> List[str]:
+    """
+    名称的字符 n-gram（首尾各补一个空格，使短名称和词首词尾也有区分度）。
+    比 n 还短的名称整体作为一个 n-gram。
+    """
+    text = " ".join(text.split())
+    if lowercase:
+        text = text.lower()
+    padded = f" {text} "
+    if len(padded) <= n:
+        return [padded]
+    return [padded[i:i + n] for i in range(len(padded) - n + 1)]
+
+
+def optimal_bands(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    选择 (bands, rows)，使 LSH 的 S 曲线拐点 (1/bands)^(1/rows) 最接近 Jaccard 阈值；
+    拐点相同时取 bands 较大者（召回率更高）。
+    """
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        error = abs((1.0 / bands) ** (1.0 / rows) - threshold)
+        if best is None or error < best[0] - 1e-12:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+
+class MinHasher:
+    """
+    字符 n-gram 的 MinHash 签名计算器。
+
+    Args:
+        num_perm: 哈希函数个数（签名长度）。
+        ngram: n-gram 的字符数。
+        lowercase: 是否忽略大小写。
+        seed: 随机种子，相同参数下签名可复现。
+    """
+
+    def __init__(self, num_perm: int = DEFAULT_NUM_PERM, ngram: int = DEFAULT_NGRAM, lowercase: bool = True, seed: int = 1):
+        self.num_perm = num_perm
+        self.ngram = ngram
+        self.lowercase = lowercase
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, int(_MERSENNE_PRIME), size=num_perm, dtype=np.uint64)[:, None]
+        self._b = rng.integers(0, int(_MERSENNE_PRIME), size=num_perm, dtype=np.uint64)[:, None]
+
+    def _shingle_ids(self, terms: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """所有名称的 n-gram 编号（拼接）、每个名称的起始偏移量，以及每个不同 n-gram 的 crc32 哈希。"""
+        vocabulary: Dict[str, int] = {}
+        ids: List[int] = []
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        for i, term in enumerate(terms):
+            for shingle in char_ngrams(term, self.ngram, self.lowercase):
+                shingle_id = vocabulary.get(shingle)
+                if shingle_id is None:
+                    shingle_id = vocabulary[shingle] = len(vocabulary)
+                ids.append(shingle_id)
+            offsets[i + 1] = len(ids)
+        hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in vocabulary), dtype=np.uint64,
+                             count=len(vocabulary))
+        return np.asarray(ids, dtype=np.int64), offsets, hashes
+
+    def signatures(self, terms: Sequence[str], block_mb: float = SIGNATURE_BLOCK_MB) -> np.ndarray:
+        """
+        计算 (n, num_perm) 的 uint32 签名矩阵。每个不同的 n-gram 只做一次置换哈希；
+        名称按 n-gram 数排序后分块，每块补齐到块内最长的名称再取最小值，每块不超过 `block_mb`。
+        """
+        ids, offsets, hashes = self._shingle_ids(terms)
+        n = len(terms)
+        # (不同 n-gram 数 + 1, num_perm) 的置换哈希表，最后一行是补齐用的最大值；值小于 2^31，可以用 uint32 保存
+        table = np.full((len(hashes) + 1, self.num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+        table[:-1] = ((self._a * hashes[None, :] + self._b) % _MERSENNE_PRIME).T
+        ids = np.append(ids, len(hashes))
+        signatures = np.empty((n, self.num_perm), dtype=np.uint32)
+        lengths = np.diff(offsets)
+        order = np.argsort(lengths, kind="stable")
+        cells_per_block = max(1, int(block_mb * 1024 * 1024 // (self.num_perm * 4)))
+        start = 0
+        while start < n:
+            width = int(lengths[order[start]])
+            stop = start + 1
+            # 块内名称按 n-gram 数升序，块宽取最后一个名称的 n-gram 数
+            while stop < n:
+                step = max(1, cells_per_block // max(int(lengths[order[stop]]), 1) - (stop - start))
+                candidate = min(n, stop + step)
+                width_at = int(lengths[order[candidate - 1]])
+                if (candidate - start) * width_at > cells_per_block:
+                    break
+                stop, width = candidate, width_at
+            rows = order[start:stop]
+            positions = offsets[rows][:, None] + np.arange(width)[None, :]
+            positions = np.where(positions < offsets[rows + 1][:, None], positions, len(ids) - 1)
+            signatures[rows] = table[ids[positions]].min(axis=1)
+            start = stop
+        return signatures
+
+
+def _band_keys(signatures: np.ndarray, band: int, rows: int) -> np.ndarray:
+    """一段签名的 64 位桶键。"""
+    keys = np.zeros(len(signatures), dtype=np.uint64)
+    for column in signatures[:, band * rows:(band + 1) * rows].T:
+        keys = keys * np.uint64(1_000_003) ^ column.astype(np.uint64)
+    return keys
+
+
+def _bucket_pairs(members: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """一组大小相同的桶 (m, s) 内的全部属性对。"""
+    first, second = np.triu_indices(members.shape[1], k=1)
+    return members[:, first].ravel(), members[:, second].ravel()
+
+
+def lsh_candidate_pairs(signatures: np.ndarray, bands: int, rows: int,
+                        max_bucket_size: int = DEFAULT_MAX_BUCKET_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    LSH 分桶得到的候选对 (i, j)，i < j 且不重复。
+
+    超过 `max_bucket_size` 的桶（大量签名段相同的名称）被切分为若干不超过该大小的
+    小桶，使候选对数量保持有界；切分会丢失不同小桶之间的属性对。
+    """
+    n = len(signatures)
+    codes: List[np.ndarray] = []
+    for band in range(bands):
+        keys = _band_keys(signatures, band, rows)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        bounds = np.flatnonzero(np.concatenate([[True], sorted_keys[1:] != sorted_keys[:-1], [True]]))
+        sizes = np.diff(bounds)
+        starts = bounds[:-1]
+        # 按桶大小分组，同样大小的桶一次性生成属性对；桶内成员按行号升序
+        buckets: Dict[int, List[np.ndarray]] = {}
+        for start, size in zip(starts[sizes > 1].tolist(), sizes[sizes > 1].tolist()):
+            for chunk in range(start, start + size, max_bucket_size):
+                chunk_size = min(max_bucket_size, start + size - chunk)
+                if chunk_size > 1:
+                    buckets.setdefault(chunk_size, []).append(chunk)
+        for size, chunk_starts in buckets.items():
+            members = order[np.asarray(chunk_starts)[:, None] + np.arange(size)[None, :]]
+            first, second = _bucket_pairs(members)
+            codes.append(first * n + second)
+    if not codes:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    codes = np.unique(np.concatenate(codes))
+    return codes // n, codes % n
+
+
+def _pair_cosine(embeddings: np.ndarray, first: np.ndarray, second: np.ndarray,
+                 memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB) -> np.ndarray:
+    """分块计算候选对的余弦相似度（embeddings 已归一化）。"""
+    scores = np.empty(len(first), dtype=np.float32)
+    block = max(1, int(memory_budget_mb * 1024 * 1024 // (max(embeddings.shape[1], 1) * 4 * 2)))
+    for start in range(0, len(first), block):
+        stop = start + block
+        scores[start:stop] = np.einsum("ij,ij->i", embeddings[first[start:stop]], embeddings[second[start:stop]])
+    return scores
+
+
+def estimated_jaccard(signatures: np.ndarray, first: np.ndarray, second: np.ndarray,
+                      memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB) -> np.ndarray:
+    """由 MinHash 签名估计的候选对 Jaccard 相似度（签名相同位置的比例）。"""
+    scores = np.empty(len(first), dtype=np.float32)
+    block = max(1, int(memory_budget_mb * 1024 * 1024 // (signatures.shape[1] * 4 * 3)))
+    for start in range(0, len(first), block):
+        stop = start + block
+        scores[start:stop] = (signatures[first[start:stop]] == signatures[second[start:stop]]).mean(axis=1)
+    return scores
+
+
+def candidate_pairs(terms: Sequence[str], jaccard_threshold: float, num_perm: int = DEFAULT_NUM_PERM,
+                    ngram: int = DEFAULT_NGRAM, bands: Optional[int] = None,
+                    max_bucket_size: int = DEFAULT_MAX_BUCKET_SIZE) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    计算签名并生成候选对。
+
+    Args:
+        jaccard_threshold: 候选分桶针对的 Jaccard 阈值（决定 bands / rows）。
+        bands: 手动指定段数（rows = num_perm // bands）；默认由 `optimal_bands` 选择。
+
+    Returns:
+        (first, second, signatures)。
+    """
+    if bands is None:
+        bands, rows = optimal_bands(jaccard_threshold, num_perm)
+    else:
+        rows = max(1, num_perm // bands)
+    signatures = MinHasher(num_perm=num_perm, ngram=ngram).signatures(terms)
+    first, second = lsh_candidate_pairs(signatures, bands, rows, max_bucket_size=max_bucket_size)
+    print(f"  - MinHash/LSH: {bands} 段 × {rows} 行，{len(terms)} 个属性产生 {len(first)} 个候选对。")
+    return first, second, signatures
+
+
+def minhash_community_detection(embeddings: np.ndarray, threshold: float, min_community_size: int,
+                                terms: Optional[Sequence[str]] = None, jaccard_threshold: float = 0.5,
+                                num_perm: int = DEFAULT_NUM_PERM, ngram: int = DEFAULT_NGRAM,
+                                bands: Optional[int] = None, max_bucket_size: int = DEFAULT_MAX_BUCKET_SIZE,
+                                memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB, **_) -> List[List[int]]:
+    """
+    以 MinHash/LSH 候选分桶为前置步骤的社区发现: 只对候选对计算嵌入的余弦相似度，
+    再按与精确后端相同的语义（阈值、最小簇大小、去重叠）提取社区。
+
+    Args:
+        terms: 与嵌入逐行对应的属性文本（分桶依据）。
+        jaccard_threshold: 候选分桶针对的字符 n-gram Jaccard 阈值；越低召回越高、候选对越多。
+    """
+    if terms is None:
+        raise ValueError("minhash 后端需要与嵌入逐行对应的属性文本 (terms)")
+    embeddings = normalize_embeddings(embeddings)
+    n = len(embeddings)
+    if n == 0:
+        return []
+    first, second, _ = candidate_pairs(terms, jaccard_threshold, num_perm=num_perm, ngram=ngram, bands=bands,
+                                       max_bucket_size=max_bucket_size)
+    scores = _pair_cosine(embeddings, first, second, memory_budget_mb)
+    graph = SimilarityGraph.from_pairs(n, first, second, scores, threshold)
+    return graph.community_detection(threshold, min_community_size)
+
+
+def lexical_communities(terms: Sequence[str], jaccard_threshold: float, min_community_size: int = 2,
+                        num_perm: int = DEFAULT_NUM_PERM, ngram: int = DEFAULT_NGRAM, bands: Optional[int] = None,
+                        max_bucket_size: int = DEFAULT_MAX_BUCKET_SIZE,
+                        memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB) -> List[List[int]]:
+    """
+    纯字面的近重复社区发现: 以 MinHash 估计的 Jaccard 相似度代替余弦相似度，
+    其余语义与 `community_detection` 相同。不需要模型。
+    """
+    if len(terms) == 0:
+        return []
+    first, second, signatures = candidate_pairs(terms, jaccard_threshold, num_perm=num_perm, ngram=ngram, bands=bands,
+                                                max_bucket_size=max_bucket_size)
+    scores = estimated_jaccard(signatures, first, second, memory_budget_mb)
+    graph = SimilarityGraph.from_pairs(len(terms), first, second, scores, jaccard_threshold)
+    return graph.community_detection(jaccard_threshold, min_community_size)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="按字符 n-gram MinHash/LSH 对名称做近重复分组（不需要模型）")
+    parser.add_argument("names_file", help="名称文件，每行一个名称（重复出现的行计为频次）")
+    parser.add_argument("-o", "--output", default="near_duplicate_groups.csv", help="分组结果 CSV（与簇输出格式相同）")
+    parser.add_argument("-t", "--threshold", type=float, default=0.7, help="Jaccard 相似度阈值")
+    parser.add_argument("--min-size", type=int, default=2, help="最小分组大小")
+    parser.add_argument("--num-perm", type=int, default=DEFAULT_NUM_PERM)
+    parser.add_argument("--ngram", type=int, default=DEFAULT_NGRAM)
+    parser.add_argument("--bands", type=int, default=None, help="LSH 段数，默认按阈值自动选择")
+    args = parser.parse_args(argv)
+
+    with open(args.names_file, "r", encoding="utf-8") as f:
+        counts = Counter(line.strip() for line in f if line.strip())
+    names = [name for name, _ in counts.most_common()]
+    print(f"🔍 已读取 {len(names)} 个不同的名称，正在分组...")
+    communities = lexical_communities(names, args.threshold, args.min_size, num_perm=args.num_perm,
+                                      ngram=args.ngram, bands=args.bands)
+    groups = []
+    for k, community in enumerate(communities):
+        members = sorted(((names[i], counts[names[i]]) for i in community), key=lambda x: x[1], reverse=True)
+        groups.append((str(k + 1), sum(count for _, count in members), members))
+    ClusterResult.from_groups(groups).write_csv(args.output)
+    covered = sum(len(community) for community in communities)
+    print(f"✅ {covered} 个名称分入 {len(communities)} 个近重复组，结果已保存到 '{args.output}'。")
+
+
+if __name__ == "__main__":
+    main()
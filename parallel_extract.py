@@ -0,0 +1,94 @@
+"""
+多进程字段提取的通用工具。
+
+`simple.py` 和 `simple_extract.py` 共用这里的文件枚举、分块调度和树形归并逻辑:
+文件按块分发给进程池，每个工作进程返回紧凑的 Counter 结果，主进程再以
+相邻两两合并的方式做树形归并。相邻合并保证了键的首次出现顺序与串行处理
+完全一致，因此最终输出与串行路径逐字节相同。
+"""
+import os
+import sys
+from multiprocessing import Pool
+from typing import Any, Callable, List, Sequence
+
+# 控制 BLAS / OpenMP 线程数的环境变量（只对之后才加载的库生效）
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS')
+
+
+def limit_worker_threads(threads: int = 1):
+    """
+    进程池初始化函数: 把工作进程的 BLAS / OpenMP / torch 线程数限制为 `threads`，
+    避免 N 个工作进程各自启动与 CPU 核数相同的线程池而互相争抢。
+
+    已经加载的 BLAS 库通过 threadpoolctl（安装了 scikit-learn 时可用）在运行时限制；
+    torch 只在工作进程已经导入它时才设置，不会为此额外导入。
+    """
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(threads)
+    except ImportError:
+        pass
+    if 'torch' in sys.modules:
+        sys.modules['torch'].set_num_threads(threads)
+
+
+def list_json_files(directory_path: str, suffixes: Sequence[str] = ('.json',)) -> List[str]:
+    """按 os.walk 的顺序列出目录中所有指定后缀的文件（与串行处理顺序一致）。"""
+    file_paths = []
+    for root, _, files in os.walk(directory_path):
+        for file in files:
+            if file.endswith(tuple(suffixes)):
+                file_paths.append(os.path.join(root, file))
+    return file_paths
+
+
+def chunked(items: Sequence[Any], chunk_size: int) -> List[Sequence[Any]]:
+    """把序列切成若干长度不超过 chunk_size 的块。"""
+    chunk_size = max(1, chunk_size)
+    return [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+
+def tree_reduce(results: List[Any], merge: Callable[[Any, Any], Any]) -> Any:
+    """
+    以相邻两两合并的方式做树形归并。
+
+    `merge(left, right)` 必须把 right 合并进 left 并返回 left；由于只合并相邻
+    元素且左侧总在前，结果中的插入顺序与从左到右顺序合并相同。
+    """
+    if not results:
+        return None
+    while len(results) > 1:
+        merged = [merge(results[i], results[i + 1]) for i in range(0, len(results) - 1, 2)]
+        if len(results) % 2:
+            merged.append(results[-1])
+        results = merged
+    return results[0]
+
+
+def run_parallel(chunks: List[Any], worker: Callable[[Any], Any], workers: int,
+                 total_files: int, count_files: Callable[[Any], int], unit_label: str = "个文件") -> List[Any]:
+    """
+    在进程池中按块执行 worker，按原始顺序返回各块结果，并打印汇总进度。
+
+    Args:
+        chunks: 任务块列表，每块会作为唯一参数传给 worker。
+        worker: 顶层（可被 pickle 的）处理函数。
+        workers: 进程数。
+        total_files: 文件总数，用于进度显示。
+        count_files: 从任务块得到其中文件数量的函数。
+        unit_label: 进度显示中的计数单位。
+    """
+    results = []
+    done_files = 0
+    report_every = max(1, total_files // 20)
+    next_report = report_every
+    with Pool(processes=workers, initializer=limit_worker_threads) as pool:
+        for chunk, result in zip(chunks, pool.imap(worker, chunks)):
+            results.append(result)
+            done_files += count_files(chunk)
+            if done_files >= next_report or done_files == total_files:
+                print(f"  - 进度: {done_files}/{total_files} {unit_label} ({done_files * 100 // max(total_files, 1)}%)")
+                next_report = done_files + report_every
+    return results
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+低精度 (float16 / int8) 的嵌入存储与相似度计算。
+
+在只有 CPU 的机器上，十几万个属性的 float32 嵌入矩阵以及社区发现产生的相似度块
+是主要的内存开销。本模块把归一化后的嵌入以 float16 或“每个向量一个缩放系数”的
+int8 形式保存在内存中（分别约为 float32 的 1/2 和 1/4），完整精度的 float32 副本
+只写入磁盘上的一个只读内存映射文件，用于阈值附近的重打分。
+
+相似度按块计算，点积直接在低精度下进行: 安装了 torch 时 int8 使用其整数矩阵乘法
+(`torch._int_mm`，int32 累加，结果精确)，float16 使用其半精度矩阵乘法（float32
+累加，输出舍入到 float16）；没有 torch 时退回到块内转换为 float32 后由 numpy 相乘
+（numpy 没有 float16 / int8 的 BLAS 内核）。int8 的点积最后乘以两侧的缩放系数。
+所有不低于 `threshold - margin` 的候选对再用完整精度的向量按块重新打分，因此只要
+margin 覆盖了量化误差，聚类结果与 float32 完全一致。
+
+低精度模式的主要收益是内存而不是速度。在只有 AVX2 的 CPU 上（5000 个 384 维属性，
+'blocked' 后端，单线程）实测: float32 约 0.29 s，int8 约 0.31 s（与 float32 持平），
+float16 约 0.40 s（约慢 40%，torch 在这类 CPU 上没有更快的半精度内核）。只有在带
+AVX512-VNNI / AMX 等原生低精度矩阵乘法指令的 CPU 上才可能比 float32 快（未实测）。
+"""
+import os
+import tempfile
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+PRECISIONS = ('float32', 'float16', 'int8')
+# 各精度默认的重打分区间宽度（远大于 384 维单位向量的典型量化误差）
+DEFAULT_RESCORE_MARGIN = {'float16': 0.002, 'int8': 0.02}
+# 低精度相似度块中列方向每次相乘的行数
+_COLUMN_TILE = 8192
+# 重打分时每批计算的候选对数
+_RESCORE_BATCH = 8192
+_torch = None
+
+
+def _load_torch():
+    """按需导入 torch；未安装时返回 None，低精度点积退回到 numpy。"""
+    global _torch
+    if _torch is None:
+        try:
+            import torch
+            _torch = torch
+        except ImportError:
+            _torch = False
+    return _torch or None
+
+
+def _tile_product(rows: np.ndarray, columns: np.ndarray, out: np.ndarray):
+    """把低精度行块与列块的点积 rows @ columns.T 写入 float32 的 out（int8 时为未缩放的整数点积）。"""
+    torch = _load_torch()
+    if torch is not None:
+        left, right = torch.from_numpy(rows), torch.from_numpy(columns)
+        if rows.dtype == np.float16:
+            torch.from_numpy(out).copy_(left @ right.T)
+            return
+        if hasattr(torch, '_int_mm'):
+            try:
+                torch.from_numpy(out).copy_(torch._int_mm(left, right.T.contiguous()))
+                return
+            except RuntimeError:
+                pass  # 旧版本 torch 对矩阵形状有限制，退回到 numpy
+    np.matmul(rows.astype(np.float32), columns.astype(np.float32).T, out=out)
+
+
+class QuantizedEmbeddings:
+    """
+    低精度的归一化嵌入矩阵，附带一个磁盘上的 float32 参考副本。
+
+    Attributes:
+        precision (str): 'float16' 或 'int8'。
+        data (np.ndarray): (n, d) 的低精度矩阵。
+        scales (Optional[np.ndarray]): int8 时每行的缩放系数 (float32)，float16 时为 None。
+        reference (np.memmap): (n, d) 的只读 float32 参考副本（已归一化）。
+    """
+
+    def __init__(self, embeddings: np.ndarray, precision: str, reference_dir: Optional[str] = None):
+        if precision not in PRECISIONS[1:]:
+            raise ValueError(f"未知的嵌入精度 '{precision}'，可选: {', '.join(PRECISIONS)}")
+        from cluster_backends import normalize_embeddings
+
+        normalized = normalize_embeddings(embeddings)
+        self.precision = precision
+        if precision == 'float16':
+            self.data = normalized.astype(np.float16)
+            self.scales = None
+        else:
+            max_abs = np.abs(normalized).max(axis=1)
+            self.scales = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+            self.data = np.round(normalized / self.scales[:, None]).astype(np.int8)
+
+        # 完整精度副本只写入磁盘，之后以只读内存映射按需读取
+        fd, self.reference_path = tempfile.mkstemp(prefix="embeddings-", suffix=".f32", dir=reference_dir)
+        with os.fdopen(fd, 'wb') as f:
+            normalized.tofile(f)
+        shape = normalized.shape
+        del normalized
+        self.reference = np.memmap(self.reference_path, dtype=np.float32, mode='r', shape=shape) if shape[0] else np.zeros(shape, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __del__(self):
+        path = getattr(self, 'reference_path', None)
+        if path and os.path.exists(path):
+            self.reference = None
+            os.remove(path)
+
+    @property
+    def nbytes(self) -> int:
+        """常驻内存中的字节数（不含磁盘上的参考副本）。"""
+        return self.data.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def dequantize(self, indices: Optional[Sequence[int]] = None) -> np.ndarray:
+        """把指定行（默认全部）还原为 float32。"""
+        rows = self.data if indices is None else self.data[np.asarray(indices, dtype=np.int64)]
+        result = rows.astype(np.float32)
+        if self.scales is not None:
+            scales = self.scales if indices is None else self.scales[np.asarray(indices, dtype=np.int64)]
+            result *= scales[:, None]
+        return result
+
+    def block_scores(self, start: int, stop: int) -> np.ndarray:
+        """计算行 [start, stop) 与全部行之间的近似相似度块 (float32)。"""
+        rows = self.data[start:stop]
+        scores = np.empty((stop - start, len(self.data)), dtype=np.float32)
+        for col in range(0, len(self.data), _COLUMN_TILE):
+            _tile_product(rows, self.data[col:col + _COLUMN_TILE], scores[:, col:col + _COLUMN_TILE])
+        if self.scales is not None:
+            scores *= self.scales[start:stop, None]
+            scores *= self.scales[None, :]
+        return scores
+
+    def rescore(self, start: int, scores: np.ndarray, floor: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        用完整精度的参考副本重新计算 `block_scores(start, ...)` 块中不低于 floor 的候选对。
+
+        Returns:
+            (块内行号, 列号, 完整精度相似度)，按行号、列号升序排列。
+        """
+        rows, columns = np.divmod(np.flatnonzero(scores >= floor), scores.shape[1])
+        exact = np.empty(len(rows), dtype=np.float32)
+        for begin in range(0, len(rows), _RESCORE_BATCH):
+            batch = slice(begin, begin + _RESCORE_BATCH)
+            left = np.asarray(self.reference[start + rows[batch]], dtype=np.float32)
+            right = np.asarray(self.reference[columns[batch]], dtype=np.float32)
+            exact[batch] = np.einsum('ij,ij->i', left, right)
+        return rows, columns, exact
+
+
+def assignment_changes(reference_clusters: List[List[str]], clusters: List[List[str]]) -> Dict[str, int]:
+    """
+    比较两次聚类的结果，统计簇归属发生变化的属性数。
+
+    一个属性的“归属”定义为它所在簇的成员集合（未聚类的属性视为单独一个簇），
+    因此簇编号不同但成员相同不算变化。
+
+    Returns:
+        {"terms": 参与比较的属性数, "changed": 归属变化的属性数}
+    """
+    def membership(groups: List[List[str]]) -> Dict[str, frozenset]:
+        result = {}
+        for group in groups:
+            members = frozenset(group)
+            for term in group:
+                result[term] = members
+        return result
+
+    before, after = membership(reference_clusters), membership(clusters)
+    terms = set(before) | set(after)
+    changed = sum(1 for term in terms if before.get(term, frozenset([term])) != after.get(term, frozenset([term])))
+    return {"terms": len(terms), "changed": changed}
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+持久化的稀疏余弦近邻图，用于阈值扫描。
+
+对每个属性只保存相似度不低于 `min_threshold` 的近邻（可选地只保留前 k 个），
+以 CSR 形式 (indptr / indices / scores) 存储；每一行的近邻按相似度降序排列
+（相同相似度按行号升序），属性自身也包含在内。因此对于任何不低于
+`min_threshold` 的阈值，一行的近邻集合恰好是该行的一个前缀，社区发现只需
+在图上做一次二分/比较，而不必重新计算相似度矩阵。
+
+在图上运行的社区发现与 `cluster_backends.blocked_community_detection`
+（第一轮）及 `block_diagonal_communities`（第二轮）语义一致；相似度以 float32
+保存，恰好落在阈值上的极少数属性对可能与 float64 计算的第二轮结果不同。
+"""
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from cluster_backends import DEFAULT_MEMORY_BUDGET_MB, _rows_per_block, finalize_communities, normalize_embeddings
+
+
+class SimilarityGraph:
+    """
+    CSR 形式的稀疏近邻图。
+
+    Attributes:
+        indptr (np.ndarray): 长度为 n+1 的 int64 行指针。
+        indices (np.ndarray): 近邻的行号 (int64)。
+        scores (np.ndarray): 与 indices 对应的余弦相似度 (float32)。
+        min_threshold (float): 构建时使用的最低阈值，低于它的阈值无法在本图上计算。
+        max_neighbors (Optional[int]): 每行最多保留的近邻数；None 表示不截断。
+    """
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, scores: np.ndarray,
+                 min_threshold: float, max_neighbors: Optional[int] = None):
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.scores = np.asarray(scores, dtype=np.float32)
+        self.min_threshold = float(min_threshold)
+        self.max_neighbors = max_neighbors
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+    @property
+    def nnz(self) -> int:
+        return len(self.indices)
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray, min_threshold: float, max_neighbors: Optional[int] = None,
+              memory_budget_mb: float = DEFAULT_MEMORY_BUDGET_MB) -> "SimilarityGraph":
+        """
+        以分块精确近邻搜索构建近邻图，峰值内存由 `memory_budget_mb` 控制。
+
+        Args:
+            embeddings: (n, d) 嵌入矩阵。
+            min_threshold: 保存近邻的最低相似度。
+            max_neighbors: 每行最多保留的近邻数（top-k）。截断后，近邻数超过 k 的行在
+                           低阈值下的社区会被截短，因此默认不截断。
+        """
+        embeddings = normalize_embeddings(embeddings)
+        n = len(embeddings)
+        block = _rows_per_block(n, memory_budget_mb)
+        row_indices: List[np.ndarray] = []
+        row_scores: List[np.ndarray] = []
+        counts = np.zeros(n, dtype=np.int64)
+        for start in range(0, n, block):
+            stop = min(start + block, n)
+            scores = embeddings[start:stop] @ embeddings.T
+            for i in range(stop - start):
+                hit = np.flatnonzero(scores[i] >= min_threshold)
+                order = np.argsort(-scores[i, hit], kind="stable")
+                if max_neighbors is not None:
+                    order = order[:max_neighbors]
+                row_indices.append(hit[order])
+                row_scores.append(scores[i, hit[order]])
+                counts[start + i] = len(order)
+        indptr = np.concatenate([[0], np.cumsum(counts)])
+        indices = np.concatenate(row_indices) if row_indices else np.zeros(0, dtype=np.int64)
+        scores = np.concatenate(row_scores) if row_scores else np.zeros(0, dtype=np.float32)
+        return cls(indptr, indices, scores, min_threshold, max_neighbors)
+
+    @classmethod
+    def from_pairs(cls, n: int, rows: np.ndarray, columns: np.ndarray, scores: np.ndarray,
+                   min_threshold: float) -> "SimilarityGraph":
+        """
+        由已打分的候选属性对（例如 LSH 分桶得到的候选）构建近邻图。每对属性只需给出一次，
+        相似度低于 `min_threshold` 的属性对被丢弃；每个属性以相似度 1.0 作为自身的近邻。
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        columns = np.asarray(columns, dtype=np.int64)
+        scores = np.asarray(scores, dtype=np.float32)
+        keep = scores >= min_threshold
+        rows, columns, scores = rows[keep], columns[keep], scores[keep]
+        self_rows = np.arange(n, dtype=np.int64)
+        all_rows = np.concatenate([self_rows, rows, columns])
+        all_columns = np.concatenate([self_rows, columns, rows])
+        all_scores = np.concatenate([np.ones(n, dtype=np.float32), scores, scores])
+        # 行内按相似度降序、相同相似度按行号升序排列
+        order = np.lexsort((all_columns, -all_scores, all_rows))
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(all_rows, minlength=n))])
+        return cls(indptr, all_columns[order], all_scores[order], min_threshold)
+
+    def _check_threshold(self, threshold: float):
+        if threshold < self.min_threshold:
+            raise ValueError(f"阈值 {threshold} 低于近邻图的构建阈值 {self.min_threshold}，请以更低的阈值重新构建")
+
+    def _neighbor_counts(self, threshold: float) -> np.ndarray:
+        """每一行相似度不低于 threshold 的近邻数（各行近邻已按相似度降序排列）。"""
+        above = np.concatenate([[0], np.cumsum(self.scores >= threshold)])
+        return above[self.indptr[1:]] - above[self.indptr[:-1]]
+
+    def community_detection(self, threshold: float, min_community_size: int) -> List[List[int]]:
+        """在图上运行第一轮社区发现，返回按簇大小降序排列的行号列表。"""
+        self._check_threshold(threshold)
+        n = len(self)
+        if n == 0:
+            return []
+        min_community_size = min(min_community_size, n)
+        counts = self._neighbor_counts(threshold)
+        communities = [self.indices[self.indptr[i]:self.indptr[i] + counts[i]].tolist()
+                       for i in np.flatnonzero(counts >= min_community_size)]
+        return finalize_communities(communities, min_community_size)
+
+    def sub_communities(self, members: Sequence[int], threshold: float, min_community_size: int = 1) -> List[List[int]]:
+        """
+        只在 members 这组行内部做社区发现（第二轮聚类），返回 members 内的局部行号。
+        """
+        self._check_threshold(threshold)
+        local = {int(row): i for i, row in enumerate(members)}
+        communities: List[List[int]] = []
+        for row in members:
+            start, stop = self.indptr[row], self.indptr[row + 1]
+            community = []
+            for neighbor, score in zip(self.indices[start:stop].tolist(), self.scores[start:stop].tolist()):
+                if score < threshold:
+                    break
+                if neighbor in local:
+                    community.append(local[neighbor])
+            if len(community) >= 1:
+                communities.append(community)
+        return finalize_communities(communities, min(min_community_size, len(members)))
+
+    def save(self, path: str, fingerprint: str = ""):
+        """以 npz 格式保存近邻图，fingerprint 用于判断图是否与当前输入一致。"""
+        np.savez(path, indptr=self.indptr, indices=self.indices, scores=self.scores,
+                 min_threshold=np.float64(self.min_threshold),
+                 max_neighbors=np.int64(-1 if self.max_neighbors is None else self.max_neighbors),
+                 fingerprint=np.array(fingerprint))
+
+    @classmethod
+    def load(cls, path: str) -> Tuple["SimilarityGraph", str]:
+        """读取 `save` 写出的近邻图，返回 (图, 指纹)。"""
+        with np.load(path) as data:
+            max_neighbors = int(data["max_neighbors"])
+            graph = cls(data["indptr"], data["indices"], data["scores"], float(data["min_threshold"]),
+                        None if max_neighbors < 0 else max_neighbors)
+            return graph, str(data["fingerprint"])
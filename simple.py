@@ -1,8 +1,26 @@
+import argparse
 import json
 import os
-from typing import Set, Any, List, Dict
+import sys
+import time
+from typing import Set, Any, List, Dict, Sequence
 from collections import Counter
 
+from columnar_store import COLUMNAR_DIR_NAME, write_columnar
+from extraction_manifest import ExtractionManifest
+from metrics import MetricsRecorder
+from parallel_extract import chunked, list_json_files, run_parallel, tree_reduce
+from stream_extract import stream_extract
+from term_store import TERM_STORE_FILE_NAME, TermStore
+
+# 超过该大小的文件使用流式提取引擎，避免 json.load 整体载入
+STREAMING_MIN_BYTES = 64 * 1024 * 1024
+# 并行模式下，超过该大小的 JSONL 文件按字节区间拆分给多个进程
+JSONL_SPLIT_BYTES = 64 * 1024 * 1024
+# 支持的输入文件后缀；路径 "-" 表示从标准输入读取 JSONL 记录流
+INPUT_SUFFIXES = ('.json', '.jsonl')
+STDIN_PATH = '-'
+
 def extract_values(data: Any, keys_to_extract: List[str], results: Dict[str, Dict[str, Any]]):
     """
     递归遍历JSON数据，提取所有指定key字段的值。
@@ -31,13 +49,83 @@ def extract_values(data: Any, keys_to_extract: List[str], results: Dict[str, Dic
             extract_values(item, keys_to_extract, results)
 
 
-def process_single_file(file_path: str, keys_to_extract: List[str]) -> Dict[str, Dict[str, Any]]:
+def _unwrap_record(json_data: Any) -> Any:
+    """处理一些常见的嵌套结构 (content / final_structured_response)。"""
+    if isinstance(json_data, dict) and "content" in json_data:
+        json_data = json_data["content"]
+    if isinstance(json_data, dict) and "final_structured_response" in json_data:
+        json_data = json_data["final_structured_response"]
+    return json_data
+
+
+def process_jsonl(file_path: str, keys_to_extract: List[str], start: int = 0, end: int = None) -> Dict[str, Dict[str, Any]]:
+    """
+    逐行处理 JSONL 记录流，每行一条记录，按与单个JSON文件相同的规则提取字段。
+
+    Args:
+        file_path: JSONL文件路径；为 "-" 时读取标准输入。
+        keys_to_extract: 需要提取的key的列表。
+        start: 起始字节偏移。非 0 时从该偏移之后的第一个完整行开始。
+        end: 结束字节偏移。只处理起始位置小于该偏移的行；None 表示读到文件末尾。
+             相邻区间 [a, b)、[b, c) 恰好覆盖每一行一次，可交给不同进程并行处理。
+
+    Returns:
+        与 process_single_file 相同结构的结果字典，其中 "all_values" 为 值->次数 的 Counter。
+    """
+    counters = {key: Counter() for key in keys_to_extract}
+    bad_lines = 0
+
+    def handle(line) -> int:
+        if not line.strip():
+            return 0
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return 1
+        results = {key: {"unique_values": set(), "all_values": []} for key in keys_to_extract}
+        extract_values(_unwrap_record(record), keys_to_extract, results)
+        for key in keys_to_extract:
+            counters[key].update(results[key]["all_values"])
+        return 0
+
+    if file_path == STDIN_PATH:
+        for line in sys.stdin:
+            bad_lines += handle(line)
+    else:
+        with open(file_path, 'rb') as f:
+            if start > 0:
+                # 跳过被区间起点截断的半行（若起点恰好是行首则不跳过）
+                f.seek(start - 1)
+                f.readline()
+            while end is None or f.tell() < end:
+                line = f.readline()
+                if not line:
+                    break
+                bad_lines += handle(line)
+
+    if bad_lines:
+        print(f"警告: {file_path} 中有 {bad_lines} 行无法解析，已跳过")
+    return {key: {"unique_values": set(counters[key]), "all_values": counters[key]} for key in keys_to_extract}
+
+
+def split_jsonl_ranges(file_path: str, split_bytes: int = JSONL_SPLIT_BYTES) -> List[tuple]:
+    """把一个文件划分为若干 (路径, 起点, 终点) 处理单元；小文件或非 JSONL 文件作为一个整体单元。"""
+    size = os.path.getsize(file_path)
+    if not file_path.endswith('.jsonl') or size <= split_bytes:
+        return [(file_path, 0, None)]
+    return [(file_path, start, min(start + split_bytes, size)) for start in range(0, size, split_bytes)]
+
+
+def process_single_file(file_path: str, keys_to_extract: List[str], streaming: bool = None) -> Dict[str, Dict[str, Any]]:
     """
     处理单个JSON文件，提取所有指定key字段的值。
 
     Args:
-        file_path: JSON文件路径。
+        file_path: JSON文件路径。以 .jsonl 结尾或为 "-" 时按 JSONL 记录流逐行处理。
         keys_to_extract: 需要提取的key的列表。
+        streaming: 是否使用流式提取引擎。为 None 时，文件大小超过
+                   STREAMING_MIN_BYTES 才使用流式提取。流式提取时 "all_values"
+                   是一个 值->次数 的 Counter，而不是逐次出现的列表，以保证内存有界。
         
     Returns:
         一个包含唯一值集合和所有值列表的结果字典。
@@ -46,13 +134,17 @@ def process_single_file(file_path: str, keys_to_extract: List[str]) -> Dict[str,
     results = {key: {"unique_values": set(), "all_values": []} for key in keys_to_extract}
     
     try:
+        if file_path == STDIN_PATH or file_path.endswith('.jsonl'):
+            return process_jsonl(file_path, keys_to_extract)
+        if streaming is None:
+            streaming = os.path.getsize(file_path) >= STREAMING_MIN_BYTES
+        if streaming:
+            counters = stream_extract(file_path, keys_to_extract)
+            return {key: {"unique_values": set(counters[key]), "all_values": counters[key]} for key in keys_to_extract}
+
         with open(file_path, 'r', encoding='utf-8') as f:
-            json_data = json.load(f)
             # 尝试处理一些常见的嵌套结构
-            if isinstance(json_data, dict) and "content" in json_data:
-                json_data = json_data["content"]
-            if isinstance(json_data, dict) and "final_structured_response" in json_data:
-                json_data = json_data["final_structured_response"]
+            json_data = _unwrap_record(json.load(f))
         
         # 递归提取字段
         extract_values(json_data, keys_to_extract, results)
@@ -65,13 +157,81 @@ def process_single_file(file_path: str, keys_to_extract: List[str]) -> Dict[str,
     return results
 
 
-def process_directory(directory_path: str, keys_to_extract: List[str]) -> Dict[str, Dict[str, Any]]:
+def _extract_files(task) -> List[tuple]:
     """
-    处理目录中的所有JSON文件，提取并聚合所有指定key字段的值。
+    工作进程入口: 逐个处理一组处理单元，返回每个单元的按key频次统计。
+
+    Args:
+        task: (处理单元列表, 需要提取的key的列表)。处理单元为 (文件路径, 起点, 终点)，
+              终点为 None 表示整个文件。
+
+    Returns:
+        [(文件路径, {key: Counter}, 是否找到任何字段, 解析耗时秒数), ...]
+    """
+    units, keys_to_extract = task
+    per_unit = []
+    for file_path, start, end in units:
+        started = time.perf_counter()
+        if end is None:
+            single_file_results = process_single_file(file_path, keys_to_extract)
+        else:
+            single_file_results = process_jsonl(file_path, keys_to_extract, start, end)
+        counts = {key: Counter(single_file_results[key]["all_values"]) for key in keys_to_extract}
+        found_something = any(single_file_results[key]["unique_values"] for key in keys_to_extract)
+        per_unit.append((file_path, counts, found_something, time.perf_counter() - started))
+    return per_unit
+
+
+def _extract_chunk(task) -> Dict[str, Any]:
+    """
+    工作进程入口: 处理一块处理单元，返回紧凑的按key频次统计。
+
+    Args:
+        task: (处理单元列表, 需要提取的key的列表)。
+
+    Returns:
+        {"counters": {key: Counter}, "file_found": {文件路径: 是否找到任何字段},
+         "file_seconds": [(文件路径, 解析耗时秒数), ...]}
+    """
+    _, keys_to_extract = task
+    counters = {key: Counter() for key in keys_to_extract}
+    file_found = {}
+    file_seconds = []
+    for file_path, counts, found_something, seconds in _extract_files(task):
+        file_found[file_path] = file_found.get(file_path, False) or found_something
+        file_seconds.append((file_path, seconds))
+        if found_something:
+            for key in keys_to_extract:
+                counters[key].update(counts[key])
+    return {"counters": counters, "file_found": file_found, "file_seconds": file_seconds}
+
+
+def _merge_chunk_results(left: Dict[str, Any], right: Dict[str, Any]) -> Dict[str, Any]:
+    """把右侧块的结果合并进左侧块（保持键的首次出现顺序）。"""
+    for key, counter in right["counters"].items():
+        left["counters"][key].update(counter)
+    for file_path, found_something in right["file_found"].items():
+        left["file_found"][file_path] = left["file_found"].get(file_path, False) or found_something
+    left["file_seconds"].extend(right["file_seconds"])
+    return left
+
+
+def process_directory(directory_path: str, keys_to_extract: List[str], workers: int = 1, chunk_size: int = 64,
+                      manifest_path: str = None, use_hash: bool = False,
+                      split_bytes: int = JSONL_SPLIT_BYTES, metrics: MetricsRecorder = None) -> Dict[str, Dict[str, Any]]:
+    """
+    处理目录中的所有JSON/JSONL文件，提取并聚合所有指定key字段的值。
 
     Args:
         directory_path: 包含JSON文件的目录路径。
         keys_to_extract: 需要提取的key的列表。
+        workers: 并行进程数。大于1时文件按块分发到进程池处理，结果与串行处理完全一致。
+        chunk_size: 并行模式下每个任务块包含的处理单元数。
+        split_bytes: 并行模式下，大于该大小的JSONL文件按字节区间拆分为多个处理单元。
+        manifest_path: 增量提取清单路径。提供时只解析新增或修改过的文件，其余文件的
+                       统计结果直接取自清单。
+        use_hash: 是否在清单中记录文件内容哈希，用于识别只有修改时间变化的文件。
+        metrics: 可选的指标记录器，记录每个文件（或 JSONL 区间）的解析耗时。
         
     Returns:
         一个包含唯一值集合和频次统计(Counter)的聚合结果字典。
@@ -80,33 +240,83 @@ def process_directory(directory_path: str, keys_to_extract: List[str]) -> Dict[s
     aggregated_results = {key: {"unique_values": set(), "counter": Counter()} for key in keys_to_extract}
     processed_files = 0
     error_files = []
+    metrics = metrics or MetricsRecorder()
     
     print(f"开始处理目录: {directory_path}")
     
-    # 遍历目录中的所有文件
-    for root, _, files in os.walk(directory_path):
-        for file in files:
-            if file.endswith('.json'):
-                file_path = os.path.join(root, file)
-                print(f"正在处理: {os.path.basename(file_path)}")
-                
-                single_file_results = process_single_file(file_path, keys_to_extract)
-                
-                found_something = False
+    if manifest_path:
+        manifest = ExtractionManifest(manifest_path, keys_to_extract, use_hash=use_hash)
+        file_paths = list_json_files(directory_path, INPUT_SUFFIXES)
+        stale_paths = [path for path in file_paths if not manifest.is_current(path)]
+        removed = manifest.prune(file_paths)
+        print(f"增量模式: {len(stale_paths)} 个新增或修改的文件需要解析，"
+              f"{len(file_paths) - len(stale_paths)} 个文件未变，{removed} 个文件已删除。")
+
+        stale_units = [(path, 0, None) for path in stale_paths]
+        if workers > 1 and stale_units:
+            tasks = [(chunk, keys_to_extract) for chunk in chunked(stale_units, chunk_size)]
+            per_file = [item for chunk_result in run_parallel(tasks, _extract_files, workers, len(stale_units), lambda task: len(task[0])) for item in chunk_result]
+        else:
+            per_file = _extract_files((stale_units, keys_to_extract))
+        for file_path, counts, found_something, seconds in per_file:
+            manifest.update(file_path, counts, found_something)
+            metrics.event('parse_file', seconds, path=file_path)
+        manifest.save()
+
+        # 按目录遍历顺序合并清单中的记录，保证与全量处理的输出一致
+        for file_path in file_paths:
+            if manifest.found(file_path):
+                processed_files += 1
                 for key in keys_to_extract:
-                    if single_file_results[key]["unique_values"]:
-                        found_something = True
-                        # 更新唯一值集合
-                        aggregated_results[key]["unique_values"].update(single_file_results[key]["unique_values"])
-                        # 更新频次统计
-                        aggregated_results[key]["counter"].update(single_file_results[key]["all_values"])
-                
-                if found_something:
-                    processed_files += 1
-                    summary = ", ".join([f"{len(single_file_results[k]['unique_values'])}个{k}" for k in keys_to_extract if single_file_results[k]['unique_values']])
-                    print(f"  - 找到 {summary}")
-                else:
-                    error_files.append(file_path)
+                    counts = manifest.counts(file_path, key)
+                    if counts:
+                        aggregated_results[key]["unique_values"].update(counts)
+                        aggregated_results[key]["counter"].update(counts)
+            else:
+                error_files.append(file_path)
+    elif workers > 1:
+        file_paths = list_json_files(directory_path, INPUT_SUFFIXES)
+        units = [unit for path in file_paths for unit in split_jsonl_ranges(path, split_bytes)]
+        print(f"使用 {workers} 个进程并行处理 {len(file_paths)} 个JSON/JSONL文件 ({len(units)} 个处理单元)...")
+        tasks = [(chunk, keys_to_extract) for chunk in chunked(units, chunk_size)]
+        chunk_results = run_parallel(tasks, _extract_chunk, workers, len(units), lambda task: len(task[0]), unit_label="个处理单元")
+        merged = tree_reduce(chunk_results, _merge_chunk_results)
+        if merged is not None:
+            for file_path, seconds in merged["file_seconds"]:
+                metrics.event('parse_file', seconds, path=file_path)
+            for key in keys_to_extract:
+                aggregated_results[key]["counter"] = merged["counters"][key]
+                aggregated_results[key]["unique_values"] = set(merged["counters"][key])
+            processed_files = sum(1 for found in merged["file_found"].values() if found)
+            error_files = [path for path, found in merged["file_found"].items() if not found]
+    else:
+        # 遍历目录中的所有文件
+        for root, _, files in os.walk(directory_path):
+            for file in files:
+                if file.endswith(INPUT_SUFFIXES):
+                    file_path = os.path.join(root, file)
+                    print(f"正在处理: {os.path.basename(file_path)}")
+                    
+                    started = time.perf_counter()
+                    with metrics.profile('parse_files'):
+                        single_file_results = process_single_file(file_path, keys_to_extract)
+                    metrics.event('parse_file', time.perf_counter() - started, path=file_path)
+                    
+                    found_something = False
+                    for key in keys_to_extract:
+                        if single_file_results[key]["unique_values"]:
+                            found_something = True
+                            # 更新唯一值集合
+                            aggregated_results[key]["unique_values"].update(single_file_results[key]["unique_values"])
+                            # 更新频次统计
+                            aggregated_results[key]["counter"].update(single_file_results[key]["all_values"])
+                    
+                    if found_something:
+                        processed_files += 1
+                        summary = ", ".join([f"{len(single_file_results[k]['unique_values'])}个{k}" for k in keys_to_extract if single_file_results[k]['unique_values']])
+                        print(f"  - 找到 {summary}")
+                    else:
+                        error_files.append(file_path)
     
     print(f"\n处理完成!")
     print(f"成功处理 {processed_files} 个JSON文件")
@@ -119,7 +329,8 @@ def process_directory(directory_path: str, keys_to_extract: List[str]) -> Dict[s
     return aggregated_results
 
 
-def save_results(results: Dict[str, Dict[str, Any]], keys_to_extract: List[str], output_dir: str = "."):
+def save_results(results: Dict[str, Dict[str, Any]], keys_to_extract: List[str], output_dir: str = ".",
+                 formats: Sequence[str] = ("columnar",), term_store_path: str = None, accumulate: bool = False):
     """
     保存提取结果到文件。
 
@@ -127,11 +338,23 @@ def save_results(results: Dict[str, Dict[str, Any]], keys_to_extract: List[str],
         results: 包含唯一值和频次统计的结果字典。
         keys_to_extract: 提取的key的列表。
         output_dir: 输出目录。
+        formats: 输出格式。"columnar" 写出紧凑的列式数据目录 (字符串表 + 按频次降序的
+                 频次数组)，可被 main.py 以内存映射方式直接加载；"npz" 额外写出 numpy
+                 变体；"json" 额外导出兼容旧流程的 indent=2 汇总JSON文件（需显式指定）；
+                 "sqlite" 写入 SQLite 频次库。
+                 唯一值和频次文本文件总会写出。
+        term_store_path: SQLite 频次库路径，默认为输出目录下的 extracted_fields.sqlite。
+        accumulate: 为 True 时在频次库已有的频次上累加，而不是替换。
     """
     # 创建基础JSON输出结构
     json_output = {
         "extraction_summary": {},
     }
+    write_json = "json" in formats
+    columnar_dir = os.path.join(output_dir, COLUMNAR_DIR_NAME)
+    term_store = None
+    if "sqlite" in formats:
+        term_store = TermStore(term_store_path or os.path.join(output_dir, TERM_STORE_FILE_NAME))
 
     print("\n结果将保存到:")
     
@@ -139,23 +362,26 @@ def save_results(results: Dict[str, Dict[str, Any]], keys_to_extract: List[str],
         data = results.get(key, {"unique_values": set(), "counter": Counter()})
         unique_values_list = sorted(list(data["unique_values"]))
         frequency_counter = data["counter"]
+        # 只排序一次，供所有输出格式共用
+        sorted_by_freq = sorted(frequency_counter.items(), key=lambda x: x[1], reverse=True)
+        total_occurrences = sum(frequency_counter.values())
         
-        # 更新JSON总览
-        json_output["extraction_summary"][f"total_unique_{key}"] = len(unique_values_list)
-        json_output["extraction_summary"][f"total_{key}_occurrences"] = sum(frequency_counter.values())
-        
-        # 添加详细数据到JSON
-        json_output[key] = unique_values_list
-        
-        # 添加频次信息到JSON
-        if frequency_counter:
-            sorted_by_freq = sorted(frequency_counter.items(), key=lambda x: x[1], reverse=True)
-            json_output[f"{key}_frequency"] = {
-                "total_occurrences": sum(frequency_counter.values()),
-                "unique_count": len(frequency_counter),
-                "frequency_stats": dict(frequency_counter),
-                "sorted_by_frequency": sorted_by_freq
-            }
+        if write_json:
+            # 更新JSON总览
+            json_output["extraction_summary"][f"total_unique_{key}"] = len(unique_values_list)
+            json_output["extraction_summary"][f"total_{key}_occurrences"] = total_occurrences
+            
+            # 添加详细数据到JSON
+            json_output[key] = unique_values_list
+            
+            # 添加频次信息到JSON
+            if frequency_counter:
+                json_output[f"{key}_frequency"] = {
+                    "total_occurrences": total_occurrences,
+                    "unique_count": len(frequency_counter),
+                    "frequency_stats": dict(frequency_counter),
+                    "sorted_by_frequency": sorted_by_freq
+                }
 
         # 保存唯一值到文本文件
         values_file = os.path.join(output_dir, f"{key}.txt")
@@ -169,16 +395,29 @@ def save_results(results: Dict[str, Dict[str, Any]], keys_to_extract: List[str],
             freq_file = os.path.join(output_dir, f"{key}_frequency.txt")
             with open(freq_file, 'w', encoding='utf-8') as f:
                 f.write(f"{key}\tFrequency\n")
-                sorted_by_freq = sorted(frequency_counter.items(), key=lambda x: x[1], reverse=True)
                 for value, freq in sorted_by_freq:
                     f.write(f"{value}\t{freq}\n")
             print(f"  - {key} 频次文件: {freq_file}")
 
+        # 保存列式数据
+        if "columnar" in formats or "npz" in formats:
+            write_columnar(columnar_dir, key, sorted_by_freq, write_npz="npz" in formats)
+            print(f"  - {key} 列式数据: {columnar_dir}")
+
+        # 写入 SQLite 频次库（单个事务）
+        if term_store is not None:
+            term_store.write_counts(key, sorted_by_freq, accumulate=accumulate)
+            print(f"  - {key} 频次库: {term_store.path}")
+
+    if term_store is not None:
+        term_store.close()
+
     # 保存总的JSON文件
-    json_file = os.path.join(output_dir, "extracted_fields_summary.json")
-    with open(json_file, 'w', encoding='utf-8') as f:
-        json.dump(json_output, f, ensure_ascii=False, indent=2)
-    print(f"\n  - 汇总JSON文件: {json_file}")
+    if write_json:
+        json_file = os.path.join(output_dir, "extracted_fields_summary.json")
+        with open(json_file, 'w', encoding='utf-8') as f:
+            json.dump(json_output, f, ensure_ascii=False, indent=2)
+        print(f"\n  - 汇总JSON文件: {json_file}")
 
 
 def main():
@@ -205,8 +444,8 @@ def main():
     final_results = {key: {"unique_values": set(), "counter": Counter()} for key in keys_to_extract}
 
     if os.path.isfile(input_path):
-        if not input_path.endswith('.json'):
-            print(f"警告: 文件似乎不是JSON格式 - {input_path}")
+        if not input_path.endswith(INPUT_SUFFIXES):
+            print(f"警告: 文件似乎不是JSON/JSONL格式 - {input_path}")
         print("处理单个JSON文件...")
         single_file_results = process_single_file(input_path, keys_to_extract)
         # 转换格式以匹配聚合结果的结构
@@ -215,8 +454,16 @@ def main():
             final_results[key]["counter"] = Counter(single_file_results[key]["all_values"])
             
     elif os.path.isdir(input_path):
+        workers_str = input(f"请输入并行进程数 (默认1，本机共 {os.cpu_count()} 核): ").strip()
+        workers = int(workers_str) if workers_str.isdigit() and int(workers_str) > 0 else 1
+        manifest_path = input("增量提取清单路径 (留空则全量处理): ").strip() or None
+        metrics_path = input("运行指标输出路径 (JSONL，留空则不记录): ").strip() or None
         print("处理文件夹中的所有JSON文件...")
-        final_results = process_directory(input_path, keys_to_extract)
+        metrics = MetricsRecorder(metrics_path, run_info={"script": "simple.py", "input_path": input_path, "keys": keys_to_extract})
+        with metrics.stage('extract') as record:
+            final_results = process_directory(input_path, keys_to_extract, workers=workers, manifest_path=manifest_path, metrics=metrics)
+            record['items'] = sum(sum(final_results[key]["counter"].values()) for key in keys_to_extract)
+        metrics.close()
         
     else:
         print(f"错误: 无法识别的路径类型 - {input_path}")
@@ -252,5 +499,57 @@ def main():
         print("\n没有提取到任何数据，无需保存。")
 
 
+def cli(argv: List[str]):
+    """
+    非交互式命令行入口，便于在脚本和管道中使用。
+
+    示例:
+        python simple.py items/ --keys name,physical_form --workers 8 --output-dir out
+        cat results.jsonl | python simple.py - --keys name --output-dir out
+    """
+    parser = argparse.ArgumentParser(description="从JSON/JSONL文件中提取指定key字段的值并统计频次")
+    parser.add_argument("input_path", help="JSON/JSONL文件、包含它们的文件夹，或 '-' 表示从标准输入读取JSONL")
+    parser.add_argument("--keys", required=True, help="要提取的key，用逗号分隔")
+    parser.add_argument("--workers", type=int, default=1, help="处理文件夹时的并行进程数")
+    parser.add_argument("--manifest", default=None, help="增量提取清单路径")
+    parser.add_argument("--hash", action="store_true", help="在增量提取清单中记录文件内容哈希，只有修改时间变化的文件不会重新解析")
+    parser.add_argument("--output-dir", default=".", help="结果保存目录")
+    parser.add_argument("--formats", default="columnar", help="输出格式，逗号分隔: columnar, npz, json (兼容旧流程的汇总JSON，需显式指定), sqlite")
+    parser.add_argument("--term-store", default=None, help="SQLite 频次库路径（指定时自动写入 sqlite 格式），默认为输出目录下的 extracted_fields.sqlite")
+    parser.add_argument("--accumulate", action="store_true", help="在频次库已有的频次上累加，而不是替换（用于分批提取新文件）")
+    parser.add_argument("--metrics", default=None, help="运行指标 (各阶段耗时/内存、逐文件解析耗时) 的 JSONL 输出路径")
+    parser.add_argument("--profile-dir", default=None, help="为解析循环开启 cProfile 时 .prof 文件的输出目录")
+    args = parser.parse_args(argv)
+
+    keys_to_extract = [key.strip() for key in args.keys.split(',') if key.strip()]
+    metrics = MetricsRecorder(args.metrics, profile_dir=args.profile_dir,
+                              run_info={"script": "simple.py", "input_path": args.input_path, "keys": keys_to_extract, "workers": args.workers})
+    with metrics.stage('extract') as record:
+        if os.path.isdir(args.input_path):
+            final_results = process_directory(args.input_path, keys_to_extract, workers=args.workers, manifest_path=args.manifest,
+                                              use_hash=args.hash, metrics=metrics)
+        elif args.input_path == STDIN_PATH or os.path.isfile(args.input_path):
+            with metrics.profile('parse_files'):
+                single_file_results = process_single_file(args.input_path, keys_to_extract)
+            final_results = {key: {"unique_values": single_file_results[key]["unique_values"],
+                                   "counter": Counter(single_file_results[key]["all_values"])} for key in keys_to_extract}
+        else:
+            print(f"错误: 路径不存在 - {args.input_path}")
+            return
+        record['items'] = sum(sum(final_results[key]["counter"].values()) for key in keys_to_extract)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    with metrics.stage('save', items=sum(len(final_results[key]["counter"]) for key in keys_to_extract)):
+        formats = [fmt.strip() for fmt in args.formats.split(',') if fmt.strip()]
+        if args.term_store and "sqlite" not in formats:
+            formats.append("sqlite")
+        save_results(final_results, keys_to_extract, args.output_dir, formats=formats,
+                     term_store_path=args.term_store, accumulate=args.accumulate)
+    metrics.close()
+
+
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) > 1:
+        cli(sys.argv[1:])
+    else:
+        main()
@@ -1,8 +1,12 @@
 import json
 import os
+import time
 from typing import Set, Any, List, Dict
 from collections import Counter
 
+from metrics import MetricsRecorder
+from parallel_extract import chunked, list_json_files, run_parallel, tree_reduce
+
 
 def extract_name_and_physical_form(data: Any, names: Set[str], physical_forms: Set[str], names_list: List[str] = None, physical_forms_list: List[str] = None):
     """
@@ -77,12 +81,56 @@ def process_single_file(file_path: str) -> tuple[Set[str], Set[str], List[str],
     return names, physical_forms, names_list, physical_forms_list
 
 
-def process_directory(directory_path: str) -> tuple[Set[str], Set[str], Dict[str, int], Dict[str, int]]:
+def _extract_chunk(file_paths: List[str]) -> Dict[str, Any]:
+    """
+    工作进程入口: 处理一块文件，返回name和physical_form的频次统计
+    
+    Args:
+        file_paths: 该块包含的JSON文件路径列表
+        
+    Returns:
+        {"names": Counter, "physical_forms": Counter, "processed_files": int, "error_files": list,
+         "file_seconds": [(文件路径, 解析耗时秒数), ...]}
+    """
+    names_counter = Counter()
+    physical_forms_counter = Counter()
+    processed_files = 0
+    error_files = []
+    file_seconds = []
+    for file_path in file_paths:
+        started = time.perf_counter()
+        names, physical_forms, names_list, physical_forms_list = process_single_file(file_path)
+        file_seconds.append((file_path, time.perf_counter() - started))
+        if names or physical_forms:
+            names_counter.update(names_list)
+            physical_forms_counter.update(physical_forms_list)
+            processed_files += 1
+        else:
+            error_files.append(file_path)
+    return {"names": names_counter, "physical_forms": physical_forms_counter,
+            "processed_files": processed_files, "error_files": error_files, "file_seconds": file_seconds}
+
+
+def _merge_chunk_results(left: Dict[str, Any], right: Dict[str, Any]) -> Dict[str, Any]:
+    """把右侧块的结果合并进左侧块（保持键的首次出现顺序）"""
+    left["names"].update(right["names"])
+    left["physical_forms"].update(right["physical_forms"])
+    left["processed_files"] += right["processed_files"]
+    left["error_files"].extend(right["error_files"])
+    left["file_seconds"].extend(right["file_seconds"])
+    return left
+
+
+def process_directory(directory_path: str, workers: int = 1, chunk_size: int = 64,
+                      metrics: MetricsRecorder = None) -> tuple[Set[str], Set[str], Dict[str, int], Dict[str, int]]:
     """
     处理目录中的所有JSON文件，提取所有name和physical_form字段的值
     
     Args:
         directory_path: 包含JSON文件的目录路径
+        workers: 并行进程数，大于1时文件按块分发到进程池处理，结果与串行处理完全一致
+        chunk_size: 并行模式下每个任务块包含的文件数
+        metrics: 可选的指标记录器，记录每个文件的解析耗时
         
     Returns:
         (names集合, physical_forms集合, names频次字典, physical_forms频次字典)
@@ -93,28 +141,48 @@ def process_directory(directory_path: str) -> tuple[Set[str], Set[str], Dict[str
     physical_forms_counter = Counter()  # 统计physical_form频次
     processed_files = 0
     error_files = []
+    metrics = metrics or MetricsRecorder()
     
     print(f"开始处理目录: {directory_path}")
     
-    # 遍历目录中的所有文件
-    for root, dirs, files in os.walk(directory_path):
-        for file in files:
-            if file.endswith('.json'):
-                file_path = os.path.join(root, file)
-                print(f"正在处理: {os.path.basename(file_path)}")
-                
-                names, physical_forms, names_list, physical_forms_list = process_single_file(file_path)
-                
-                if names or physical_forms:
-                    all_names.update(names)
-                    all_physical_forms.update(physical_forms)
-                    # 更新频次统计
-                    names_counter.update(names_list)
-                    physical_forms_counter.update(physical_forms_list)
-                    processed_files += 1
-                    print(f"  - 找到 {len(names)} 个name, {len(physical_forms)} 个physical_form")
-                else:
-                    error_files.append(file_path)
+    if workers > 1:
+        # 并行处理: 按块分发文件，再树形归并各块的频次统计
+        file_paths = list_json_files(directory_path)
+        print(f"使用 {workers} 个进程并行处理 {len(file_paths)} 个JSON文件...")
+        chunk_results = run_parallel(chunked(file_paths, chunk_size), _extract_chunk, workers, len(file_paths), len)
+        merged = tree_reduce(chunk_results, _merge_chunk_results)
+        if merged is not None:
+            for file_path, seconds in merged["file_seconds"]:
+                metrics.event('parse_file', seconds, path=file_path)
+            names_counter = merged["names"]
+            physical_forms_counter = merged["physical_forms"]
+            all_names = set(names_counter)
+            all_physical_forms = set(physical_forms_counter)
+            processed_files = merged["processed_files"]
+            error_files = merged["error_files"]
+    else:
+        # 遍历目录中的所有文件
+        for root, dirs, files in os.walk(directory_path):
+            for file in files:
+                if file.endswith('.json'):
+                    file_path = os.path.join(root, file)
+                    print(f"正在处理: {os.path.basename(file_path)}")
+                    
+                    started = time.perf_counter()
+                    with metrics.profile('parse_files'):
+                        names, physical_forms, names_list, physical_forms_list = process_single_file(file_path)
+                    metrics.event('parse_file', time.perf_counter() - started, path=file_path)
+                    
+                    if names or physical_forms:
+                        all_names.update(names)
+                        all_physical_forms.update(physical_forms)
+                        # 更新频次统计
+                        names_counter.update(names_list)
+                        physical_forms_counter.update(physical_forms_list)
+                        processed_files += 1
+                        print(f"  - 找到 {len(names)} 个name, {len(physical_forms)} 个physical_form")
+                    else:
+                        error_files.append(file_path)
     
     print(f"\n处理完成!")
     print(f"成功处理 {processed_files} 个JSON文件")
@@ -246,8 +314,15 @@ def main():
         
     elif os.path.isdir(input_path):
         # 处理目录中的所有JSON文件
+        workers_str = input(f"请输入并行进程数 (默认1，本机共 {os.cpu_count()} 核): ").strip()
+        workers = int(workers_str) if workers_str.isdigit() and int(workers_str) > 0 else 1
+        metrics_path = input("运行指标输出路径 (JSONL，留空则不记录): ").strip() or None
         print("处理文件夹中的所有JSON文件...")
-        names, physical_forms, names_frequency, physical_forms_frequency = process_directory(input_path)
+        metrics = MetricsRecorder(metrics_path, run_info={"script": "simple_extract.py", "input_path": input_path, "workers": workers})
+        with metrics.stage('extract') as record:
+            names, physical_forms, names_frequency, physical_forms_frequency = process_directory(input_path, workers=workers, metrics=metrics)
+            record['items'] = sum(names_frequency.values()) + sum(physical_forms_frequency.values())
+        metrics.close()
         
     else:
         print(f"错误: 无法识别的路径类型 - {input_path}")
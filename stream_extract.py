@@ -0,0 +1,219 @@
+"""
+流式、恒定内存的 JSON 字段提取引擎。
+
+`json.load` 需要把整个文档读入内存并构建完整的对象树，对几百 MB 的汇总
+JSON 文件而言峰值内存是文件大小的数倍，而且递归遍历深层嵌套时可能触发
+递归深度限制。本模块按块读取文件并增量分词，使用显式栈跟踪嵌套结构，
+只为 `keys_to_extract` 中的 key 的字符串值计数，内存占用与文件大小无关
+（只与唯一值数量、嵌套深度和最长单个字符串有关）。
+
+提取语义与 `simple.process_single_file` 一致，包括对顶层
+`content` / `final_structured_response` 的解包。为保证内存有界，重复键只对
+提取键和解包键按 `json.load` 的“最后一个值为准”处理，详见 `stream_extract`。
+"""
+import json
+import re
+from collections import Counter
+from json.decoder import scanstring
+from typing import Any, Dict, Iterator, List, TextIO, Tuple
+
+CHUNK_SIZE = 1 << 16
+_SCALAR_LOOKAHEAD = 64
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_SCALAR = re.compile(r'-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][-+]?\d+)?|true|false|null|NaN|-?Infinity')
+
+
+def iter_json_events(stream: TextIO, chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[str, Any]]:
+    """
+    增量解析 JSON 文本流，依次产生事件。
+
+    事件类型: 'start_map', 'end_map', 'start_array', 'end_array',
+    'key'(键名), 'string'(字符串值), 'scalar'(数字/布尔/null 的原始文本)。
+    """
+    buf = ''
+    pos = 0
+    eof = False
+
+    def refill(size: int = chunk_size) -> bool:
+        nonlocal buf, pos, eof
+        if eof:
+            return False
+        data = stream.read(size)
+        if not data:
+            eof = True
+            return False
+        buf = buf[pos:] + data
+        pos = 0
+        return True
+
+    # 栈中每一项是 [容器类型, 是否期待键]
+    stack: List[List] = []
+    started = False
+
+    while True:
+        # 跳过空白
+        while True:
+            pos = _WHITESPACE.match(buf, pos).end()
+            if pos < len(buf) or not refill():
+                break
+        if pos >= len(buf):
+            if stack or not started:
+                raise ValueError("JSON 文档意外结束")
+            return
+
+        ch = buf[pos]
+        if ch == '{':
+            pos += 1
+            started = True
+            stack.append(['map', True])
+            yield 'start_map', None
+        elif ch == '[':
+            pos += 1
+            started = True
+            stack.append(['array', False])
+            yield 'start_array', None
+        elif ch == '}' or ch == ']':
+            pos += 1
+            if not stack:
+                raise ValueError(f"多余的 '{ch}'")
+            kind, _ = stack.pop()
+            if (kind == 'map') != (ch == '}'):
+                raise ValueError(f"括号不匹配: '{ch}'")
+            yield ('end_map' if ch == '}' else 'end_array'), None
+        elif ch == ',':
+            pos += 1
+            if not stack:
+                raise ValueError("顶层出现多余的 ','")
+            if stack[-1][0] == 'map':
+                stack[-1][1] = True
+        elif ch == ':':
+            pos += 1
+        elif ch == '"':
+            size = chunk_size
+            while True:
+                try:
+                    value, end = scanstring(buf, pos + 1)
+                    break
+                except json.JSONDecodeError:
+                    # 字符串可能被块边界截断，读入更多数据后重试。每次重试的读入量加倍，
+                    # 使跨越很多块的长字符串的重复扫描与拷贝总量仍与其长度成线性关系。
+                    if not refill(size):
+                        raise
+                    size *= 2
+            pos = end
+            started = True
+            if stack and stack[-1][0] == 'map' and stack[-1][1]:
+                stack[-1][1] = False
+                yield 'key', value
+            else:
+                yield 'string', value
+        else:
+            # 标量可能被块边界截断，匹配前保证有足够的前瞻字符
+            while len(buf) - pos < _SCALAR_LOOKAHEAD and refill():
+                pass
+            match = _SCALAR.match(buf, pos)
+            if not match:
+                raise ValueError(f"无法解析的 JSON 内容: {buf[pos:pos + 20]!r}")
+            pos = match.end()
+            started = True
+            yield 'scalar', match.group(0)
+
+
+# 影响解包结果的键，与 `simple._unwrap_record` 一致
+UNWRAP_KEYS = ('content', 'final_structured_response')
+
+
+def stream_extract(file_path: str, keys_to_extract: List[str], chunk_size: int = CHUNK_SIZE) -> Dict[str, Counter]:
+    """
+    流式提取单个 JSON 文件中指定 key 的字符串值并计数。
+
+    为了在不回溯的情况下实现 `content` / `final_structured_response` 解包，
+    同时维护四组计数: 整个文档、顶层 content 值内部、content 中
+    final_structured_response 值内部、顶层 final_structured_response 值内部；
+    文件读完后按文档的实际结构选择其一。
+
+    重复键: 每个未结束的对象只记录 `keys_to_extract` 和 `UNWRAP_KEYS` 中已出现的键，
+    内存不随对象的键数量增长。这些键重复时与 `json.load` 一样以最后一个值为准:
+    提取键撤销前一个字符串值的计数，解包键清空对应范围的计数。其它键重复时，
+    以及被覆盖的提取键的值是对象或数组时，前一个值内部的计数会被保留；
+    被撤销后重新出现的值在 Counter 中的顺序也可能与 `json.load` 不同。
+
+    Returns:
+        {key: Counter}，Counter 的插入顺序即各值在所选范围内首次出现的顺序。
+    """
+    keys = set(keys_to_extract)
+    tracked = keys.union(UNWRAP_KEYS)
+    scopes = [{key: Counter() for key in keys_to_extract} for _ in range(4)]
+    root_is_map = has_content = content_is_map = content_has_fsr = has_fsr = False
+
+    def scope_indexes(depth: int) -> List[int]:
+        """当前对象中的值所属的计数范围。"""
+        in_content = depth >= 2 and stack[0][1] == 'content'
+        in_fsr = in_content and depth >= 3 and stack[1][0] == 'map' and stack[1][1] == 'final_structured_response'
+        in_root_fsr = depth >= 2 and stack[0][1] == 'final_structured_response'
+        return [0] + [i for i, inside in ((1, in_content), (2, in_fsr), (3, in_root_fsr)) if inside]
+
+    # 栈中每一项是 [容器类型, 当前键, {已出现的提取键/解包键: 该键的字符串值}]
+    stack: List[List] = []
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for event, value in iter_json_events(f, chunk_size):
+            depth = len(stack)
+            if event == 'key':
+                seen = stack[-1][2]
+                stack[-1][1] = value
+                if value not in tracked:
+                    continue
+                if value in seen:
+                    # 重复键以最后一个值为准
+                    previous = seen[value]
+                    if previous is not None and value in keys:
+                        for i in scope_indexes(depth):
+                            counter = scopes[i][value]
+                            counter[previous] -= 1
+                            if counter[previous] <= 0:
+                                del counter[previous]
+                    if depth == 1 and value == 'content':
+                        for i in (1, 2):
+                            for counter in scopes[i].values():
+                                counter.clear()
+                        content_is_map = content_has_fsr = False
+                    elif depth == 1 and value == 'final_structured_response':
+                        for counter in scopes[3].values():
+                            counter.clear()
+                    elif depth == 2 and value == 'final_structured_response' and stack[0][1] == 'content':
+                        for counter in scopes[2].values():
+                            counter.clear()
+                seen[value] = None
+                if depth == 1 and value == 'content':
+                    has_content = True
+                elif depth == 1 and value == 'final_structured_response':
+                    has_fsr = True
+                elif depth == 2 and value == 'final_structured_response' and stack[0][1] == 'content':
+                    content_has_fsr = True
+                continue
+
+            if event in ('end_map', 'end_array'):
+                stack.pop()
+                continue
+
+            if depth >= 1 and stack[-1][0] == 'map':
+                current_key = stack[-1][1]
+                if event == 'string' and current_key in keys and value.strip():
+                    stripped_value = value.strip()
+                    for i in scope_indexes(depth):
+                        scopes[i][current_key][stripped_value] += 1
+                    stack[-1][2][current_key] = stripped_value
+
+            if event in ('start_map', 'start_array'):
+                kind = 'map' if event == 'start_map' else 'array'
+                if depth == 0:
+                    root_is_map = kind == 'map'
+                elif depth == 1 and stack[0][1] == 'content':
+                    content_is_map = kind == 'map'
+                stack.append([kind, None, {}])
+
+    if root_is_map and has_content:
+        return scopes[2] if content_is_map and content_has_fsr else scopes[1]
+    if root_is_map and has_fsr:
+        return scopes[3]
+    return scopes[0]
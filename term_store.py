@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+"""
+提取脚本与分析器共享的 SQLite 属性频次库。
+
+表 `fields` 为每个字段 (key) 分配一个整数 ID，字段名可以是任意 JSON 键（包括 `-`、
+空格或只有大小写不同的键）。每个字段对应三张以 ID 命名的表:
+- `terms_<id>`: 属性 -> 频次，按频次建索引；
+- `clusters_<id>`: 分析器最近一次写回的簇（簇总频次、成员数、上一级簇、代表属性）；
+- `assignments_<id>`: 属性 -> 所属簇 ID，按簇 ID 建索引。
+`fields` 还记录每个字段的条目数、总频次和版本号（每次写入频次时加一），分析器用它
+作为检查点的输入指纹，因此写回簇归属不会使检查点失效。
+
+只读取的一方（分析器加载频次、命令行查询）以只读方式打开已有的库，路径不存在时
+抛出 FileNotFoundError，而不会悄悄创建一个空库。
+
+提取脚本在一个事务内批量写入频次（整体替换，或在已有频次上累加）；分析器读取时
+把频次下限和前 N 个的截断交给 SQL 完成，并在写出结果后把簇归属写回，之后可以直接
+查询“哪些簇包含 X”，而不必加载整个结果文件。只依赖标准库。
+
+命令行用法:
+
+    python term_store.py extracted_fields.sqlite fields
+    python term_store.py extracted_fields.sqlite top name --min-count 10 --limit 20
+    python term_store.py extracted_fields.sqlite find name ZnO
+    python term_store.py extracted_fields.sqlite members name 12
+    python term_store.py extracted_fields.sqlite import extracted_fields.json
+"""
+import argparse
+import json
+import os
+import sqlite3
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.request import pathname2url
+
+TERM_STORE_FILE_NAME = "extracted_fields.sqlite"
+TERM_STORE_SUFFIXES = ('.sqlite', '.sqlite3', '.db')
+# executemany 每批写入的行数（整个写入仍在同一个事务内）
+WRITE_BATCH = 10_000
+
+
+def is_term_store(path: str) -> bool:
+    """路径是否指向 SQLite 频次库（按扩展名判断）。"""
+    return bool(path) and not os.path.isdir(path) and path.endswith(TERM_STORE_SUFFIXES)
+
+
+def _batches(items: Iterable[Any], size: int = WRITE_BATCH) -> Iterable[List[Any]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class TermStore:
+    """
+    SQLite 属性频次库。
+
+    Args:
+        path: 数据库文件路径。
+        readonly: 为 True 时以只读方式打开已有的库，路径不存在时抛出 FileNotFoundError；
+                  为 False 时不存在则创建。
+    """
+
+    def __init__(self, path: str, readonly: bool = False):
+        self.path = path
+        if readonly:
+            if not os.path.isfile(path):
+                raise FileNotFoundError(f"频次库 '{path}' 不存在")
+            self._conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(path))}?mode=ro", uri=True)
+            return
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS fields (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, "
+                "version INTEGER NOT NULL DEFAULT 0, unique_count INTEGER NOT NULL DEFAULT 0, "
+                "total_occurrences INTEGER NOT NULL DEFAULT 0, updated_at REAL, assigned_at REAL)"
+            )
+            self._conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('store_id', ?)", (uuid.uuid4().hex,))
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self) -> "TermStore":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _field_id(self, field: str) -> Optional[int]:
+        row = self._conn.execute("SELECT id FROM fields WHERE name = ?", (field,)).fetchone()
+        return row[0] if row else None
+
+    def _ensure_field(self, field: str) -> int:
+        """返回字段 ID，必要时登记字段并创建它的三张表及索引（在调用方的事务内执行）。"""
+        self._conn.execute("INSERT OR IGNORE INTO fields (name) VALUES (?)", (field,))
+        field_id = self._field_id(field)
+        self._conn.execute(f'CREATE TABLE IF NOT EXISTS terms_{field_id} (term TEXT PRIMARY KEY, count INTEGER NOT NULL)')
+        self._conn.execute(f'CREATE INDEX IF NOT EXISTS terms_{field_id}_count ON terms_{field_id} (count DESC)')
+        self._conn.execute(
+            f'CREATE TABLE IF NOT EXISTS clusters_{field_id} (cluster_id TEXT PRIMARY KEY, position INTEGER NOT NULL, '
+            f'cluster_total_frequency INTEGER NOT NULL, member_count INTEGER NOT NULL, parent_cluster_id TEXT, '
+            f'representative TEXT)'
+        )
+        self._conn.execute(
+            f'CREATE TABLE IF NOT EXISTS assignments_{field_id} (term TEXT PRIMARY KEY, cluster_id TEXT NOT NULL, '
+            f'count INTEGER NOT NULL)'
+        )
+        self._conn.execute(f'CREATE INDEX IF NOT EXISTS assignments_{field_id}_cluster ON assignments_{field_id} (cluster_id)')
+        return field_id
+
+    def _require_field(self, field: str) -> int:
+        field_id = self._field_id(field)
+        if field_id is None:
+            raise ValueError(f"频次库 '{self.path}' 中未找到字段 '{field}'")
+        return field_id
+
+    # ------------------------------------------------------------------ 写入频次
+
+    def write_counts(self, field: str, items: Iterable[Tuple[str, int]], accumulate: bool = False) -> int:
+        """
+        在一个事务内批量写入一个字段的频次。
+
+        Args:
+            items: (属性, 频次) 序列。整体替换时应按频次降序给出，读取时频次相同的属性保持写入顺序。
+            accumulate: False 时用 items 替换该字段的全部频次；True 时在已有频次上累加
+                        （新属性追加在末尾），用于分批提取新文件。
+
+        Returns:
+            写入的行数。
+        """
+        written = 0
+        with self._conn:
+            field_id = self._ensure_field(field)
+            if accumulate:
+                sql = (f'INSERT INTO terms_{field_id} (term, count) VALUES (?, ?) '
+                       f'ON CONFLICT(term) DO UPDATE SET count = count + excluded.count')
+            else:
+                self._conn.execute(f'DELETE FROM terms_{field_id}')
+                sql = f'INSERT INTO terms_{field_id} (term, count) VALUES (?, ?)'
+            for batch in _batches(items):
+                self._conn.executemany(sql, batch)
+                written += len(batch)
+            unique_count, total = self._conn.execute(f'SELECT COUNT(*), COALESCE(SUM(count), 0) FROM terms_{field_id}').fetchone()
+            self._conn.execute(
+                "UPDATE fields SET version = version + 1, unique_count = ?, total_occurrences = ?, updated_at = ? WHERE id = ?",
+                (unique_count, total, time.time(), field_id)
+            )
+        return written
+
+    # ------------------------------------------------------------------ 读取频次
+
+    def fields(self) -> Dict[str, Dict[str, Any]]:
+        """字段名 -> {version, unique_count, total_occurrences, updated_at, assigned_at}。"""
+        rows = self._conn.execute(
+            "SELECT name, version, unique_count, total_occurrences, updated_at, assigned_at FROM fields ORDER BY name"
+        ).fetchall()
+        return {name: {"version": version, "unique_count": unique_count, "total_occurrences": total,
+                       "updated_at": updated_at, "assigned_at": assigned_at}
+                for name, version, unique_count, total, updated_at, assigned_at in rows}
+
+    def fingerprint(self, field: str) -> str:
+        """字段频次的指纹（库 ID + 字段版本号）；只随频次写入变化，写回簇归属不影响它。"""
+        store_id = self._conn.execute("SELECT value FROM meta WHERE key = 'store_id'").fetchone()[0]
+        info = self.fields().get(field)
+        return f"{store_id}:{field}:{info['version']}" if info else ""
+
+    def top_terms(self, field: str, min_count: Optional[int] = None, limit: Optional[int] = None) -> List[Tuple[str, int]]:
+        """
+        按频次降序返回 (属性, 频次)，频次相同的按写入顺序。频次下限和前 N 个的截断在 SQL 中完成。
+        """
+        field_id = self._require_field(field)
+        return self._conn.execute(
+            f'SELECT term, count FROM terms_{field_id} WHERE count >= ? ORDER BY count DESC, rowid LIMIT ?',
+            (min_count if min_count is not None else -(1 << 63), limit if limit is not None else -1)
+        ).fetchall()
+
+    def term_count(self, field: str, term: str) -> int:
+        """一个属性的频次（不存在时为 0）。"""
+        field_id = self._require_field(field)
+        row = self._conn.execute(f'SELECT count FROM terms_{field_id} WHERE term = ?', (term,)).fetchone()
+        return row[0] if row else 0
+
+    # ------------------------------------------------------------------ 簇归属
+
+    def write_assignments(self, field: str, result) -> int:
+        """
+        用一次聚类结果（`cluster_result.ClusterResult`）替换该字段的簇与簇归属。
+        每个簇的代表属性为其中频次最高的属性（频次相同时取靠前的）。
+
+        Returns:
+            写入的簇归属行数。
+        """
+        clusters: Dict[str, list] = {}
+        assignments: List[Tuple[str, str, int]] = []
+        for row in result.iter_rows():
+            cluster_id, total, member_count, term, count = row[:5]
+            parent_id = row[5] if result.parent_ids is not None else None
+            cluster = clusters.get(cluster_id)
+            if cluster is None:
+                clusters[cluster_id] = [cluster_id, len(clusters), int(total), int(member_count), parent_id or None, term, count]
+            elif count > cluster[6]:
+                cluster[5], cluster[6] = term, count
+            assignments.append((term, cluster_id, int(count)))
+
+        with self._conn:
+            field_id = self._ensure_field(field)
+            self._conn.execute(f'DELETE FROM clusters_{field_id}')
+            self._conn.execute(f'DELETE FROM assignments_{field_id}')
+            self._conn.executemany(
+                f'INSERT INTO clusters_{field_id} (cluster_id, position, cluster_total_frequency, member_count, '
+                f'parent_cluster_id, representative) VALUES (?, ?, ?, ?, ?, ?)',
+                [cluster[:6] for cluster in clusters.values()]
+            )
+            for batch in _batches(assignments):
+                # 同一属性出现在多个簇中时保留第一次出现
+                self._conn.executemany(f'INSERT OR IGNORE INTO assignments_{field_id} (term, cluster_id, count) VALUES (?, ?, ?)', batch)
+            self._conn.execute("UPDATE fields SET assigned_at = ? WHERE id = ?", (time.time(), field_id))
+        return len(assignments)
+
+    def clusters_containing(self, field: str, text: str, exact: bool = False) -> List[Dict[str, Any]]:
+        """
+        包含某个属性的簇。exact 为 False 时按子串匹配（ASCII 字母不区分大小写），
+        结果按簇在输出中的顺序、簇内按频次降序排列。
+        """
+        field_id = self._require_field(field)
+        if exact:
+            condition, parameter = "a.term = ?", text
+        else:
+            escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            condition, parameter = "a.term LIKE ? ESCAPE '\\'", f"%{escaped}%"
+        rows = self._conn.execute(
+            f'SELECT a.term, a.count, c.cluster_id, c.cluster_total_frequency, c.member_count, c.parent_cluster_id, '
+            f'c.representative FROM assignments_{field_id} a JOIN clusters_{field_id} c ON a.cluster_id = c.cluster_id '
+            f'WHERE {condition} ORDER BY c.position, a.count DESC',
+            (parameter,)
+        ).fetchall()
+        keys = ("term", "count", "cluster_id", "cluster_total_frequency", "member_count", "parent_cluster_id", "representative")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def cluster_members(self, field: str, cluster_id: str) -> List[Tuple[str, int]]:
+        """一个簇的全部 (属性, 频次)，按频次降序。"""
+        field_id = self._require_field(field)
+        return self._conn.execute(
+            f'SELECT term, count FROM assignments_{field_id} WHERE cluster_id = ? ORDER BY count DESC, rowid',
+            (str(cluster_id),)
+        ).fetchall()
+
+
+def import_summary_json(store: TermStore, json_path: str) -> Dict[str, int]:
+    """把 simple.py 写出的汇总 JSON 中各字段的 `sorted_by_frequency` 导入频次库，返回每个字段的条目数。"""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    imported = {}
+    for name, value in data.items():
+        if name.endswith('_frequency') and isinstance(value, dict) and 'sorted_by_frequency' in value:
+            field = name[:-len('_frequency')]
+            imported[field] = store.write_counts(field, ((term, count) for term, count in value['sorted_by_frequency']))
+    return imported
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="查询和维护 SQLite 属性频次库")
+    parser.add_argument("store", help="频次库路径")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("fields", help="列出字段及其条目数")
+    top = commands.add_parser("top", help="按频次降序列出属性")
+    top.add_argument("field")
+    top.add_argument("--min-count", type=int, default=None)
+    top.add_argument("--limit", type=int, default=20)
+    find = commands.add_parser("find", help="列出包含某个属性（子串）的簇")
+    find.add_argument("field")
+    find.add_argument("text")
+    find.add_argument("--exact", action="store_true", help="只匹配完全相同的属性")
+    members = commands.add_parser("members", help="列出一个簇的全部属性")
+    members.add_argument("field")
+    members.add_argument("cluster_id")
+    importer = commands.add_parser("import", help="导入 simple.py 写出的汇总 JSON")
+    importer.add_argument("json_path")
+    args = parser.parse_args(argv)
+
+    try:
+        store = TermStore(args.store, readonly=args.command != "import")
+    except FileNotFoundError as e:
+        parser.error(str(e))
+    with store:
+        if args.command == "fields":
+            for name, info in store.fields().items():
+                print(f"{name}\t{info['unique_count']} 个唯一值\t总频次 {info['total_occurrences']}\t版本 {info['version']}")
+        elif args.command == "top":
+            for term, count in store.top_terms(args.field, min_count=args.min_count, limit=args.limit):
+                print(f"{term}\t{count}")
+        elif args.command == "find":
+            for row in store.clusters_containing(args.field, args.text, exact=args.exact):
+                print(f"{row['cluster_id']}\t{row['term']}\t{row['count']}\t代表: {row['representative']}\t"
+                      f"簇总频次 {row['cluster_total_frequency']}")
+        elif args.command == "members":
+            for term, count in store.cluster_members(args.field, args.cluster_id):
+                print(f"{term}\t{count}")
+        elif args.command == "import":
+            for field, count in import_summary_json(store, args.json_path).items():
+                print(f"  - {field}: 已导入 {count} 个属性")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+"""测试共用的设置: 仓库根目录的模块以顶层模块方式导入。"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
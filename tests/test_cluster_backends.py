@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""聚类后端与 `sentence_transformers.util.community_detection` 的一致性。"""
+import numpy as np
+import pytest
+
+from cluster_backends import (block_diagonal_communities, blocked_community_detection, finalize_communities,
+                              normalize_embeddings)
+
+torch = pytest.importorskip("torch")
+util = pytest.importorskip("sentence_transformers.util")
+
+
+def blobs(n_groups, group_size, dim=32, spread=0.35, seed=0):
+    """若干簇中心附近的单位向量，组内余弦相似度高、组间低。"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_groups, dim))
+    points = np.repeat(centers, group_size, axis=0) + spread * rng.normal(size=(n_groups * group_size, dim))
+    return normalize_embeddings(points[rng.permutation(len(points))])
+
+
+def reference(embeddings, threshold, min_community_size):
+    return util.community_detection(torch.from_numpy(embeddings), threshold=threshold,
+                                    min_community_size=min_community_size)
+
+
+@pytest.mark.parametrize("threshold,min_size", [(0.9, 2), (0.8, 3), (0.95, 1)])
+def test_blocked_matches_community_detection(threshold, min_size):
+    embeddings = blobs(12, 15)
+    expected = reference(embeddings, threshold, min_size)
+    # 很小的内存预算迫使按行分块
+    assert blocked_community_detection(embeddings, threshold, min_size, memory_budget_mb=0.05) == expected
+
+
+def test_finalize_communities_removes_overlaps_like_community_detection():
+    extracted = [[0, 1, 2], [2, 3], [4, 5, 6, 7], [1, 8], [9]]
+    assert finalize_communities(extracted, 2) == [[4, 5, 6, 7], [0, 1, 2]]
+
+
+@pytest.mark.parametrize("budget", [256, 0.01])
+def test_block_diagonal_matches_per_group_detection(budget):
+    sizes = [1, 3, 7, 20, 45, 2, 60]
+    groups = [blobs(3, size, seed=i)[:size] for i, size in enumerate(sizes)]
+    embeddings = np.concatenate(groups)
+    results = block_diagonal_communities(embeddings, sizes, 0.9, memory_budget_mb=budget)
+    assert len(results) == len(sizes)
+    for group, communities in zip(groups, results):
+        assert communities == reference(group, 0.9, 1)
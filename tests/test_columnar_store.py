@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""列式提取结果的写出与读回。"""
+import json
+import os
+from collections import Counter
+
+import numpy as np
+
+from columnar_store import COLUMNAR_DIR_NAME, ColumnarField, write_columnar
+from simple import save_results
+
+ITEMS = [("Thickness", 120), ("带隙", 7), ("", 3), ("emoji 🧪", 2), ("a,b \"quoted\"", 1)]
+
+
+def test_round_trip(tmp_path):
+    directory = write_columnar(str(tmp_path / "col"), "name", ITEMS, write_npz=True)
+    field = ColumnarField(directory, "name")
+    assert len(field) == len(ITEMS)
+    assert field.terms() == [value for value, _ in ITEMS]
+    assert field.term(1) == "带隙"
+    assert field.counts.tolist() == [count for _, count in ITEMS]
+    assert list(field.to_dict().items()) == ITEMS
+
+    with np.load(os.path.join(directory, "name.npz")) as npz:
+        assert npz["counts"].tolist() == [count for _, count in ITEMS]
+        assert npz["strings"].tobytes().decode("utf-8") == "".join(value for value, _ in ITEMS)
+
+
+def test_several_fields_and_empty_field(tmp_path):
+    directory = str(tmp_path / "col")
+    write_columnar(directory, "name", ITEMS)
+    write_columnar(directory, "empty", [])
+    with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    assert meta["fields"]["name"] == {"unique_count": len(ITEMS), "total_occurrences": sum(c for _, c in ITEMS)}
+    assert len(ColumnarField(directory, "empty")) == 0
+    assert ColumnarField(directory, "name").terms() == [value for value, _ in ITEMS]
+
+
+def test_save_results_writes_only_columnar_by_default(tmp_path):
+    results = {"name": {"unique_values": {"b", "a"}, "counter": Counter({"a": 3, "b": 5})}}
+    save_results(results, ["name"], str(tmp_path))
+    assert not os.path.exists(tmp_path / "extracted_fields_summary.json")
+    field = ColumnarField(str(tmp_path / COLUMNAR_DIR_NAME), "name")
+    assert field.to_dict() == {"b": 5, "a": 3}
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""持久化嵌入缓存的读写与 LRU 淘汰。"""
+import numpy as np
+import pytest
+
+from embedding_cache import EmbeddingCache
+
+
+class CountingEncoder:
+    """确定性的编码函数，记录每次被要求编码的属性。"""
+
+    def __init__(self, dim=8):
+        self.dim = dim
+        self.calls = []
+
+    def __call__(self, terms):
+        self.calls.append(list(terms))
+        return np.stack([np.random.default_rng(sum(map(ord, term))).normal(size=self.dim) for term in terms]).astype(np.float32)
+
+
+def open_cache(tmp_path, max_entries=100):
+    return EmbeddingCache(str(tmp_path), "test-model", max_entries=max_entries)
+
+
+def test_round_trip_across_instances(tmp_path):
+    encoder = CountingEncoder()
+    first = open_cache(tmp_path).get_or_encode(["a", "b", "c"], encoder)
+    second = open_cache(tmp_path).get_or_encode(["c", "a", "b"], encoder)
+    assert encoder.calls == [["a", "b", "c"]]
+    np.testing.assert_array_equal(second, first[[2, 0, 1]])
+
+
+def test_only_missing_terms_are_encoded(tmp_path):
+    encoder = CountingEncoder()
+    open_cache(tmp_path).get_or_encode(["a", "b"], encoder)
+    result = open_cache(tmp_path).get_or_encode(["b", "d", "d"], encoder)
+    assert encoder.calls[-1] == ["d"]
+    np.testing.assert_array_equal(result[1], result[2])
+
+
+def test_models_do_not_share_entries(tmp_path):
+    encoder = CountingEncoder()
+    EmbeddingCache(str(tmp_path), "model-a").get_or_encode(["a"], encoder)
+    EmbeddingCache(str(tmp_path), "model-b").get_or_encode(["a"], encoder)
+    assert encoder.calls == [["a"], ["a"]]
+
+
+def test_eviction_is_least_recently_used_across_runs(tmp_path):
+    encoder = CountingEncoder()
+    open_cache(tmp_path, max_entries=3).get_or_encode(["a", "b", "c"], encoder)
+    # 全部命中的调用也要持久化使用时钟
+    open_cache(tmp_path, max_entries=3).get_or_encode(["a"], encoder)
+    open_cache(tmp_path, max_entries=3).get_or_encode(["d"], encoder)
+    cache = open_cache(tmp_path, max_entries=3)
+    assert sorted(cache.rows) == ["a", "c", "d"]
+    assert len(cache) == 3
+
+
+def test_terms_in_use_are_not_evicted(tmp_path):
+    encoder = CountingEncoder()
+    cache = open_cache(tmp_path, max_entries=2)
+    cache.get_or_encode(["a", "b"], encoder)
+    result = cache.get_or_encode(["a", "b", "c"], encoder)
+    assert result.shape == (3, encoder.dim)
+    assert "c" not in cache
+
+
+def test_rejects_non_positive_capacity(tmp_path):
+    with pytest.raises(ValueError):
+        open_cache(tmp_path, max_entries=0)
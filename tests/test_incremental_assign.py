@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""增量分配模式: 已有簇 ID 保持不变。"""
+import csv
+import json
+import os
+
+import pytest
+
+from benchmark import FakeEncoder
+from incremental_assign import load_cluster_csv
+from main import PropertyClusterAnalyzer
+
+pytest.importorskip("sentence_transformers")  # 默认的 dense 后端
+
+FAMILIES = [
+    ["Band gap", "Band gap energy", "Optical band gap", "Band-gap", "band gap value"],
+    ["Thickness", "Film thickness", "Layer thickness", "Thickness of film"],
+    ["Carrier concentration", "Carrier density", "Electron concentration"],
+    ["Lattice constant", "Lattice parameter", "Lattice constant a"],
+    ["Surface roughness", "RMS roughness", "Roughness"],
+]
+
+
+def write_input(path, terms_with_counts):
+    ordered = sorted(terms_with_counts, key=lambda item: -item[1])
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"names_frequency": {"sorted_by_frequency": ordered}}, f)
+
+
+def read_rows(path):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return {row['property']: row for row in csv.DictReader(f)}
+
+
+def analyzer(tmp_path, input_path, output_path, **overrides):
+    config = {
+        "input_json_path": str(input_path),
+        "output_csv_path": str(output_path),
+        "field_to_analyze": "names_frequency",
+        "sbert_model": "fake",
+        "primary_cluster_threshold": 0.6,
+        "secondary_cluster_threshold": 0.6,
+        "min_community_size": 2,
+        "file_count_for_threshold": 100,
+        "frequency_threshold_percent": 0.05,
+        "write_centroid_index": True,
+        **overrides,
+    }
+    return PropertyClusterAnalyzer(config, model=FakeEncoder(dimension=64))
+
+
+@pytest.fixture
+def previous_run(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    terms = [(term, 100 - 10 * f - i) for f, family in enumerate(FAMILIES) for i, term in enumerate(family)]
+    terms += [("Unrelated rare property", 1), ("Another rare one", 2)]
+    write_input(tmp_path / "old.json", terms)
+    analyzer(tmp_path, tmp_path / "old.json", tmp_path / "old.csv").run()
+    return terms
+
+
+def test_assign_keeps_cluster_ids_stable(tmp_path, previous_run):
+    new_terms = [(term, count + 5) for term, count in previous_run if term != "Another rare one"]
+    new_terms += [("Optical band gap energy", 40), ("Zzqx unseen property", 30), ("Zzqx rare", 1)]
+    write_input(tmp_path / "new.json", new_terms)
+    analyzer(tmp_path, tmp_path / "new.json", tmp_path / "new.csv",
+             mode="assign", assign_previous_csv_path=str(tmp_path / "old.csv")).run_assign()
+
+    old, new = read_rows(tmp_path / "old.csv"), read_rows(tmp_path / "new.csv")
+    for term, row in old.items():
+        if row['cluster_id'] != 'Others':
+            assert new[term]['cluster_id'] == row['cluster_id']
+            assert int(new[term]['count']) == int(row['count']) + 5
+    # 相近的新属性并入已有簇，不相近的按频率阈值成为新簇或归入 'Others'
+    assert new["Optical band gap energy"]['cluster_id'] == old["Optical band gap"]['cluster_id']
+    assert new["Zzqx unseen property"]['cluster_id'] not in {row['cluster_id'] for row in old.values()}
+    assert new["Zzqx rare"]['cluster_id'] == "Others"
+    # 新输入中已不存在的 'Others' 属性被移除
+    assert "Another rare one" not in new
+    assert os.path.exists(str(tmp_path / "new.csv") + ".centroids.npz")
+
+
+def test_assign_zeroes_absent_members_and_keeps_parent_column(tmp_path, previous_run):
+    with open(tmp_path / "old.csv", 'r', encoding='utf-8', newline='') as f:
+        rows = list(csv.reader(f))
+    with open(tmp_path / "old.csv", 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(rows[0] + ["parent_cluster_id"])
+        writer.writerows(row + ["P1" if row[0] != "Others" else ""] for row in rows[1:])
+
+    clusters, _, parents = load_cluster_csv(str(tmp_path / "old.csv"))
+    dropped = next(iter(clusters.values()))[0][0]
+    new_terms = [(term, count) for term, count in previous_run if term != dropped]
+    write_input(tmp_path / "new.json", new_terms)
+    analyzer(tmp_path, tmp_path / "new.json", tmp_path / "new.csv",
+             mode="assign", assign_previous_csv_path=str(tmp_path / "old.csv")).run_assign()
+
+    new = read_rows(tmp_path / "new.csv")
+    assert new[dropped]['count'] == '0'
+    assert all(row['parent_cluster_id'] == parents[row['cluster_id']] for row in new.values())
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""MinHash/LSH 候选对的召回率。"""
+import itertools
+import random
+
+import numpy as np
+
+from minhash_lsh import candidate_pairs, char_ngrams, lexical_communities
+
+ELEMENTS = ["Ti", "Zn", "Ga", "Cu", "Fe", "Ni", "Co", "Mn", "Al", "Si", "In", "Sn"]
+
+
+def material_names(n_bases=40, variants=5, seed=0):
+    """若干随机化学式及其加了不同后缀的写法。"""
+    rng = random.Random(seed)
+    names = []
+    for _ in range(n_bases):
+        base = "".join(f"{rng.choice(ELEMENTS)}{rng.randint(1, 4)}" for _ in range(3)) + "O4"
+        names.append(base)
+        for suffix in [" film", " thin film", " nanoparticles", "-doped", " (annealed)", " powder"][:variants - 1]:
+            names.append(base + suffix)
+    return names
+
+
+def jaccard(a, b):
+    a, b = set(char_ngrams(a)), set(char_ngrams(b))
+    return len(a & b) / len(a | b)
+
+
+def test_candidate_pairs_recall_above_threshold():
+    names = material_names()
+    threshold = 0.5
+    first, second, signatures = candidate_pairs(names, threshold)
+    assert signatures.shape == (len(names), 128)
+    assert np.all(first < second)
+    found = set(zip(first.tolist(), second.tolist()))
+    assert len(found) == len(first)
+
+    similar = [(i, j) for i, j in itertools.combinations(range(len(names)), 2)
+               if jaccard(names[i], names[j]) >= threshold + 0.1]
+    assert similar
+    recall = sum(pair in found for pair in similar) / len(similar)
+    assert recall >= 0.95
+    # 候选对只占全部属性对的一小部分
+    assert len(found) < 0.2 * len(names) * (len(names) - 1) / 2
+
+
+def test_lexical_communities_group_variants():
+    bases = ["Titanium dioxide", "Zinc oxide", "Gallium nitride", "Copper sulfide", "Perovskite"]
+    names = [name for base in bases for name in (base, base + " film", base.lower() + " films")]
+    communities = lexical_communities(names, 0.5, min_community_size=2)
+    assert sorted(sorted(names[i] for i in community) for community in communities) == \
+        sorted(sorted(names[3 * b:3 * b + 3]) for b in range(len(bases)))
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""低精度嵌入的相似度与重打分。"""
+import numpy as np
+import pytest
+
+from cluster_backends import blocked_community_detection, normalize_embeddings
+from quantization import DEFAULT_RESCORE_MARGIN, QuantizedEmbeddings
+
+
+def embeddings(n=300, dim=48, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(20, dim))
+    return normalize_embeddings(centers[rng.integers(0, 20, n)] + 0.3 * rng.normal(size=(n, dim)))
+
+
+@pytest.mark.parametrize("precision", ["float16", "int8"])
+def test_block_scores_are_close_to_float32(tmp_path, precision):
+    reference = embeddings()
+    quantized = QuantizedEmbeddings(reference, precision, reference_dir=str(tmp_path))
+    scores = quantized.block_scores(0, 50)
+    np.testing.assert_allclose(scores, reference[:50] @ reference.T, atol=DEFAULT_RESCORE_MARGIN[precision])
+    assert quantized.nbytes < reference.nbytes
+
+
+@pytest.mark.parametrize("precision", ["float16", "int8"])
+def test_rescore_returns_float32_scores(tmp_path, precision):
+    reference = embeddings()
+    quantized = QuantizedEmbeddings(reference, precision, reference_dir=str(tmp_path))
+    start, floor = 100, 0.7
+    rows, columns, exact = quantized.rescore(start, quantized.block_scores(start, 150), floor)
+    np.testing.assert_allclose(exact, np.einsum('ij,ij->i', reference[start + rows], reference[columns]), rtol=1e-6)
+    # 候选覆盖了 float32 下所有不低于 floor + margin 的对
+    true_scores = reference[start:150] @ reference.T
+    expected = set(zip(*np.nonzero(true_scores >= floor + DEFAULT_RESCORE_MARGIN[precision])))
+    assert expected <= set(zip(rows.tolist(), columns.tolist()))
+
+
+@pytest.mark.parametrize("precision", ["float16", "int8"])
+def test_blocked_backend_clusters_match_float32(tmp_path, precision):
+    reference = embeddings()
+    quantized = QuantizedEmbeddings(reference, precision, reference_dir=str(tmp_path))
+    expected = blocked_community_detection(reference, 0.92, 2, memory_budget_mb=0.1)
+    assert blocked_community_detection(quantized, 0.92, 2, memory_budget_mb=0.1) == expected
+
+
+def test_reference_copy_is_removed(tmp_path):
+    quantized = QuantizedEmbeddings(embeddings(10), "int8", reference_dir=str(tmp_path))
+    assert len(list(tmp_path.iterdir())) == 1
+    del quantized
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""`stream_extract` 与 `json.load` + `extract_values` 的一致性。"""
+import json
+import random
+from collections import Counter
+
+import pytest
+
+from simple import _unwrap_record, extract_values
+from stream_extract import stream_extract
+
+KEYS = ['name', 'value', 'content']
+WORDS = ['a', 'b', ' c ', '', 'name', 'x' * 50]
+
+
+def reference(text, keys=KEYS):
+    """按 `simple.process_single_file` 的非流式路径计数。"""
+    data = _unwrap_record(json.loads(text))
+    results = {key: {"unique_values": set(), "all_values": []} for key in keys}
+    extract_values(data, keys, results)
+    return {key: Counter(results[key]["all_values"]) for key in keys}
+
+
+def random_value(rng, depth):
+    r = rng.random()
+    if depth > 3 or r < 0.3:
+        return rng.choice([rng.choice(WORDS), 1, None, True, 2.5])
+    if r < 0.65:
+        return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+    keys = rng.sample(['name', 'value', 'k', 'content', 'final_structured_response'], rng.randint(0, 5))
+    return {key: random_value(rng, depth + 1) for key in keys}
+
+
+def extract(tmp_path, text, chunk_size, keys=KEYS):
+    path = tmp_path / "doc.json"
+    path.write_text(text, encoding='utf-8')
+    return stream_extract(str(path), keys, chunk_size=chunk_size)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_nested_documents_match_json_load(tmp_path, seed):
+    rng = random.Random(seed)
+    for _ in range(200):
+        value = random_value(rng, 0)
+        if rng.random() < 0.5:
+            value = {'content': value}
+        text = json.dumps(value)
+        got = extract(tmp_path, text, rng.choice([1, 3, 7, 64]))
+        expected = reference(text)
+        for key in KEYS:
+            assert got[key] == expected[key], text
+            assert list(got[key]) == list(expected[key]), text
+
+
+@pytest.mark.parametrize("text", [
+    '{"name": "a", "name": "b", "x": {"name": "c"}}',
+    '{"final_structured_response": {"name": "a"}, "final_structured_response": {"name": "b"}}',
+    '{"content": {"final_structured_response": {"name": "a"}, "name": "z", "final_structured_response": {"name": "b"}}}',
+    '{"content": {"final_structured_response": {"name": "a"}}, "content": {"name": "q"}}',
+    '[{"name": "a", "value": "1", "name": "b", "value": "2"}, {"name": "a"}]',
+])
+def test_duplicate_tracked_keys_keep_last_value(tmp_path, text):
+    got = extract(tmp_path, text, 3)
+    expected = reference(text)
+    for key in KEYS:
+        assert got[key] == expected[key]
+
+
+def test_deep_nesting_does_not_recurse(tmp_path):
+    depth = 5000
+    text = '[' * depth + '{"name": "deep"}' + ']' * depth
+    assert extract(tmp_path, text, 64)['name'] == Counter({'deep': 1})